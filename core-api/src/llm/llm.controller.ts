@@ -6,7 +6,7 @@ import {
   HttpCode,
   HttpStatus,
 } from '@nestjs/common';
-import { LLMService } from './llm.service';
+import { LLMBatchOperation, LLMService } from './llm.service';
 import { JwtAuthGuard } from '../auth/guards/jwt-auth.guard';
 import { CurrentUser } from '../auth/decorators/current-user.decorator';
 import { v4 as uuidv4 } from 'uuid';
@@ -150,6 +150,22 @@ export class LLMController {
     );
   }
 
+  @Post('interview/evaluate')
+  async evaluateInterviewSession(
+    @Body()
+    body: {
+      scholarship_info: Record<string, unknown>;
+      answers: { question: string; student_answer: string }[];
+    },
+  ) {
+    return this.llmService.evaluateInterviewSession(body.scholarship_info, body.answers);
+  }
+
+  @Post('batch')
+  async runBatch(@Body() body: { operations: LLMBatchOperation[] }) {
+    return this.llmService.runBatch(body.operations);
+  }
+
   @Post('speech-token')
   async getSpeechToken() {
     return this.llmService.getSpeechToken();
@@ -2,6 +2,40 @@ import { Injectable } from '@nestjs/common';
 import { ConfigService } from '@nestjs/config';
 import { NotificationsService } from '../notifications/notifications.service';
 import axios from 'axios';
+import { createHash, randomBytes } from 'crypto';
+
+// How long we wait for the LLM service; the service is told slightly less so
+// it gives up (and stops its Gemini calls) before we do
+const LLM_REQUEST_TIMEOUT_MS = 60000;
+const LLM_STREAM_TIMEOUT_MS = 180000;
+const DEADLINE_MARGIN_MS = 2000;
+// Long generations run as background jobs on the LLM service and are polled
+const LLM_JOB_TIMEOUT_MS = 600000;
+const LLM_JOB_POLL_INTERVAL_MS = 2000;
+// Profiles registered on the LLM service are re-registered after this long,
+// which also keeps them from expiring there
+const PROFILE_REFRESH_MS = 24 * 60 * 60 * 1000;
+const PROFILE_DIGESTS_MAX = 1000;
+
+export interface LLMBatchOperation {
+  id: string;
+  type: string;
+  params: Record<string, unknown>;
+  depends_on?: string[];
+}
+
+export interface LLMBatchOutcome {
+  id: string;
+  type: string;
+  status: 'succeeded' | 'failed' | 'skipped';
+  result?: any;
+  error?: string;
+}
+
+interface ProfileFields {
+  student_profile?: Record<string, unknown>;
+  profile_digest?: string;
+}
 
 @Injectable()
 export class LLMService {
@@ -9,6 +43,8 @@ export class LLMService {
   private readonly apiKey: string;
   private readonly azureSpeechKey: string;
   private readonly azureSpeechRegion: string;
+  // Registered profile digests, by a hash of the profile as we send it
+  private readonly profileDigests = new Map<string, { digest: string; registeredAt: number }>();
 
   constructor(
     private configService: ConfigService,
@@ -45,13 +81,133 @@ export class LLMService {
     }
   }
 
-  private getHeaders(): Record<string, string> {
+  private getHeaders(timeoutMs: number = LLM_STREAM_TIMEOUT_MS): Record<string, string> {
     return {
       'Content-Type': 'application/json',
       Authorization: `Bearer ${this.apiKey}`,
+      // W3C trace context so LLM service spans can be correlated with this call
+      traceparent: `00-${randomBytes(16).toString('hex')}-${randomBytes(8).toString('hex')}-01`,
+      // Time budget the LLM service bounds its Gemini calls and retries by
+      'X-Request-Timeout-Ms': String(timeoutMs - DEADLINE_MARGIN_MS),
     };
   }
 
+  /**
+   * Replace inline (base64) chat attachments by references to files stored
+   * on the LLM service. Files are stored by content hash, so one already
+   * uploaded in an earlier turn is only looked up, not sent again; files the
+   * store does not take are sent inline as before
+   */
+  private async toAttachmentRefs(attachments?: any[]): Promise<any[] | undefined> {
+    if (!attachments?.length) {
+      return attachments;
+    }
+    return Promise.all(
+      attachments.map(async (att) => {
+        if (!att?.base64 || !att?.mime_type) {
+          return att;
+        }
+        try {
+          const data = Buffer.from(att.base64, 'base64');
+          const id = createHash('sha256').update(data).digest('hex');
+          const headers = this.getHeaders(LLM_REQUEST_TIMEOUT_MS);
+          try {
+            await axios.get(`${this.llmServiceUrl}/api/llm/attachments/${id}`, { headers, timeout: LLM_REQUEST_TIMEOUT_MS });
+          } catch (error) {
+            if ((error as any).response?.status !== 404) {
+              throw error;
+            }
+            await axios.post(`${this.llmServiceUrl}/api/llm/attachments`, data, {
+              headers: { ...headers, 'Content-Type': att.mime_type },
+              timeout: LLM_REQUEST_TIMEOUT_MS,
+              maxBodyLength: Infinity,
+            });
+          }
+          return { id, name: att.name };
+        } catch (error) {
+          console.warn('Attachment upload failed, sending it inline:', (error as any).message);
+          return att;
+        }
+      }),
+    );
+  }
+
+  /**
+   * Send a student profile by reference: it is registered with the LLM
+   * service once and later requests carry only its digest. Falls back to
+   * sending the profile inline if registration fails
+   */
+  private async profileFields(profile?: Record<string, unknown>): Promise<ProfileFields> {
+    if (!profile || !Object.keys(profile).length) {
+      return { student_profile: profile };
+    }
+    const key = this.profileKey(profile);
+    const known = this.profileDigests.get(key);
+    if (known && Date.now() - known.registeredAt < PROFILE_REFRESH_MS) {
+      return { profile_digest: known.digest };
+    }
+    try {
+      const response = await axios.post<{ digest: string }>(
+        `${this.llmServiceUrl}/api/llm/profiles`,
+        { profile },
+        { headers: this.getHeaders(LLM_REQUEST_TIMEOUT_MS), timeout: LLM_REQUEST_TIMEOUT_MS },
+      );
+      if (this.profileDigests.size >= PROFILE_DIGESTS_MAX) {
+        this.profileDigests.delete(this.profileDigests.keys().next().value as string);
+      }
+      this.profileDigests.set(key, { digest: response.data.digest, registeredAt: Date.now() });
+      return { profile_digest: response.data.digest };
+    } catch (error) {
+      console.warn('Profile registration failed, sending it inline:', (error as any).message);
+      return { student_profile: profile };
+    }
+  }
+
+  private profileKey(profile: Record<string, unknown>): string {
+    return createHash('sha256').update(JSON.stringify(profile)).digest('hex');
+  }
+
+  /**
+   * Send a request carrying a student profile (see profileFields). The LLM
+   * service answers 422 for a digest it does not know, e.g. after a restart
+   * or from another instance; the digest is then forgotten and the request
+   * is sent once more with the profile registered again
+   */
+  private async withProfile<T>(
+    profile: Record<string, unknown> | undefined,
+    send: (fields: ProfileFields) => Promise<T>,
+  ): Promise<T> {
+    const fields = await this.profileFields(profile);
+    try {
+      return await send(fields);
+    } catch (error) {
+      if (!profile || !fields.profile_digest || !(await this.isUnknownProfile(error, fields.profile_digest))) {
+        throw error;
+      }
+      console.warn(`Profile ${fields.profile_digest} unknown to the LLM service, registering it again`);
+      this.profileDigests.delete(this.profileKey(profile));
+      return send(await this.profileFields(profile));
+    }
+  }
+
+  /** Whether an LLM service error is the 422 for an unknown or expired profile digest */
+  private async isUnknownProfile(error: unknown, digest: string): Promise<boolean> {
+    const response = (error as any)?.response;
+    if (response?.status !== 422) {
+      return false;
+    }
+    let body = response.data;
+    if (body && typeof body.on === 'function') {
+      // Streaming requests get the error body as a stream too
+      const chunks: Buffer[] = [];
+      for await (const chunk of body) {
+        chunks.push(Buffer.from(chunk));
+      }
+      body = Buffer.concat(chunks).toString();
+    }
+    return (typeof body === 'string' ? body : JSON.stringify(body ?? '')).includes(digest);
+  }
+
   async streamChat(
     userId: string,
     sessionId: string,
@@ -66,7 +222,7 @@ export class LLMService {
           message,
           context,
           conversation_history: context?.conversation_history,
-          attachments,
+          attachments: await this.toAttachmentRefs(attachments),
         },
         {
           responseType: 'stream',
@@ -133,15 +289,17 @@ export class LLMService {
     data: Record<string, unknown>,
   ): Promise<void> {
     try {
-      const response = await axios.post(
-        `${this.llmServiceUrl}/api/llm/generate-document/stream`,
-        {
-          document_type: documentType,
-          student_profile: data.student_profile || {},
-          scholarship_info: data.scholarship_info || { name: data.scholarshipName },
-          additional_context: data.additionalContext || {},
-        },
-        { responseType: 'stream', headers: this.getHeaders() },
+      const response = await this.withProfile((data.student_profile || {}) as Record<string, unknown>, (fields) =>
+        axios.post(
+          `${this.llmServiceUrl}/api/llm/generate-document/stream`,
+          {
+            document_type: documentType,
+            ...fields,
+            scholarship_info: data.scholarship_info || { name: data.scholarshipName },
+            additional_context: data.additionalContext || {},
+          },
+          { responseType: 'stream', headers: this.getHeaders() },
+        ),
       );
 
       let fullResponse = '';
@@ -196,18 +354,105 @@ export class LLMService {
     }
   }
 
+  /**
+   * Submit a background job and poll it until it finishes, instead of
+   * holding a connection open for the whole generation
+   */
+  async runJob<T>(kind: string, data: Record<string, unknown>, idempotencyKey?: string): Promise<T> {
+    const headers = this.getHeaders(LLM_REQUEST_TIMEOUT_MS);
+    if (idempotencyKey) {
+      headers['Idempotency-Key'] = idempotencyKey;
+    }
+    const submitted = await axios.post<{ job_id: string }>(`${this.llmServiceUrl}/api/llm/jobs/${kind}`, data, {
+      headers,
+      timeout: LLM_REQUEST_TIMEOUT_MS,
+    });
+
+    const deadline = Date.now() + LLM_JOB_TIMEOUT_MS;
+    while (Date.now() < deadline) {
+      const response = await axios.get<{ status: string; result?: T; error?: string }>(
+        `${this.llmServiceUrl}/api/llm/jobs/${submitted.data.job_id}`,
+        { headers: this.getHeaders(LLM_REQUEST_TIMEOUT_MS), timeout: LLM_REQUEST_TIMEOUT_MS },
+      );
+      if (response.data.status === 'succeeded') {
+        return response.data.result as T;
+      }
+      if (response.data.status === 'failed') {
+        throw new Error(response.data.error || `LLM job ${kind} failed`);
+      }
+      await new Promise((resolve) => setTimeout(resolve, LLM_JOB_POLL_INTERVAL_MS));
+    }
+    throw new Error(`LLM job ${kind} did not finish in time`);
+  }
+
   async request<T>(endpoint: string, data: Record<string, unknown>): Promise<T> {
     try {
-      const response = await axios.post<T>(`${this.llmServiceUrl}${endpoint}`, data, { headers: this.getHeaders(), timeout: 60000 });
+      const response = await axios.post<T>(`${this.llmServiceUrl}${endpoint}`, data, {
+        headers: this.getHeaders(LLM_REQUEST_TIMEOUT_MS),
+        timeout: LLM_REQUEST_TIMEOUT_MS,
+      });
       return response.data;
     } catch (error) {
       throw error;
     }
   }
 
+  /**
+   * Run several LLM operations in one request. Independent operations run
+   * concurrently on the LLM service; a param may use an earlier operation's
+   * result as {"$ref": "<id>/<key>..."}. onResult is called as each
+   * operation finishes; the promise resolves with all outcomes by id
+   */
+  async runBatch(
+    operations: LLMBatchOperation[],
+    onResult?: (outcome: LLMBatchOutcome) => void,
+  ): Promise<Record<string, LLMBatchOutcome>> {
+    const response = await axios.post(
+      `${this.llmServiceUrl}/api/llm/batch`,
+      { operations },
+      { responseType: 'stream', headers: this.getHeaders(), timeout: LLM_STREAM_TIMEOUT_MS },
+    );
+
+    const outcomes: Record<string, LLMBatchOutcome> = {};
+    return new Promise((resolve, reject) => {
+      let buffer = '';
+      response.data.on('data', (chunk: Buffer) => {
+        buffer += chunk.toString();
+        const events = buffer.split('\n\n');
+        buffer = events.pop() || '';
+        for (const event of events) {
+          if (!event.startsWith('data: ')) {
+            continue;
+          }
+          const data = event.slice(6);
+          if (data === '[DONE]') {
+            resolve(outcomes);
+            continue;
+          }
+          try {
+            const outcome = JSON.parse(data) as LLMBatchOutcome;
+            outcomes[outcome.id] = outcome;
+            onResult?.(outcome);
+          } catch (e) {}
+        }
+      });
+      response.data.on('end', () => resolve(outcomes));
+      response.data.on('error', reject);
+    });
+  }
+
   async discoverFaculty(mode: string, continent?: string, university?: string, department?: string, faculty_name?: string, student_profile?: Record<string, unknown>) {
     try {
-      const response = await this.request<{ success: boolean; data: any }>('/api/llm/faculty/discover', { mode, continent, university, department, faculty_name, student_profile });
+      const response = await this.withProfile(student_profile, (fields) =>
+        this.request<{ success: boolean; data: any }>('/api/llm/faculty/discover', {
+          mode,
+          continent,
+          university,
+          department,
+          faculty_name,
+          ...fields,
+        }),
+      );
       return response.data;
     } catch (error) {
       throw error;
@@ -216,8 +461,25 @@ export class LLMService {
 
   async discoverScholarships(count: number = 10): Promise<{ scholarships: any[]; count: number }> {
     try {
-      const response = await this.request<{ scholarships: any[]; count: number }>('/api/llm/scholarships/discover', { count });
-      return response;
+      return await this.runJob<{ scholarships: any[]; count: number }>('scholarships/discover', { count });
+    } catch (error) {
+      throw error;
+    }
+  }
+
+  /**
+   * Evaluate all answers of a practice session at once: the LLM service
+   * scores them in a few batched calls and adds an aggregate report
+   */
+  async evaluateInterviewSession(
+    scholarship_info: Record<string, unknown>,
+    answers: { question: string; student_answer: string }[],
+  ) {
+    try {
+      return await this.request<{ success: boolean; evaluations?: any[]; report?: any; error?: string }>(
+        '/api/llm/interview/evaluate',
+        { scholarship_info, answers },
+      );
     } catch (error) {
       throw error;
     }
@@ -232,14 +494,16 @@ export class LLMService {
     student_profile?: Record<string, unknown>
   ) {
     try {
-      const response = await this.request<{ success: boolean; data: any }>('/api/llm/interview/interactive', {
-        mode,
-        persona,
-        interview_type,
-        user_answer,
-        history,
-        student_profile,
-      });
+      const response = await this.withProfile(student_profile, (fields) =>
+        this.request<{ success: boolean; data: any }>('/api/llm/interview/interactive', {
+          mode,
+          persona,
+          interview_type,
+          user_answer,
+          history,
+          ...fields,
+        }),
+      );
       return response;
     } catch (error) {
       throw error;
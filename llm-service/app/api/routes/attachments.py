@@ -0,0 +1,82 @@
+"""
+Chat Attachment API Routes
+Upload files once and reference them by id in later chat messages
+"""
+
+import logging
+
+from fastapi import APIRouter, Depends, HTTPException, Path, Request, status
+
+from app.models.responses import AttachmentResponse
+from app.core.config import settings
+from app.core.security import verify_api_key
+from app.core.rate_limit import limiter
+from app.services.attachments import AttachmentTooLargeError, attachment_store
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+ATTACHMENT_ID = Path(..., pattern=r"^[0-9a-f]{64}$")
+
+
+def _attachment_response(attachment) -> AttachmentResponse:
+    return AttachmentResponse(
+        id=attachment["id"],
+        mime_type=attachment["mime_type"],
+        size=attachment["size"],
+        expires_at=attachment["expires_at"],
+    )
+
+
+@router.post("", response_model=AttachmentResponse, status_code=status.HTTP_201_CREATED)
+@limiter.limit("30/minute")
+async def upload_attachment(
+    request: Request,
+    authorized: bool = Depends(verify_api_key)
+):
+    """
+    Upload a chat attachment as the raw request body
+    
+    The Content-Type header is the file's type. The body is streamed to disk,
+    not read into memory; uploading content that is already stored returns
+    the existing attachment. Clients can compute the SHA-256 themselves and
+    check GET /attachments/{id} before uploading.
+    """
+    # OWASP: Injection - only accept the file types chat can use
+    mime_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if mime_type not in settings.attachment_mime_types_list:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail=f"Unsupported attachment type: {mime_type or 'none'}"
+        )
+    
+    # Refuse oversized uploads before reading them when the size is declared
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > attachment_store.max_bytes:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Attachment exceeds {settings.MAX_FILE_SIZE_MB} MB"
+        )
+    
+    try:
+        attachment = await attachment_store.save(request.stream(), mime_type)
+    except AttachmentTooLargeError:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Attachment exceeds {settings.MAX_FILE_SIZE_MB} MB"
+        )
+    
+    return _attachment_response(attachment)
+
+
+@router.get("/{attachment_id}", response_model=AttachmentResponse)
+async def get_attachment(
+    request: Request,
+    attachment_id: str = ATTACHMENT_ID,
+    authorized: bool = Depends(verify_api_key)
+):
+    """Get a stored attachment's metadata, to check whether it needs uploading"""
+    attachment = attachment_store.get(attachment_id)
+    if attachment is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Attachment not found or expired")
+    return _attachment_response(attachment)
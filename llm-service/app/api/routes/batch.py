@@ -0,0 +1,191 @@
+"""
+Batch API Routes
+Run several LLM operations from one request and stream each outcome as it finishes
+"""
+
+import logging
+from typing import Any, Dict
+
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from limits import parse
+
+from app.models.requests import (
+    BatchRequest,
+    ChatRequest,
+    CVParseRequest,
+    DocumentGenerateRequest,
+    FacultyDiscoveryRequest,
+    InterviewEvaluationRequest,
+    InterviewPrepRequest,
+    ScholarshipDiscoveryRequest,
+    ScholarshipMatchRequest,
+)
+from app.api.routes import (
+    chat as chat_routes,
+    cv_parser,
+    document_generator,
+    faculty,
+    interview,
+    scholarship_discovery,
+    scholarship_matcher,
+)
+from app.core.config import settings
+from app.core.security import verify_api_key
+from app.core.rate_limit import charge_route_limit, limiter
+from app.core.sse import DONE_EVENT, sse_event, sse_response
+from app.services.batch import SUCCEEDED, BatchValidationError, Runner, plan, run_batch
+from app.services.profiles import profile_registry
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+# Endpoint each operation type stands for, and its rate limit; an operation
+# counts against that endpoint's budget
+OPERATION_ROUTES = {
+    "parse_cv": (cv_parser.parse_cv, parse(cv_parser.RATE_LIMIT)),
+    "match_scholarships": (scholarship_matcher.match_scholarships, parse(scholarship_matcher.RATE_LIMIT)),
+    "discover_scholarships": (
+        scholarship_discovery.discover_scholarships, parse(scholarship_discovery.RATE_LIMIT)
+    ),
+    "discover_faculty": (faculty.discover_faculty, parse(faculty.RATE_LIMIT)),
+    "generate_document": (document_generator.generate_document, parse(document_generator.RATE_LIMIT)),
+    "chat": (chat_routes.chat, parse(chat_routes.RATE_LIMIT)),
+    "interview_practice": (interview.practice_interview, parse(interview.PRACTICE_RATE_LIMIT)),
+    "evaluate_interview": (interview.evaluate_session, parse(interview.EVALUATE_RATE_LIMIT)),
+}
+
+
+class OperationRateLimitError(ValueError):
+    """An operation's route has no requests left for this client"""
+
+
+def _rate_limited(request: Request, op_type: str, runner: Runner) -> Runner:
+    """Runner that first counts the operation against its route's rate limit"""
+    endpoint, limit = OPERATION_ROUTES[op_type]
+    path = request.app.url_path_for(endpoint.__name__)
+
+    async def run(params: Dict[str, Any]):
+        if not charge_route_limit(request, path, limit):
+            raise OperationRateLimitError(f"Rate limit exceeded for {op_type}: {limit}")
+        return await runner(params)
+    return run
+
+
+def _runners(state: Any) -> Dict[str, Runner]:
+    """Operation types, each validating its params with its endpoint's request model"""
+    gemini_service = state.gemini_service
+
+    async def parse_cv(params: Dict[str, Any]):
+        req = CVParseRequest(**params)
+        return await gemini_service.parse_cv(req.cv_text)
+
+    async def match_scholarships(params: Dict[str, Any]):
+        req = ScholarshipMatchRequest(**params)
+        return await gemini_service.match_scholarships(
+            student_profile=profile_registry.resolve(req.student_profile, req.profile_digest),
+            scholarships=req.scholarships
+        )
+
+    async def discover_scholarships(params: Dict[str, Any]):
+        req = ScholarshipDiscoveryRequest(**params)
+        return await gemini_service.discover_scholarships(req.count)
+
+    async def discover_faculty(params: Dict[str, Any]):
+        req = FacultyDiscoveryRequest(**params)
+        return await state.faculty_directory.discover(
+            mode=req.mode,
+            continent=req.continent,
+            university=req.university,
+            department=req.department,
+            student_profile=profile_registry.resolve(req.student_profile, req.profile_digest)
+        )
+
+    async def generate_document(params: Dict[str, Any]):
+        req = DocumentGenerateRequest(**params)
+        return await gemini_service.generate_document(
+            document_type=req.document_type,
+            student_profile=profile_registry.resolve(req.student_profile, req.profile_digest),
+            scholarship_info=req.scholarship_info,
+            additional_context=req.additional_context
+        )
+
+    async def chat(params: Dict[str, Any]):
+        # Shares the chat route's answer cache
+        return await chat_routes.answer(state, ChatRequest(**params))
+
+    async def interview_practice(params: Dict[str, Any]):
+        req = InterviewPrepRequest(**params)
+        if req.mode == "generate_question":
+            return await state.question_pool.next_question(
+                scholarship_info=req.scholarship_info,
+                difficulty=req.difficulty
+            )
+        return await gemini_service.interview_prep(
+            mode=req.mode,
+            scholarship_info=req.scholarship_info,
+            student_answer=req.student_answer,
+            question=req.question
+        )
+
+    async def evaluate_interview(params: Dict[str, Any]):
+        req = InterviewEvaluationRequest(**params)
+        return await gemini_service.evaluate_answers(
+            scholarship_info=req.scholarship_info,
+            answers=[answer.model_dump() for answer in req.answers]
+        )
+
+    return {
+        "parse_cv": parse_cv,
+        "match_scholarships": match_scholarships,
+        "discover_scholarships": discover_scholarships,
+        "discover_faculty": discover_faculty,
+        "generate_document": generate_document,
+        "chat": chat,
+        "interview_practice": interview_practice,
+        "evaluate_interview": evaluate_interview,
+    }
+
+
+@router.post("/batch")
+@limiter.limit("10/minute")
+async def run_operations(
+    request: Request,
+    batch_request: BatchRequest,
+    authorized: bool = Depends(verify_api_key)
+):
+    """
+    Run several operations in one request
+
+    - **operations**: list of {id, type, params, depends_on}; params are the
+      body of the type's endpoint and may reference earlier results as
+      {"$ref": "<id>/<key>..."}
+
+    Returns a Server-Sent Events stream with one event per operation, in the
+    order they finish: {id, type, status} with the operation's result if it
+    succeeded, or an error if it failed or was skipped (a dependency did not
+    succeed). The stream ends with [DONE].
+
+    Each operation also counts against the rate limit of its type's endpoint;
+    one whose endpoint limit is used up fails without running.
+    """
+    operations = [op.model_dump() for op in batch_request.operations]
+    runners = {
+        op_type: _rate_limited(request, op_type, runner)
+        for op_type, runner in _runners(request.app.state).items()
+    }
+    try:
+        dependencies = plan(operations, runners)
+    except BatchValidationError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+
+    logger.info(f"Received batch of {len(operations)} operations: {', '.join(op['type'] for op in operations)}")
+
+    async def generate():
+        succeeded = 0
+        async for outcome in run_batch(operations, runners, dependencies, settings.BATCH_MAX_CONCURRENCY):
+            succeeded += outcome["status"] == SUCCEEDED
+            yield sse_event(outcome)
+        yield DONE_EVENT
+        logger.info(f"Batch completed: {succeeded}/{len(operations)} operations succeeded")
+
+    return sse_response(generate())
@@ -2,24 +2,60 @@
 Chat API Routes
 """
 
-import logging
 import json
+import logging
+from typing import Any, Dict
+
 from fastapi import APIRouter, Depends, HTTPException, status, Request
-from fastapi.responses import StreamingResponse
 
 from app.models.requests import ChatRequest
 from app.models.responses import ChatResponse
+from app.core.deadline import DeadlineExceededError
 from app.core.security import verify_api_key
-from slowapi import Limiter
-from slowapi.util import get_remote_address
+from app.core.rate_limit import limiter
+from app.core.metrics import track_first_chunk
+from app.core.sse import DONE_EVENT, sse_event, sse_response
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
-limiter = Limiter(key_func=get_remote_address)
+
+# Shared by the streaming route
+RATE_LIMIT = "30/minute"
+
+
+def _chat_cache(state: Any, chat_request: ChatRequest):
+    """The chat cache, if it is enabled and may answer this request"""
+    chat_cache = getattr(state, "chat_cache", None)
+    if chat_cache is None or not chat_cache.cacheable(
+        chat_request.message, chat_request.conversation_history, chat_request.attachments
+    ):
+        return None
+    return chat_cache
+
+
+async def answer(state: Any, chat_request: ChatRequest) -> Dict[str, Any]:
+    """Chat response to a request, answered from the cache where possible (also used by batch chat operations)"""
+    chat_cache = _chat_cache(state, chat_request)
+    if chat_cache is not None:
+        cached = chat_cache.get(chat_request.message)
+        if cached is not None:
+            logger.info("Chat response served from cache")
+            return cached
+        generation = chat_cache.generation
+
+    chat_response = await state.gemini_service.chat(
+        message=chat_request.message,
+        conversation_history=chat_request.conversation_history,
+        attachments=chat_request.attachments
+    )
+
+    if chat_cache is not None:
+        chat_cache.put(chat_request.message, chat_response, generation)
+    return chat_response
 
 
 @router.post("/chat", response_model=ChatResponse)
-@limiter.limit("30/minute")
+@limiter.limit(RATE_LIMIT)
 async def chat(
     request: Request,
     chat_request: ChatRequest,
@@ -40,15 +76,8 @@ async def chat(
     try:
         logger.info("Received chat request")
         
-        # Get Gemini service from app state
-        gemini_service = request.app.state.gemini_service
-        
-        # Get chat response
-        chat_response = await gemini_service.chat(
-            message=chat_request.message,
-            conversation_history=chat_request.conversation_history,
-            attachments=chat_request.attachments
-        )
+        # Get chat response; repeated first messages are answered from the cache
+        chat_response = await answer(request.app.state, chat_request)
         
         logger.info("Chat response generated successfully")
         
@@ -57,6 +86,8 @@ async def chat(
             response=chat_response
         )
         
+    except DeadlineExceededError:
+        raise
     except ValueError as e:
         logger.warning(f"Validation error in chat: {e}")
         raise HTTPException(
@@ -72,7 +103,7 @@ async def chat(
 
 
 @router.post("/chat/stream")
-@limiter.limit("30/minute")
+@limiter.limit(RATE_LIMIT)
 async def chat_stream(
     request: Request,
     chat_request: ChatRequest,
@@ -90,29 +121,39 @@ async def chat_stream(
             # Get Gemini service from app state
             gemini_service = request.app.state.gemini_service
             
+            # A cached answer is sent as a single chunk
+            chat_cache = _chat_cache(request.app.state, chat_request)
+            if chat_cache is not None:
+                cached = chat_cache.get(chat_request.message)
+                if cached is not None:
+                    yield sse_event({'content': json.dumps(cached, ensure_ascii=False)})
+                    yield DONE_EVENT
+                    logger.info("Streaming chat response served from cache")
+                    return
+                generation = chat_cache.generation
+            
             # Stream chat response
-            async for chunk in gemini_service.chat_stream(
+            chunks = []
+            async for chunk in track_first_chunk("/api/llm/chat/stream", gemini_service.chat_stream(
                 message=chat_request.message,
                 conversation_history=chat_request.conversation_history,
                 attachments=chat_request.attachments
-            ):
-                yield f"data: {json.dumps({'content': chunk})}\n\n"
+            )):
+                if chat_cache is not None:
+                    chunks.append(chunk)
+                yield sse_event({'content': chunk})
+            
+            if chat_cache is not None:
+                schema = gemini_service.yaml_loader.load_instruction("chat_assistant").get("response_schema")
+                chat_cache.put_streamed(chat_request.message, "".join(chunks), generation, schema)
             
             # Send done signal
-            yield "data: [DONE]\n\n"
+            yield DONE_EVENT
             
             logger.info("Streaming chat response completed")
             
         except Exception as e:
             logger.error(f"Error in streaming chat: {e}", exc_info=True)
-            yield f"data: {json.dumps({'error': str(e)})}\n\n"
+            yield sse_event({'error': str(e)})
     
-    return StreamingResponse(
-        generate(),
-        media_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-            "X-Accel-Buffering": "no",
-        }
-    )
+    return sse_response(generate())
@@ -7,17 +7,18 @@ from fastapi import APIRouter, Depends, HTTPException, status, Request
 
 from app.models.requests import CVParseRequest
 from app.models.responses import CVParseResponse
+from app.core.deadline import DeadlineExceededError
 from app.core.security import verify_api_key
-from slowapi import Limiter
-from slowapi.util import get_remote_address
+from app.core.rate_limit import limiter
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
-limiter = Limiter(key_func=get_remote_address)
+
+RATE_LIMIT = "10/minute"
 
 
 @router.post("/parse-cv", response_model=CVParseResponse)
-@limiter.limit("10/minute")
+@limiter.limit(RATE_LIMIT)
 async def parse_cv(
     request: Request,
     cv_request: CVParseRequest,
@@ -53,6 +54,8 @@ async def parse_cv(
             data=parsed_data
         )
         
+    except DeadlineExceededError:
+        raise
     except ValueError as e:
         logger.warning(f"Validation error in CV parsing: {e}")
         raise HTTPException(
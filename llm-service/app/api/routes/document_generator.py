@@ -3,23 +3,26 @@ Document Generator API Routes
 """
 
 import logging
-import json
 from fastapi import APIRouter, Depends, HTTPException, status, Request
-from fastapi.responses import StreamingResponse
 
 from app.models.requests import DocumentGenerateRequest
 from app.models.responses import DocumentGenerateResponse
+from app.core.deadline import DeadlineExceededError
 from app.core.security import verify_api_key
-from slowapi import Limiter
-from slowapi.util import get_remote_address
+from app.core.rate_limit import limiter
+from app.core.metrics import track_first_chunk
+from app.api.routes.profiles import request_profile
+from app.core.sse import DONE_EVENT, sse_event, sse_response
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
-limiter = Limiter(key_func=get_remote_address)
+
+# Shared by the streaming route
+RATE_LIMIT = "5/minute"
 
 
 @router.post("/generate-document", response_model=DocumentGenerateResponse)
-@limiter.limit("5/minute")
+@limiter.limit(RATE_LIMIT)
 async def generate_document(
     request: Request,
     doc_request: DocumentGenerateRequest,
@@ -28,6 +31,9 @@ async def generate_document(
     """
     Generate scholarship application document using AI
     """
+    # A registered profile is looked up by its digest
+    student_profile = request_profile(doc_request.student_profile, doc_request.profile_digest)
+    
     try:
         logger.info(f"Received document generation request for {doc_request.document_type}")
         
@@ -37,7 +43,7 @@ async def generate_document(
         # Generate document
         document = await gemini_service.generate_document(
             document_type=doc_request.document_type,
-            student_profile=doc_request.student_profile,
+            student_profile=student_profile,
             scholarship_info=doc_request.scholarship_info,
             additional_context=doc_request.additional_context
         )
@@ -49,6 +55,8 @@ async def generate_document(
             document=document
         )
         
+    except DeadlineExceededError:
+        raise
     except ValueError as e:
         logger.warning(f"Validation error in document generation: {e}")
         raise HTTPException(
@@ -64,7 +72,7 @@ async def generate_document(
 
 
 @router.post("/generate-document/stream")
-@limiter.limit("5/minute")
+@limiter.limit(RATE_LIMIT)
 async def generate_document_stream(
     request: Request,
     doc_request: DocumentGenerateRequest,
@@ -73,6 +81,9 @@ async def generate_document_stream(
     """
     Stream scholarship application document generation
     """
+    # Resolved before streaming, so an unknown digest is a 422
+    student_profile = request_profile(doc_request.student_profile, doc_request.profile_digest)
+    
     async def generate():
         try:
             logger.info(f"Received streaming document generation request for {doc_request.document_type}")
@@ -81,29 +92,21 @@ async def generate_document_stream(
             gemini_service = request.app.state.gemini_service
             
             # Stream document generation
-            async for chunk in gemini_service.generate_document_stream(
+            async for chunk in track_first_chunk("/api/llm/generate-document/stream", gemini_service.generate_document_stream(
                 document_type=doc_request.document_type,
-                student_profile=doc_request.student_profile,
+                student_profile=student_profile,
                 scholarship_info=doc_request.scholarship_info,
                 additional_context=doc_request.additional_context
-            ):
-                yield f"data: {json.dumps({'content': chunk})}\n\n"
+            )):
+                yield sse_event({'content': chunk})
             
             # Send done signal
-            yield "data: [DONE]\n\n"
+            yield DONE_EVENT
             
             logger.info(f"Streaming document generation completed: {doc_request.document_type}")
             
         except Exception as e:
             logger.error(f"Error in streaming document generation: {e}", exc_info=True)
-            yield f"data: {json.dumps({'error': str(e)})}\n\n"
+            yield sse_event({'error': str(e)})
     
-    return StreamingResponse(
-        generate(),
-        media_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-            "X-Accel-Buffering": "no",
-        }
-    )
+    return sse_response(generate())
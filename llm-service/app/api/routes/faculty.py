@@ -6,17 +6,19 @@ import logging
 from fastapi import APIRouter, Depends, HTTPException, status, Request
 
 from app.models.requests import FacultyDiscoveryRequest
+from app.core.deadline import DeadlineExceededError
 from app.core.security import verify_api_key
-from slowapi import Limiter
-from slowapi.util import get_remote_address
+from app.core.rate_limit import limiter
+from app.api.routes.profiles import request_profile
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
-limiter = Limiter(key_func=get_remote_address)
+
+RATE_LIMIT = "10/minute"
 
 
 @router.post("/discover", status_code=status.HTTP_200_OK)
-@limiter.limit("10/minute")
+@limiter.limit(RATE_LIMIT)
 async def discover_faculty(
     request: Request,
     faculty_request: FacultyDiscoveryRequest,
@@ -25,19 +27,22 @@ async def discover_faculty(
     """
     Discover universities and faculty based on region and department
     """
+    # A registered profile is looked up by its digest
+    student_profile = request_profile(faculty_request.student_profile, faculty_request.profile_digest)
+    
     try:
         logger.info(f"Received faculty discovery request: {faculty_request.mode}")
         
-        # Get Gemini service from app state
-        gemini_service = request.app.state.gemini_service
+        # Lists are served from the faculty cache where possible
+        faculty_directory = request.app.state.faculty_directory
         
         # Get discovery response
-        result = await gemini_service.discover_faculty(
+        result = await faculty_directory.discover(
             mode=faculty_request.mode,
             continent=faculty_request.continent,
             university=faculty_request.university,
             department=faculty_request.department,
-            student_profile=faculty_request.student_profile
+            student_profile=student_profile
         )
         
         return {
@@ -45,6 +50,8 @@ async def discover_faculty(
             "data": result
         }
         
+    except DeadlineExceededError:
+        raise
     except Exception as e:
         logger.error(f"Error in faculty discovery: {e}", exc_info=True)
         raise HTTPException(
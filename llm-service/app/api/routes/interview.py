@@ -3,23 +3,27 @@ Interview Preparation API Routes
 """
 
 import logging
-import json
 from fastapi import APIRouter, Depends, HTTPException, status, Request
-from fastapi.responses import StreamingResponse
 
-from app.models.requests import InterviewPrepRequest, InterviewPersonaRequest
-from app.models.responses import InterviewPrepResponse
+from app.models.requests import InterviewEvaluationRequest, InterviewPrepRequest, InterviewPersonaRequest
+from app.models.responses import InterviewEvaluationResponse, InterviewPrepResponse
+from app.core.deadline import DeadlineExceededError
 from app.core.security import verify_api_key
-from slowapi import Limiter
-from slowapi.util import get_remote_address
+from app.core.rate_limit import limiter
+from app.core.metrics import track_first_chunk
+from app.core.sse import sse_event, sse_response
+from app.api.routes.profiles import request_profile
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
-limiter = Limiter(key_func=get_remote_address)
+
+PRACTICE_RATE_LIMIT = "5/minute"
+EVALUATE_RATE_LIMIT = "5/minute"
+INTERACTIVE_RATE_LIMIT = "10/minute"
 
 
 @router.post("/practice", response_model=InterviewPrepResponse)
-@limiter.limit("5/minute")
+@limiter.limit(PRACTICE_RATE_LIMIT)
 async def practice_interview(
     request: Request,
     prep_request: InterviewPrepRequest,
@@ -34,19 +38,27 @@ async def practice_interview(
         # Get Gemini service from app state
         gemini_service = request.app.state.gemini_service
         
-        # Get feedback or question
-        result = await gemini_service.interview_prep(
-            mode=prep_request.mode,
-            scholarship_info=prep_request.scholarship_info,
-            student_answer=prep_request.student_answer,
-            question=prep_request.question
-        )
+        # Get feedback or question; questions come from the scholarship's pre-generated pool
+        if prep_request.mode == "generate_question":
+            result = await request.app.state.question_pool.next_question(
+                scholarship_info=prep_request.scholarship_info,
+                difficulty=prep_request.difficulty
+            )
+        else:
+            result = await gemini_service.interview_prep(
+                mode=prep_request.mode,
+                scholarship_info=prep_request.scholarship_info,
+                student_answer=prep_request.student_answer,
+                question=prep_request.question
+            )
         
         return InterviewPrepResponse(
             success=True,
             data=result
         )
         
+    except DeadlineExceededError:
+        raise
     except Exception as e:
         logger.error(f"Error in interview prep: {e}", exc_info=True)
         return InterviewPrepResponse(
@@ -55,8 +67,48 @@ async def practice_interview(
         )
 
 
+@router.post("/evaluate", response_model=InterviewEvaluationResponse)
+@limiter.limit(EVALUATE_RATE_LIMIT)
+async def evaluate_session(
+    request: Request,
+    evaluation_request: InterviewEvaluationRequest,
+    authorized: bool = Depends(verify_api_key)
+):
+    """
+    Evaluate all answers of a practice session in a few batched calls
+    
+    Returns feedback per answer, plus an aggregate report for the session.
+    """
+    try:
+        logger.info(f"Received session evaluation request: {len(evaluation_request.answers)} answers")
+        
+        # Get Gemini service from app state
+        gemini_service = request.app.state.gemini_service
+        
+        # Evaluate the answers together
+        result = await gemini_service.evaluate_answers(
+            scholarship_info=evaluation_request.scholarship_info,
+            answers=[answer.model_dump() for answer in evaluation_request.answers]
+        )
+        
+        return InterviewEvaluationResponse(
+            success=True,
+            evaluations=result["evaluations"],
+            report=result["report"]
+        )
+        
+    except DeadlineExceededError:
+        raise
+    except Exception as e:
+        logger.error(f"Error in session evaluation: {e}", exc_info=True)
+        return InterviewEvaluationResponse(
+            success=False,
+            error=f"Failed to evaluate session: {str(e)}"
+        )
+
+
 @router.post("/interactive", status_code=status.HTTP_200_OK)
-@limiter.limit("10/minute")
+@limiter.limit(INTERACTIVE_RATE_LIMIT)
 async def interactive_interview(
     request: Request,
     interview_request: InterviewPersonaRequest,
@@ -65,6 +117,9 @@ async def interactive_interview(
     """
     Conduct an interactive mock interview session with a specific persona
     """
+    # A registered profile is looked up by its digest
+    student_profile = request_profile(interview_request.student_profile, interview_request.profile_digest)
+    
     try:
         logger.info(f"Received interactive interview request: {interview_request.mode} ({interview_request.persona}), is_conclusion={interview_request.is_conclusion}")
         
@@ -78,7 +133,7 @@ async def interactive_interview(
             interview_type=interview_request.interview_type,
             user_answer=interview_request.user_answer,
             history=interview_request.history,
-            student_profile=interview_request.student_profile,
+            student_profile=student_profile,
             selected_panelists=interview_request.selected_panelists,
             is_conclusion=interview_request.is_conclusion
         )
@@ -88,6 +143,8 @@ async def interactive_interview(
             "data": result
         }
         
+    except DeadlineExceededError:
+        raise
     except Exception as e:
         logger.error(f"Error in interactive interview: {e}", exc_info=True)
         raise HTTPException(
@@ -97,7 +154,7 @@ async def interactive_interview(
 
 
 @router.post("/interactive/stream")
-@limiter.limit("10/minute")
+@limiter.limit(INTERACTIVE_RATE_LIMIT)
 async def interactive_interview_stream(
     request: Request,
     interview_request: InterviewPersonaRequest,
@@ -108,6 +165,9 @@ async def interactive_interview_stream(
     Returns Server-Sent Events (SSE) stream with chunks of the response.
     This provides faster perceived response time as chunks arrive immediately.
     """
+    # Resolved before streaming, so an unknown digest is a 422
+    student_profile = request_profile(interview_request.student_profile, interview_request.profile_digest)
+    
     async def generate():
         try:
             logger.info(f"Received streaming interview request: {interview_request.mode} ({interview_request.persona})")
@@ -118,53 +178,46 @@ async def interactive_interview_stream(
             full_response = ""
             
             # Stream interview response
-            async for chunk in gemini_service.conduct_interview_stream(
+            async for chunk in track_first_chunk("/api/llm/interview/interactive/stream", gemini_service.conduct_interview_stream(
                 mode=interview_request.mode,
                 persona=interview_request.persona,
                 interview_type=interview_request.interview_type,
                 user_answer=interview_request.user_answer,
                 history=interview_request.history,
-                student_profile=interview_request.student_profile,
+                student_profile=student_profile,
                 selected_panelists=interview_request.selected_panelists,
                 is_conclusion=interview_request.is_conclusion
-            ):
+            )):
                 full_response += chunk
-                yield f"data: {json.dumps({'chunk': chunk, 'done': False})}\n\n"
+                yield sse_event({'chunk': chunk, 'done': False})
             
-            # Parse the complete JSON response
+            # Parse the complete JSON response; missing fields are re-asked
             try:
-                import json_repair
-                logger.info(f"Full response to parse (length={len(full_response)}): {full_response[:500]}...")
-                parsed_data = json_repair.loads(full_response.strip())
+                # Lazy %-formatting: the preview is only built when DEBUG is enabled
+                logger.debug("Full response to parse (length=%d): %.500s...", len(full_response), full_response)
+                parsed_data = await gemini_service.complete_interview_stream(
+                    full_response,
+                    mode=interview_request.mode,
+                    persona=interview_request.persona,
+                    interview_type=interview_request.interview_type,
+                    user_answer=interview_request.user_answer,
+                    history=interview_request.history,
+                    student_profile=student_profile,
+                    selected_panelists=interview_request.selected_panelists,
+                    is_conclusion=interview_request.is_conclusion
+                )
                 logger.info(f"Parsed data keys: {list(parsed_data.keys()) if isinstance(parsed_data, dict) else 'not a dict'}")
                 
-                # Validate required fields
-                if isinstance(parsed_data, dict):
-                    if 'speech' not in parsed_data or not parsed_data.get('speech'):
-                        logger.warning(f"Missing or empty 'speech' field in parsed data: {parsed_data}")
-                        # Try to use transcription as fallback
-                        if 'transcription' in parsed_data and parsed_data.get('transcription'):
-                            parsed_data['speech'] = parsed_data['transcription']
-                            logger.info("Used 'transcription' as fallback for 'speech'")
-                
-                yield f"data: {json.dumps({'chunk': '', 'done': True, 'data': parsed_data})}\n\n"
+                yield sse_event({'chunk': '', 'done': True, 'data': parsed_data})
             except Exception as parse_error:
                 logger.error(f"Failed to parse streaming response: {parse_error}")
-                logger.error(f"Raw response was: {full_response}")
-                yield f"data: {json.dumps({'chunk': '', 'done': True, 'error': str(parse_error), 'raw': full_response})}\n\n"
+                logger.error(f"Raw response was (length={len(full_response)}): {full_response[:2000]}")
+                yield sse_event({'chunk': '', 'done': True, 'error': str(parse_error), 'raw': full_response})
             
             logger.info("Streaming interview response completed")
             
         except Exception as e:
             logger.error(f"Error in streaming interview: {e}", exc_info=True)
-            yield f"data: {json.dumps({'error': str(e), 'done': True})}\n\n"
+            yield sse_event({'error': str(e), 'done': True})
     
-    return StreamingResponse(
-        generate(),
-        media_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-            "X-Accel-Buffering": "no",
-        }
-    )
+    return sse_response(generate())
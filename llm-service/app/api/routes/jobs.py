@@ -0,0 +1,180 @@
+"""
+Background Job API Routes
+Submit long generations as jobs, then poll them or subscribe to their events
+"""
+
+import logging
+from typing import Any, Dict, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Path, Request, Response, status
+
+from app.models.requests import DocumentGenerateRequest, ScholarshipDiscoveryRequest
+from app.models.responses import DocumentGenerateResponse, JobResponse, ScholarshipDiscoveryResponse
+from app.core import deadline
+from app.core.security import verify_api_key
+from app.core.rate_limit import limiter
+from app.core.sse import DONE_EVENT, sse_event, sse_response
+from app.api.routes.profiles import request_profile
+from app.services.jobs import FINISHED, JobConflictError, JobHandler, JobQueueFullError
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+JOB_ID = Path(..., pattern=r"^[0-9a-f]{32}$")
+
+# Seconds between status checks for jobs running on another worker
+EVENTS_POLL_INTERVAL = 1.0
+
+
+def _job_response(job: Dict[str, Any]) -> JobResponse:
+    return JobResponse(
+        job_id=job["id"],
+        kind=job["kind"],
+        status=job["status"],
+        created_at=job["created_at"],
+        updated_at=job["updated_at"],
+        expires_at=job["expires_at"],
+        result=job["result"],
+        error=job["error"],
+    )
+
+
+async def _submit(
+    request: Request,
+    response: Response,
+    kind: str,
+    payload: Dict[str, Any],
+    handler: JobHandler,
+    idempotency_key: Optional[str],
+) -> JobResponse:
+    """Submit a job; 202 for a new job, 200 for a resubmission"""
+    # OWASP: Injection - the key is stored, so bound it
+    if idempotency_key is not None and not 0 < len(idempotency_key) <= 200:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Idempotency-Key must be 1 to 200 characters"
+        )
+
+    try:
+        job, created = await request.app.state.job_runner.submit(kind, payload, handler, idempotency_key)
+    except JobConflictError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    except JobQueueFullError as e:
+        logger.warning(f"Refusing {kind} job: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many jobs pending, please retry later",
+            headers={"Retry-After": "30"},
+        )
+
+    response.status_code = status.HTTP_202_ACCEPTED if created else status.HTTP_200_OK
+    response.headers["Location"] = f"/api/llm/jobs/{job['id']}"
+    return _job_response(job)
+
+
+@router.post("/generate-document", response_model=JobResponse, status_code=status.HTTP_202_ACCEPTED)
+@limiter.limit("5/minute")
+async def submit_document_job(
+    request: Request,
+    response: Response,
+    doc_request: DocumentGenerateRequest,
+    idempotency_key: Optional[str] = Header(default=None),
+    authorized: bool = Depends(verify_api_key)
+):
+    """
+    Generate a scholarship application document in the background
+
+    Returns the job at once; its result is a DocumentGenerateResponse.
+    """
+    gemini_service = request.app.state.gemini_service
+    student_profile = request_profile(doc_request.student_profile, doc_request.profile_digest)
+
+    async def run():
+        document = await gemini_service.generate_document(
+            document_type=doc_request.document_type,
+            student_profile=student_profile,
+            scholarship_info=doc_request.scholarship_info,
+            additional_context=doc_request.additional_context
+        )
+        return DocumentGenerateResponse(success=True, document=document).model_dump()
+
+    return await _submit(request, response, "generate-document", doc_request.model_dump(), run, idempotency_key)
+
+
+@router.post("/scholarships/discover", response_model=JobResponse, status_code=status.HTTP_202_ACCEPTED)
+@limiter.limit("5/minute")
+async def submit_discovery_job(
+    request: Request,
+    response: Response,
+    discovery_request: ScholarshipDiscoveryRequest,
+    idempotency_key: Optional[str] = Header(default=None),
+    authorized: bool = Depends(verify_api_key)
+):
+    """
+    Discover scholarships in the background
+
+    Returns the job at once; its result is a ScholarshipDiscoveryResponse.
+    """
+    gemini_service = request.app.state.gemini_service
+
+    async def run():
+        scholarships = await gemini_service.discover_scholarships(discovery_request.count)
+        return ScholarshipDiscoveryResponse(scholarships=scholarships, count=len(scholarships)).model_dump()
+
+    return await _submit(
+        request, response, "scholarships/discover", discovery_request.model_dump(), run, idempotency_key
+    )
+
+
+@router.get("/{job_id}", response_model=JobResponse)
+async def get_job(
+    request: Request,
+    job_id: str = JOB_ID,
+    authorized: bool = Depends(verify_api_key)
+):
+    """Get a job's status, and its result once finished"""
+    job = request.app.state.job_runner.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found or expired")
+    return _job_response(job)
+
+
+@router.get("/{job_id}/events")
+async def job_events(
+    request: Request,
+    job_id: str = JOB_ID,
+    authorized: bool = Depends(verify_api_key)
+):
+    """
+    Stream a job's status changes as server-sent events
+
+    Each event is the job; the last one carries the result or error and is
+    followed by [DONE]. If the request deadline passes first the stream ends
+    without [DONE] and the client can subscribe again.
+    """
+    job_runner = request.app.state.job_runner
+    job = job_runner.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found or expired")
+
+    async def generate():
+        current = job
+        last_status = None
+        while True:
+            if current is None:
+                yield sse_event({"job_id": job_id, "error": "Job not found or expired"})
+                return
+            if current["status"] != last_status:
+                last_status = current["status"]
+                yield sse_event(_job_response(current).model_dump())
+            if current["status"] in FINISHED:
+                yield DONE_EVENT
+                return
+
+            left = deadline.remaining()
+            if left is not None and left <= 0:
+                return
+            await job_runner.wait(job_id, min(EVENTS_POLL_INTERVAL, left) if left is not None else EVENTS_POLL_INTERVAL)
+            current = job_runner.get(job_id)
+
+    return sse_response(generate())
@@ -0,0 +1,90 @@
+"""
+Student Profile API Routes
+Register a profile once and pass its digest instead of the full profile
+"""
+
+import logging
+import sqlite3
+from typing import Any, Dict, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Path, Request, Response, status
+
+from app.models.requests import ProfileRegisterRequest
+from app.models.responses import ProfileResponse
+from app.core.security import verify_api_key
+from app.core.rate_limit import limiter
+from app.services.profiles import (
+    ProfileNotFoundError,
+    ProfileTooLargeError,
+    RegisteredProfile,
+    StudentProfile,
+    profile_registry,
+)
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+PROFILE_DIGEST = Path(..., pattern=r"^[0-9a-f]{64}$")
+
+
+def _profile_response(registered: RegisteredProfile) -> ProfileResponse:
+    return ProfileResponse(
+        digest=registered.digest,
+        profile_id=registered.profile_id,
+        version=registered.version,
+        expires_at=registered.expires_at,
+    )
+
+
+def request_profile(
+    student_profile: Optional[Dict[str, Any]],
+    profile_digest: Optional[str]
+) -> Optional[StudentProfile]:
+    """The profile a request passed inline or by digest; 422 if the digest is unknown"""
+    try:
+        return profile_registry.resolve(student_profile, profile_digest)
+    except ProfileNotFoundError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+
+
+@router.post("", response_model=ProfileResponse, status_code=status.HTTP_201_CREATED)
+@limiter.limit("30/minute")
+async def register_profile(
+    request: Request,
+    response: Response,
+    profile_request: ProfileRegisterRequest,
+    authorized: bool = Depends(verify_api_key)
+):
+    """
+    Register a student profile
+
+    - **profile**: Student profile data
+    - **profile_id**: Optional caller's name for the profile, to version it
+
+    Returns the profile's digest, to pass as profile_digest to matching,
+    document generation, faculty discovery and interviews. Registering the
+    same content again returns the same digest and keeps it for longer.
+    """
+    try:
+        registered, created = profile_registry.register(profile_request.profile, profile_request.profile_id)
+    except ProfileTooLargeError as e:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e))
+    except sqlite3.Error as e:
+        logger.error(f"Profile registry write failed: {e}", exc_info=True)
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Profile registry unavailable")
+
+    response.status_code = status.HTTP_201_CREATED if created else status.HTTP_200_OK
+    return _profile_response(registered)
+
+
+@router.get("/{profile_digest}", response_model=ProfileResponse)
+async def get_profile(
+    request: Request,
+    profile_digest: str = PROFILE_DIGEST,
+    authorized: bool = Depends(verify_api_key)
+):
+    """Get a registered profile's metadata, to check whether it needs registering again"""
+    registered = profile_registry.get(profile_digest)
+    if registered is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found or expired")
+    return _profile_response(registered)
@@ -7,17 +7,19 @@ from fastapi import APIRouter, Depends, HTTPException, status, Request
 
 from app.models.requests import ScholarshipMatchRequest
 from app.models.responses import ScholarshipMatchResponse
+from app.core.deadline import DeadlineExceededError
 from app.core.security import verify_api_key
-from slowapi import Limiter
-from slowapi.util import get_remote_address
+from app.core.rate_limit import limiter
+from app.api.routes.profiles import request_profile
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
-limiter = Limiter(key_func=get_remote_address)
+
+RATE_LIMIT = "20/minute"
 
 
 @router.post("/match-scholarships", response_model=ScholarshipMatchResponse)
-@limiter.limit("20/minute")
+@limiter.limit(RATE_LIMIT)
 async def match_scholarships(
     request: Request,
     match_request: ScholarshipMatchRequest,
@@ -27,6 +29,7 @@ async def match_scholarships(
     Match student with relevant scholarships using AI
     
     - **student_profile**: Student's profile data
+    - **profile_digest**: Or the digest of a registered profile
     - **scholarships**: List of available scholarships
     
     Returns list of matched scholarships with:
@@ -36,6 +39,9 @@ async def match_scholarships(
     - Strengths and weaknesses
     - Recommendations
     """
+    # A registered profile is looked up by its digest
+    student_profile = request_profile(match_request.student_profile, match_request.profile_digest)
+    
     try:
         logger.info(f"Received scholarship match request for {len(match_request.scholarships)} scholarships")
         
@@ -44,7 +50,7 @@ async def match_scholarships(
         
         # Match scholarships
         matches = await gemini_service.match_scholarships(
-            student_profile=match_request.student_profile,
+            student_profile=student_profile,
             scholarships=match_request.scholarships
         )
         
@@ -56,6 +62,8 @@ async def match_scholarships(
             total_matches=len(matches)
         )
         
+    except DeadlineExceededError:
+        raise
     except ValueError as e:
         logger.warning(f"Validation error in scholarship matching: {e}")
         raise HTTPException(
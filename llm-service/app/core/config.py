@@ -4,10 +4,15 @@ OWASP: Security Misconfiguration - Centralized configuration management
 """
 
 import os
-from typing import List
+import tempfile
+from pathlib import Path
+from typing import List, Optional
 from pydantic_settings import BaseSettings
 from pydantic import Field, validator
 
+# State that must outlive the process (mount a volume here in containers)
+DATA_DIR = Path(__file__).resolve().parents[2] / "data"
+
 
 class Settings(BaseSettings):
     """Application settings with validation"""
@@ -16,10 +21,24 @@ class Settings(BaseSettings):
     ENVIRONMENT: str = Field(default="development", env="ENVIRONMENT")
     SERVICE_PORT: int = Field(default=10000, env="PORT")
     LOG_LEVEL: str = Field(default="INFO", env="LOG_LEVEL")
+    # Per-logger fraction of INFO/DEBUG lines to keep, e.g. "main=0.1"
+    LOG_SAMPLING: str = Field(default="", env="LOG_SAMPLING")
+    LOG_MAX_MESSAGE_LENGTH: int = Field(default=4000, env="LOG_MAX_MESSAGE_LENGTH")
+    LOG_QUEUE_SIZE: int = Field(default=10000, env="LOG_QUEUE_SIZE")
     
     # Gemini AI Configuration
     GEMINI_API_KEY: str = Field(..., env="GEMINI_API_KEY")
     GEMINI_MODEL: str = Field(default="gemini-3.0-pro", env="GEMINI_MODEL")
+    # Follow-up calls that resume a response stopped at max_output_tokens (0 disables)
+    GEMINI_MAX_CONTINUATIONS: int = Field(default=2, env="GEMINI_MAX_CONTINUATIONS")
+    
+    # LLM backend: live (Gemini), record (Gemini + write cassettes) or replay (serve cassettes)
+    LLM_BACKEND: str = Field(default="live", env="LLM_BACKEND")
+    LLM_CASSETTE_PATH: Optional[str] = Field(default=None, env="LLM_CASSETTE_PATH")
+    # Replay timing: 1.0 = recorded latencies, 2.0 = twice as fast, 0 = no delays
+    LLM_REPLAY_SPEED: float = Field(default=1.0, env="LLM_REPLAY_SPEED")
+    # Fail on prompts missing from the cassette instead of serving recordings in order
+    LLM_REPLAY_STRICT: bool = Field(default=False, env="LLM_REPLAY_STRICT")
     
     # Security - OWASP: Broken Access Control
     CORE_API_URL: str = Field(default="http://core-api:3000", env="CORE_API_URL")
@@ -36,25 +55,117 @@ class Settings(BaseSettings):
     # Rate Limiting - OWASP: Insufficient Logging & Monitoring
     RATE_LIMIT_PER_MINUTE: int = Field(default=60, env="RATE_LIMIT_PER_MINUTE")
     RATE_LIMIT_PER_HOUR: int = Field(default=1000, env="RATE_LIMIT_PER_HOUR")
+    # Shared by all worker processes: sqlite:///<file> (one host) or redis://<host> (many hosts)
+    RATE_LIMIT_STORAGE_URI: str = Field(
+        default=f"sqlite:///{os.path.join(tempfile.gettempdir(), 'scholarhunter-ratelimit.db')}",
+        env="RATE_LIMIT_STORAGE_URI"
+    )
+    # Service-wide Gemini request budget across all workers (0 disables)
+    GEMINI_REQUESTS_PER_MINUTE: int = Field(default=0, env="GEMINI_REQUESTS_PER_MINUTE")
+    
+    # Adaptive concurrency limits per worker (see app.core.load_shedding)
+    LOAD_SHEDDING_ENABLED: bool = Field(default=True, env="LOAD_SHEDDING_ENABLED")
+    CONCURRENCY_INITIAL_LIMIT: int = Field(default=10, env="CONCURRENCY_INITIAL_LIMIT")
+    CONCURRENCY_MIN_LIMIT: int = Field(default=2, env="CONCURRENCY_MIN_LIMIT")
+    CONCURRENCY_MAX_LIMIT: int = Field(default=100, env="CONCURRENCY_MAX_LIMIT")
+    CONCURRENCY_MAX_IN_FLIGHT: int = Field(default=200, env="CONCURRENCY_MAX_IN_FLIGHT")
+    CONCURRENCY_BULK_SHARE: float = Field(default=0.75, env="CONCURRENCY_BULK_SHARE")
+    CONCURRENCY_QUEUE_SIZE: int = Field(default=10, env="CONCURRENCY_QUEUE_SIZE")
+    CONCURRENCY_QUEUE_TIMEOUT: float = Field(default=2.0, env="CONCURRENCY_QUEUE_TIMEOUT")
+    CONCURRENCY_BULK_QUEUE_TIMEOUT: float = Field(default=0.5, env="CONCURRENCY_BULK_QUEUE_TIMEOUT")
+    CONCURRENCY_LATENCY_TOLERANCE: float = Field(default=2.0, env="CONCURRENCY_LATENCY_TOLERANCE")
+    
+    # Background jobs (see app.services.jobs); the store is shared by all workers on the host
+    JOB_STORE_PATH: str = Field(
+        default=os.path.join(tempfile.gettempdir(), "scholarhunter-jobs.db"),
+        env="JOB_STORE_PATH"
+    )
+    JOB_MAX_CONCURRENCY: int = Field(default=4, env="JOB_MAX_CONCURRENCY")
+    JOB_MAX_PENDING: int = Field(default=100, env="JOB_MAX_PENDING")
+    JOB_TIMEOUT: int = Field(default=600, env="JOB_TIMEOUT")
+    JOB_RESULT_TTL: int = Field(default=3600, env="JOB_RESULT_TTL")
+    JOB_LEASE_SECONDS: int = Field(default=60, env="JOB_LEASE_SECONDS")
+    
+    # Operations of one /batch request run at the same time (see app.services.batch)
+    BATCH_MAX_CONCURRENCY: int = Field(default=4, env="BATCH_MAX_CONCURRENCY")
     
     # Request Timeouts
-    REQUEST_TIMEOUT: int = Field(default=30, env="REQUEST_TIMEOUT")
+    # Deadline for requests without an X-Request-Timeout-Ms header (all retries included)
+    REQUEST_TIMEOUT: int = Field(default=120, env="REQUEST_TIMEOUT")
+    # Limit for one Gemini call, or one wait for the next stream chunk
     GEMINI_TIMEOUT: int = Field(default=60, env="GEMINI_TIMEOUT")
     
+    # Startup Warmup
+    WARMUP_CONNECTIONS: bool = Field(default=True, env="WARMUP_CONNECTIONS")
+    WARMUP_TIMEOUT: int = Field(default=10, env="WARMUP_TIMEOUT")
+    
+    # Seconds between checks for edited instruction files (0 disables hot reload)
+    INSTRUCTION_RELOAD_INTERVAL: int = Field(default=5, env="INSTRUCTION_RELOAD_INTERVAL")
+    
+    # Monitoring
+    METRICS_ENABLED: bool = Field(default=True, env="METRICS_ENABLED")
+    
+    # Tracing - spans are exported only if a file or collector is configured
+    TRACE_SAMPLE_RATE: float = Field(default=0.1, env="TRACE_SAMPLE_RATE")
+    TRACE_EXPORT_PATH: Optional[str] = Field(default=None, env="TRACE_EXPORT_PATH")
+    TRACE_COLLECTOR_URL: Optional[str] = Field(default=None, env="TRACE_COLLECTOR_URL")
+    
     # File Upload Limits - OWASP: Injection
     MAX_FILE_SIZE_MB: int = Field(default=10, env="MAX_FILE_SIZE_MB")
     ALLOWED_FILE_TYPES: str = Field(
         default="pdf,doc,docx,txt",
         env="ALLOWED_FILE_TYPES"
     )
+    # Chat attachments (see app.services.attachments), shared by all workers on the host
+    ATTACHMENT_STORE_PATH: str = Field(
+        default=os.path.join(tempfile.gettempdir(), "scholarhunter-attachments"),
+        env="ATTACHMENT_STORE_PATH"
+    )
+    ATTACHMENT_TTL: int = Field(default=86400, env="ATTACHMENT_TTL")
+    ATTACHMENT_MIME_TYPES: str = Field(
+        default="application/pdf,text/plain,image/png,image/jpeg,image/webp,image/heic,image/heif",
+        env="ATTACHMENT_MIME_TYPES"
+    )
+    # Registered student profiles (see app.services.profiles), shared by all workers on the host;
+    # clients hold digests for a long time, so keep it on persistent storage
+    PROFILE_STORE_PATH: str = Field(
+        default=str(DATA_DIR / "profiles.db"),
+        env="PROFILE_STORE_PATH"
+    )
+    PROFILE_TTL: int = Field(default=2592000, env="PROFILE_TTL")
     
     # Prompt Configuration
     MAX_PROMPT_LENGTH: int = Field(default=10000, env="MAX_PROMPT_LENGTH")
     MAX_RESPONSE_TOKENS: int = Field(default=4096, env="MAX_RESPONSE_TOKENS")
+    # Ask the model again for only the fields of a response that fail its response_schema
+    OUTPUT_REASK_ENABLED: bool = Field(default=True, env="OUTPUT_REASK_ENABLED")
+    OUTPUT_REASK_MAX_FIELDS: int = Field(default=20, env="OUTPUT_REASK_MAX_FIELDS")
     
     # Cache Configuration
     ENABLE_CACHE: bool = Field(default=True, env="ENABLE_CACHE")
     CACHE_TTL_SECONDS: int = Field(default=3600, env="CACHE_TTL_SECONDS")
+    # Faculty discovery lists (see app.services.faculty_directory), shared by all workers on the host
+    FACULTY_CACHE_PATH: str = Field(
+        default=os.path.join(tempfile.gettempdir(), "scholarhunter-faculty.db"),
+        env="FACULTY_CACHE_PATH"
+    )
+    FACULTY_CACHE_TTL: int = Field(default=604800, env="FACULTY_CACHE_TTL")
+    # Entries of a list whose next level is fetched in the background (0 disables)
+    FACULTY_PREFETCH_COUNT: int = Field(default=3, env="FACULTY_PREFETCH_COUNT")
+    FACULTY_PREFETCH_CONCURRENCY: int = Field(default=2, env="FACULTY_PREFETCH_CONCURRENCY")
+    # Pre-generated interview practice questions (see app.services.question_pool)
+    QUESTION_POOL_PATH: str = Field(
+        default=os.path.join(tempfile.gettempdir(), "scholarhunter-questions.db"),
+        env="QUESTION_POOL_PATH"
+    )
+    QUESTION_POOL_SIZE: int = Field(default=10, env="QUESTION_POOL_SIZE")
+    QUESTION_POOL_MIN_AVAILABLE: int = Field(default=3, env="QUESTION_POOL_MIN_AVAILABLE")
+    QUESTION_POOL_TTL: int = Field(default=604800, env="QUESTION_POOL_TTL")
+    QUESTION_POOL_REFILL_CONCURRENCY: int = Field(default=2, env="QUESTION_POOL_REFILL_CONCURRENCY")
+    # Answers to first chat messages, reused for similar messages (see app.services.chat_cache)
+    CHAT_CACHE_MAX_ENTRIES: int = Field(default=1000, env="CHAT_CACHE_MAX_ENTRIES")
+    CHAT_CACHE_SIMILARITY: float = Field(default=0.9, env="CHAT_CACHE_SIMILARITY")
+    CHAT_CACHE_MAX_MESSAGE_CHARS: int = Field(default=300, env="CHAT_CACHE_MAX_MESSAGE_CHARS")
     
     @validator("ENVIRONMENT")
     def validate_environment(cls, v):
@@ -72,6 +183,31 @@ class Settings(BaseSettings):
             raise ValueError(f"LOG_LEVEL must be one of {allowed}")
         return v.upper()
     
+    @validator("LLM_BACKEND")
+    def validate_llm_backend(cls, v, values):
+        """Validate LLM backend; cassettes hold user prompts, so never record in production"""
+        allowed = ["live", "record", "replay"]
+        if v not in allowed:
+            raise ValueError(f"LLM_BACKEND must be one of {allowed}")
+        if v == "record" and values.get("ENVIRONMENT") == "production":
+            raise ValueError("LLM_BACKEND=record is not allowed in production")
+        return v
+    
+    @validator("CONCURRENCY_MAX_LIMIT")
+    def validate_concurrency_limits(cls, v, values):
+        """Validate the adaptive limit bounds are ordered"""
+        min_limit = values.get("CONCURRENCY_MIN_LIMIT", 1)
+        if min_limit < 1 or v < min_limit:
+            raise ValueError("CONCURRENCY_MAX_LIMIT must be >= CONCURRENCY_MIN_LIMIT >= 1")
+        return v
+    
+    @validator("CONCURRENCY_BULK_SHARE")
+    def validate_bulk_share(cls, v):
+        """Validate the bulk share is a fraction"""
+        if not 0 < v <= 1:
+            raise ValueError("CONCURRENCY_BULK_SHARE must be in (0, 1]")
+        return v
+    
     @validator("GEMINI_API_KEY")
     def validate_api_key(cls, v):
         """Validate API key is not empty"""
@@ -106,6 +242,11 @@ class Settings(BaseSettings):
         """Get ALLOWED_FILE_TYPES as a list"""
         return [ft.strip() for ft in self.ALLOWED_FILE_TYPES.split(",")]
     
+    @property
+    def attachment_mime_types_list(self) -> List[str]:
+        """Get ATTACHMENT_MIME_TYPES as a list"""
+        return [mt.strip().lower() for mt in self.ATTACHMENT_MIME_TYPES.split(",")]
+    
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
@@ -0,0 +1,77 @@
+"""
+Request deadlines
+Propagates the caller's time budget from the request into Gemini calls
+
+The core-api sends the time it will wait for a response in the
+``X-Request-Timeout-Ms`` header; requests without it get REQUEST_TIMEOUT.
+The middleware turns the budget into an absolute deadline held in a context
+variable, and GeminiService bounds each attempt (and the waits between
+retries) by the smaller of GEMINI_TIMEOUT and the time left, so retries and
+fallbacks never run past the point where the caller has given up.
+"""
+
+import time
+from contextvars import ContextVar
+from typing import Any, Optional
+
+from app.core.config import settings
+
+DEADLINE_HEADER = "x-request-timeout-ms"
+
+# Upper bound for a caller-supplied budget
+MAX_BUDGET_SECONDS = 3600.0
+
+_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+
+class DeadlineExceededError(Exception):
+    """The request's time budget ran out"""
+
+
+def budget_from_headers(headers: Optional[Any]) -> float:
+    """Seconds the caller will wait, from X-Request-Timeout-Ms or REQUEST_TIMEOUT"""
+    if headers is not None:
+        value = headers.get(DEADLINE_HEADER)
+        if value:
+            try:
+                return min(max(int(value) / 1000, 0.0), MAX_BUDGET_SECONDS)
+            except ValueError:
+                pass
+    return float(settings.REQUEST_TIMEOUT)
+
+
+def set_deadline(budget: float):
+    """Start the deadline for the current request; returns a token for ``reset_deadline``"""
+    return _deadline.set(time.monotonic() + budget)
+
+
+def reset_deadline(token):
+    _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left before the deadline, or None outside a request"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def expired() -> bool:
+    left = remaining()
+    return left is not None and left <= 0
+
+
+def attempt_timeout(limit: float) -> float:
+    """
+    Timeout for the next step: ``limit`` capped by the time left
+
+    Raises:
+        DeadlineExceededError: If the deadline has already passed
+    """
+    left = remaining()
+    if left is None:
+        return limit
+    if left <= 0:
+        raise DeadlineExceededError("Request deadline exceeded")
+    return min(limit, left)
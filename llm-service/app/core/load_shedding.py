@@ -0,0 +1,330 @@
+"""
+Adaptive concurrency limits and load shedding
+OWASP: Denial of Service - Bounded in-flight work per worker
+
+When Gemini slows down, requests otherwise pile up in the service until
+every one of them times out. Each worker instead admits only as many
+Gemini-backed requests as the upstream can currently serve:
+
+- every Gemini-backed route (INTERACTIVE_ROUTES and BULK_ROUTES) has its
+  own concurrency limit, adjusted by AIMD: it grows by one request per
+  "limit" completions while latency stays near the route's usual latency,
+  and shrinks by 10% (at most once per typical request duration) when
+  latency rises past CONCURRENCY_LATENCY_TOLERANCE times the usual, or a
+  request fails upstream
+- all routes together have one more AIMD limit (up to
+  CONCURRENCY_MAX_IN_FLIGHT), shrunk whenever any route is congested, of
+  which bulk routes (discovery, matching, document generation) may only use
+  CONCURRENCY_BULK_SHARE, leaving headroom for interactive ones (chat,
+  interview)
+- requests over the limit wait in a short per-route queue; queued
+  interactive requests are admitted before bulk ones, and bulk requests give
+  up sooner
+- requests that find the queue full or wait too long are rejected at once
+  with 503 and a Retry-After header, instead of timing out later
+
+The latency signal is the time to the first response body chunk: the whole
+request for JSON routes, the time to the first model chunk for streams.
+Limits are per worker process; the event loop is single threaded, so the
+bookkeeping needs no locks.
+"""
+
+import asyncio
+import itertools
+import logging
+import math
+import time
+from typing import Dict, List, Optional
+
+from app.core.config import settings
+from app.core.metrics import CONCURRENCY_LIMIT, CONCURRENCY_QUEUE_WAIT, LOAD_SHED
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = 0
+BULK = 1
+
+# Routes that call Gemini while a user waits on the other end of a conversation
+INTERACTIVE_ROUTES = {
+    "/api/llm/chat",
+    "/api/llm/chat/stream",
+    "/api/llm/interview/practice",
+    "/api/llm/interview/interactive",
+    "/api/llm/interview/interactive/stream",
+}
+# The other routes that call Gemini during the request. Profiles, attachments
+# and jobs (which only queue work the job runner limits itself) are not
+# limited: they would take slots and skew the latency the limits adapt to.
+BULK_ROUTES = {
+    "/api/llm/parse-cv",
+    "/api/llm/match-scholarships",
+    "/api/llm/scholarships/discover",
+    "/api/llm/generate-document",
+    "/api/llm/generate-document/stream",
+    "/api/llm/faculty/discover",
+    "/api/llm/interview/evaluate",
+    "/api/llm/batch",
+}
+
+
+class LoadShedError(Exception):
+    """A request was rejected to keep the worker within its concurrency limit"""
+
+    def __init__(self, route: str, reason: str, retry_after: int):
+        super().__init__(f"Request to {route} shed ({reason})")
+        self.route = route
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdaptiveLimit:
+    """AIMD concurrency limit"""
+
+    BACKOFF = 0.9
+
+    def __init__(self, name: str, initial: int, min_limit: int, max_limit: int):
+        self.name = name
+        self.limit = float(min(max(initial, min_limit), max_limit))
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        CONCURRENCY_LIMIT.labels(name).set(self.limit)
+
+    def has_capacity(self, share: float = 1.0) -> bool:
+        return self.in_flight < max(1, int(self.limit * share))
+
+    def adjust(self, congested: bool, period: float):
+        """
+        Grow the limit additively, or shrink it multiplicatively when congested
+
+        Requests started under the old limit finish slowly too, so the limit
+        shrinks at most once per ``period`` (about one request duration)
+        rather than once per slow completion.
+        """
+        now = time.monotonic()
+        if congested:
+            if now - self._last_decrease >= period:
+                self.limit = max(self.min_limit, self.limit * self.BACKOFF)
+                self._last_decrease = now
+        elif self.in_flight + 1 >= self.limit / 2:
+            # Only grow a limit that is being used
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+        CONCURRENCY_LIMIT.labels(self.name).set(self.limit)
+
+
+class RouteLimit(AdaptiveLimit):
+    """Limit of one route, with its latency history and queue"""
+
+    # Weight of a new sample in the current and the usual latency
+    SHORT_WEIGHT = 0.2
+    LONG_WEIGHT = 0.01
+
+    def __init__(self, route: str, priority: int, initial: int, min_limit: int, max_limit: int, tolerance: float):
+        super().__init__(route, initial, min_limit, max_limit)
+        self.priority = priority
+        self.tolerance = tolerance
+        self.queued = 0
+        self.current_latency: Optional[float] = None
+        self.usual_latency: Optional[float] = None
+
+    def observe(self, latency: Optional[float], ok: bool) -> bool:
+        """
+        Record a completed request
+
+        Returns:
+            Whether the route is congested: the request failed upstream or the
+            current latency is over ``tolerance`` times the usual latency
+        """
+        if latency is not None:
+            if self.current_latency is None:
+                self.current_latency = self.usual_latency = latency
+            else:
+                self.current_latency += (latency - self.current_latency) * self.SHORT_WEIGHT
+                self.usual_latency += (latency - self.usual_latency) * self.LONG_WEIGHT
+        return not ok or (
+            self.current_latency is not None
+            and self.current_latency > self.usual_latency * self.tolerance
+        )
+
+    def retry_after(self) -> int:
+        """Seconds a shed client should wait: about one request duration"""
+        return min(max(math.ceil(self.current_latency or 1.0), 1), 30)
+
+
+class _Waiter:
+    __slots__ = ("route", "seq", "future")
+
+    def __init__(self, route: RouteLimit, seq: int, future: asyncio.Future):
+        self.route = route
+        self.seq = seq
+        self.future = future
+
+
+class LoadShedder:
+    """Admits requests to Gemini-backed routes within their adaptive limits"""
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        initial_limit: int = 10,
+        min_limit: int = 2,
+        max_limit: int = 100,
+        max_in_flight: int = 200,
+        bulk_share: float = 0.75,
+        queue_size: int = 10,
+        queue_timeout: float = 2.0,
+        bulk_queue_timeout: float = 0.5,
+        latency_tolerance: float = 2.0,
+    ):
+        self.enabled = enabled
+        self.initial_limit = initial_limit
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.bulk_share = bulk_share
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.bulk_queue_timeout = bulk_queue_timeout
+        self.latency_tolerance = latency_tolerance
+        # Gemini is shared by every route: all of them together get one more
+        # adaptive limit, starting at twice a route's
+        self.total = AdaptiveLimit("all", 2 * initial_limit, min_limit, max_in_flight)
+        self.routes: Dict[str, RouteLimit] = {}
+        self._waiters: List[_Waiter] = []
+        self._seq = itertools.count()
+
+    def applies(self, route: str) -> bool:
+        """Whether requests to a route (its path template) are limited"""
+        return self.enabled and (route in INTERACTIVE_ROUTES or route in BULK_ROUTES)
+
+    def _route(self, route: str) -> RouteLimit:
+        limit = self.routes.get(route)
+        if limit is None:
+            limit = RouteLimit(
+                route,
+                INTERACTIVE if route in INTERACTIVE_ROUTES else BULK,
+                self.initial_limit,
+                self.min_limit,
+                self.max_limit,
+                self.latency_tolerance,
+            )
+            self.routes[route] = limit
+        return limit
+
+    def has_spare_capacity(self) -> bool:
+        """Whether Gemini can take optional background work (prefetches, refills) without crowding out requests"""
+        return not self.enabled or self.total.has_capacity(self.bulk_share)
+
+    def _total_capacity(self, route: RouteLimit) -> bool:
+        return self.total.has_capacity(1.0 if route.priority == INTERACTIVE else self.bulk_share)
+
+    def _can_admit(self, route: RouteLimit) -> bool:
+        return route.has_capacity() and self._total_capacity(route)
+
+    def _admit(self, route: RouteLimit):
+        route.in_flight += 1
+        self.total.in_flight += 1
+
+    def _shed(self, route: RouteLimit, reason: str) -> LoadShedError:
+        LOAD_SHED.labels(route.name, reason).inc()
+        logger.warning(
+            f"Shedding request to {route.name} ({reason})",
+            extra={
+                "route": route.name,
+                "reason": reason,
+                "limit": round(route.limit, 1),
+                "total_limit": round(self.total.limit, 1),
+                "in_flight": route.in_flight,
+                "queued": route.queued,
+            }
+        )
+        return LoadShedError(route.name, reason, route.retry_after())
+
+    async def acquire(self, route_label: str) -> RouteLimit:
+        """
+        Wait for a slot on a route
+
+        Returns:
+            The route's limit, to be passed to ``release``
+
+        Raises:
+            LoadShedError: If the route's queue is full or the wait timed out
+        """
+        route = self._route(route_label)
+
+        # Queued requests of the same route, or of a higher priority waiting
+        # for the shared limit, go first
+        ahead = any(
+            w.route is route or (w.route.priority <= route.priority and w.route.has_capacity())
+            for w in self._waiters
+        )
+        if not ahead and self._can_admit(route):
+            self._admit(route)
+            return route
+
+        if route.queued >= self.queue_size:
+            raise self._shed(route, "queue_full")
+
+        waiter = _Waiter(route, next(self._seq), asyncio.get_running_loop().create_future())
+        self._waiters.append(waiter)
+        route.queued += 1
+        started = time.perf_counter()
+        timeout = self.queue_timeout if route.priority == INTERACTIVE else self.bulk_queue_timeout
+        try:
+            await asyncio.wait({waiter.future}, timeout=timeout)
+        except BaseException:
+            # Cancelled while queued (client disconnect): give back a slot granted meanwhile
+            self._leave_queue(waiter)
+            if waiter.future.done() and not waiter.future.cancelled():
+                self.release(route, None, True)
+            raise
+        self._leave_queue(waiter)
+        CONCURRENCY_QUEUE_WAIT.labels(route_label).observe(time.perf_counter() - started)
+        if not waiter.future.done():
+            waiter.future.cancel()
+            raise self._shed(route, "queue_timeout")
+        return route
+
+    def _leave_queue(self, waiter: _Waiter):
+        if waiter in self._waiters:
+            self._waiters.remove(waiter)
+            waiter.route.queued -= 1
+
+    def release(self, route: RouteLimit, latency: Optional[float], ok: bool):
+        """
+        Free a slot and feed the outcome to the limits
+
+        Args:
+            route: The limit returned by ``acquire``
+            latency: Seconds to the first response body chunk, None if unknown
+            ok: False if the request failed upstream (5xx)
+        """
+        route.in_flight -= 1
+        self.total.in_flight -= 1
+        congested = route.observe(latency, ok)
+        period = route.current_latency or 0.0
+        route.adjust(congested, period)
+        self.total.adjust(congested, period)
+        self._wake()
+
+    def _wake(self):
+        """Admit queued requests that now fit, interactive first, oldest first"""
+        for waiter in sorted(self._waiters, key=lambda w: (w.route.priority, w.seq)):
+            if not waiter.future.done() and self._can_admit(waiter.route):
+                self._admit(waiter.route)
+                waiter.future.set_result(True)
+                self._leave_queue(waiter)
+
+
+load_shedder = LoadShedder(
+    enabled=settings.LOAD_SHEDDING_ENABLED,
+    initial_limit=settings.CONCURRENCY_INITIAL_LIMIT,
+    min_limit=settings.CONCURRENCY_MIN_LIMIT,
+    max_limit=settings.CONCURRENCY_MAX_LIMIT,
+    max_in_flight=settings.CONCURRENCY_MAX_IN_FLIGHT,
+    bulk_share=settings.CONCURRENCY_BULK_SHARE,
+    queue_size=settings.CONCURRENCY_QUEUE_SIZE,
+    queue_timeout=settings.CONCURRENCY_QUEUE_TIMEOUT,
+    bulk_queue_timeout=settings.CONCURRENCY_BULK_QUEUE_TIMEOUT,
+    latency_tolerance=settings.CONCURRENCY_LATENCY_TOLERANCE,
+)
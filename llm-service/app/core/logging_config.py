@@ -1,24 +1,41 @@
 """
 Logging configuration
 OWASP: Insufficient Logging & Monitoring
+
+Log calls on the request path only build the record and put it on an
+in-memory queue; formatting and the write to stdout happen on a background
+listener thread, so a slow log consumer cannot stall the event loop.
+
+High-volume INFO lines can be sampled per logger (LOG_SAMPLING) and every
+message is capped at LOG_MAX_MESSAGE_LENGTH characters. Warnings and errors
+are never sampled.
 """
 
+import atexit
 import logging
+import logging.handlers
+import os
+import queue
+import random
 import sys
-from typing import Any
+from typing import Dict, Optional
 import json
-from datetime import datetime
+from datetime import datetime, timezone
 
 from app.core.config import settings
+from app.core.metrics import LOG_RECORDS_DROPPED
+
+# Attributes every LogRecord has; anything else was passed through ``extra``
+_RESERVED_ATTRS = frozenset(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
 
 
 class JSONFormatter(logging.Formatter):
     """Custom JSON formatter for structured logging"""
-    
+
     def format(self, record: logging.LogRecord) -> str:
         """Format log record as JSON"""
         log_data = {
-            "timestamp": datetime.utcnow().isoformat(),
+            "timestamp": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
             "level": record.levelname,
             "logger": record.name,
             "message": record.getMessage(),
@@ -26,32 +43,146 @@ class JSONFormatter(logging.Formatter):
             "function": record.funcName,
             "line": record.lineno,
         }
-        
-        # Add extra fields if present
-        if hasattr(record, "extra"):
-            log_data.update(record.extra)
-        
-        # Add exception info if present
-        if record.exc_info:
+
+        # Add fields passed as logger.info(..., extra={...})
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS and key not in log_data:
+                log_data[key] = value
+
+        # Add exception info if present (already rendered when queued)
+        if record.exc_text:
+            log_data["exception"] = record.exc_text
+        elif record.exc_info:
             log_data["exception"] = self.formatException(record.exc_info)
-        
-        return json.dumps(log_data)
+
+        return json.dumps(log_data, default=str)
+
+
+def parse_sampling(spec: str) -> Dict[str, float]:
+    """
+    Parse LOG_SAMPLING, e.g. "main=0.1,app.api.routes.chat=0.5"
+
+    Returns:
+        Mapping of logger name to the fraction of INFO/DEBUG records to keep
+    """
+    rates = {}
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        name, _, rate = item.partition("=")
+        rates[name.strip()] = min(max(float(rate), 0.0), 1.0)
+    return rates
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps a fraction of INFO/DEBUG records for the configured loggers"""
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+        self._resolved: Dict[str, Optional[float]] = {}
+
+    def _rate(self, name: str) -> Optional[float]:
+        """Sampling rate of the logger or its closest configured ancestor"""
+        if name not in self._resolved:
+            rate = None
+            candidate = name
+            while candidate:
+                if candidate in self.rates:
+                    rate = self.rates[candidate]
+                    break
+                candidate = candidate.rpartition(".")[0]
+            self._resolved[name] = rate
+        return self._resolved[name]
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self._rate(record.name)
+        return rate is None or random.random() < rate
+
+
+class QueueLogHandler(logging.handlers.QueueHandler):
+    """
+    Queues records for a background listener thread
+
+    The listener is started lazily in each process, so workers forked from a
+    preloaded gunicorn master get their own writer thread. When the queue is
+    full, records are dropped and counted (llm_log_records_dropped_total)
+    instead of blocking the caller.
+    """
+
+    def __init__(self, handlers, max_queue: int = 10000, max_message_length: int = 0):
+        super().__init__(queue.Queue(maxsize=max_queue))
+        self.target_handlers = handlers
+        self.max_queue = max_queue
+        self.max_message_length = max_message_length
+        self.dropped = 0
+        self.listener: Optional[logging.handlers.QueueListener] = None
+        self._pid: Optional[int] = None
+
+    def _start_listener(self):
+        self._pid = os.getpid()
+        # A fresh queue: the parent's may hold records and locks copied at fork
+        self.queue = queue.Queue(maxsize=self.max_queue)
+        self.listener = logging.handlers.QueueListener(
+            self.queue, *self.target_handlers, respect_handler_level=True
+        )
+        self.listener.start()
+
+    def stop(self):
+        """Flush queued records and stop the listener thread"""
+        if self.listener is not None and self._pid == os.getpid():
+            self.listener.stop()
+            self.listener = None
+            self._pid = None
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """Merge args into the message and render tracebacks before queueing"""
+        message = record.getMessage()
+        if self.max_message_length and len(message) > self.max_message_length:
+            message = (
+                f"{message[:self.max_message_length]}... "
+                f"[truncated {len(message) - self.max_message_length} chars]"
+            )
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        # The queue handler is the root's only handler, so the record can be prepared in place
+        record.msg = message
+        record.args = None
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            LOG_RECORDS_DROPPED.inc()
+
+    def emit(self, record: logging.LogRecord):
+        if self._pid != os.getpid():
+            self._start_listener()
+        super().emit(record)
 
 
 def setup_logging():
     """Setup logging configuration"""
-    
+
     # Create logger
     logger = logging.getLogger()
     logger.setLevel(getattr(logging, settings.LOG_LEVEL))
-    
+
     # Remove existing handlers
+    for handler in logger.handlers:
+        if isinstance(handler, QueueLogHandler):
+            handler.stop()
     logger.handlers.clear()
-    
+
     # Create console handler
     console_handler = logging.StreamHandler(sys.stdout)
     console_handler.setLevel(getattr(logging, settings.LOG_LEVEL))
-    
+
     # Set formatter based on environment
     if settings.ENVIRONMENT == "production":
         # Use JSON formatter for production
@@ -62,10 +193,21 @@ def setup_logging():
             fmt="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
             datefmt="%Y-%m-%d %H:%M:%S",
         )
-    
+
     console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
-    
+
+    # Hand records to a background writer instead of writing on the caller's thread
+    queue_handler = QueueLogHandler(
+        [console_handler],
+        max_queue=settings.LOG_QUEUE_SIZE,
+        max_message_length=settings.LOG_MAX_MESSAGE_LENGTH,
+    )
+    sampling = parse_sampling(settings.LOG_SAMPLING)
+    if sampling:
+        queue_handler.addFilter(SamplingFilter(sampling))
+    logger.addHandler(queue_handler)
+    atexit.register(queue_handler.stop)
+
     # Log startup message
     logger.info(
         f"Logging configured - Level: {settings.LOG_LEVEL}, Environment: {settings.ENVIRONMENT}"
@@ -0,0 +1,172 @@
+"""
+Prometheus metrics
+OWASP: Insufficient Logging & Monitoring - Service telemetry exposed on /metrics
+
+Metric updates are in-process counter/histogram increments (a lock and an
+add), so they are safe to call on the request hot path. When the service runs
+under gunicorn with PROMETHEUS_MULTIPROC_DIR set, every worker writes its
+samples to that directory and /metrics aggregates them.
+"""
+
+import os
+import time
+from typing import AsyncIterator, Optional
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+
+# LLM calls take seconds, not milliseconds
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 45, 60, 90, 120)
+FIRST_CHUNK_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 1.5, 2, 3, 5, 10, 20)
+
+REQUEST_LATENCY = Histogram(
+    "llm_http_request_duration_seconds",
+    "HTTP request latency by route",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+REQUESTS_IN_PROGRESS = Gauge(
+    "llm_http_requests_in_progress",
+    "HTTP requests currently being served",
+    ["route"],
+    multiprocess_mode="livesum",
+)
+STREAM_FIRST_CHUNK = Histogram(
+    "llm_stream_first_chunk_seconds",
+    "Time from the start of a streaming response to its first model chunk",
+    ["route"],
+    buckets=FIRST_CHUNK_BUCKETS,
+)
+GEMINI_LATENCY = Histogram(
+    "llm_gemini_request_duration_seconds",
+    "Latency of a single Gemini call by model",
+    ["model", "mode"],
+    buckets=LATENCY_BUCKETS,
+)
+GEMINI_TOKENS = Counter(
+    "llm_gemini_tokens_total",
+    "Tokens reported by Gemini usage metadata",
+    ["model", "direction"],
+)
+GEMINI_RATE_LIMIT_RETRIES = Counter(
+    "llm_gemini_rate_limit_retries_total",
+    "Gemini calls retried after a rate limit (429) error",
+    ["model"],
+)
+GEMINI_QUOTA_WAIT = Counter(
+    "llm_gemini_quota_wait_seconds_total",
+    "Seconds spent waiting on the shared Gemini budget or 429 cooldown",
+)
+GEMINI_FALLBACKS = Counter(
+    "llm_gemini_model_fallbacks_total",
+    "Switches to a fallback model after a timeout or availability error",
+    ["from_model", "to_model"],
+)
+GEMINI_TRUNCATIONS = Counter(
+    "llm_gemini_truncations_total",
+    "Responses that stopped at max_output_tokens, by action: continued or returned truncated",
+    ["model", "action"],
+)
+OUTPUT_VALIDATION = Counter(
+    "llm_output_validation_total",
+    "Structured responses checked against their response_schema, by outcome: valid, fixed (by a re-ask) or invalid",
+    ["instruction", "outcome"],
+)
+JSON_DECODE = Counter(
+    "llm_json_decode_total",
+    "Model responses decoded as JSON, by tier: strict, fenced, repaired (json_repair) or failed",
+    ["tier"],
+)
+JSON_DECODE_SECONDS = Histogram(
+    "llm_json_decode_seconds",
+    "CPU time spent decoding a model response as JSON, by tier",
+    ["tier"],
+    buckets=(0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5),
+)
+CONCURRENCY_LIMIT = Gauge(
+    "llm_concurrency_limit",
+    "Adaptive concurrency limit by route",
+    ["route"],
+    multiprocess_mode="livesum",
+)
+CONCURRENCY_QUEUE_WAIT = Histogram(
+    "llm_concurrency_queue_wait_seconds",
+    "Time requests spent queued for a concurrency slot",
+    ["route"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5),
+)
+LOAD_SHED = Counter(
+    "llm_load_shed_total",
+    "Requests rejected with 503 by the concurrency limiter",
+    ["route", "reason"],
+)
+FACULTY_PREFETCH = Counter(
+    "llm_faculty_prefetch_total",
+    "Speculative faculty discovery prefetches, by outcome: fetched, cached, busy, dropped or failed",
+    ["outcome"],
+)
+QUESTION_POOL_REFILLS = Counter(
+    "llm_question_pool_refills_total",
+    "Background interview question pool refills, by outcome: refilled, full, busy, leased or failed",
+    ["outcome"],
+)
+QUESTION_POOL_QUESTIONS = Counter(
+    "llm_question_pool_questions_total",
+    "Questions generated by pool refills, by result: added or duplicate",
+    ["result"],
+)
+LOG_RECORDS_DROPPED = Counter(
+    "llm_log_records_dropped_total",
+    "Log records dropped because the log queue was full",
+)
+CACHE_REQUESTS = Counter(
+    "llm_cache_requests_total",
+    "Cache lookups by cache and result (hit/miss)",
+    ["cache", "result"],
+)
+
+
+def observe_usage(model: Optional[str], response) -> None:
+    """Record token counts from a Gemini response's usage metadata"""
+    usage = getattr(response, "usage_metadata", None)
+    if not usage:
+        return
+    model = model or "unknown"
+    GEMINI_TOKENS.labels(model, "input").inc(getattr(usage, "prompt_token_count", 0) or 0)
+    GEMINI_TOKENS.labels(model, "output").inc(getattr(usage, "candidates_token_count", 0) or 0)
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    """Record a cache lookup"""
+    CACHE_REQUESTS.labels(cache, "hit" if hit else "miss").inc()
+
+
+async def track_first_chunk(route: str, chunks: AsyncIterator[str]) -> AsyncIterator[str]:
+    """Pass a model stream through, recording the time to its first chunk"""
+    started = time.perf_counter()
+    first = True
+    async for chunk in chunks:
+        if first:
+            STREAM_FIRST_CHUNK.labels(route).observe(time.perf_counter() - started)
+            first = False
+        yield chunk
+
+
+def render_metrics() -> tuple[bytes, str]:
+    """Render the exposition format, aggregating workers in multiprocess mode"""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+
+    from prometheus_client import REGISTRY
+
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
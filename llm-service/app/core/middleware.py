@@ -0,0 +1,223 @@
+"""
+Request middleware
+OWASP: Security Misconfiguration & Insufficient Logging & Monitoring
+
+A single pure ASGI middleware that adds the security headers, writes the
+access log, records request metrics, opens the root trace span, starts
+the request deadline (see app.core.deadline) and admits requests within the
+adaptive concurrency limits (see app.core.load_shedding).
+
+Unlike ``@app.middleware("http")`` functions, it does not wrap the request
+in a Request/Response pair or pipe the body through an extra task and memory
+stream: it only wraps ``send`` to edit the response headers as they pass and
+to note when the last body chunk went out. Streaming (SSE) chunks are
+forwarded to the server as soon as the route yields them.
+
+Once the request body has been read, the middleware watches for the client
+disconnecting and cancels the route, so an in-flight Gemini call or stream
+is abandoned instead of generating output nobody will read. Such requests
+are recorded with status 499 (client closed request).
+"""
+
+import asyncio
+import logging
+import time
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import JSONResponse
+from starlette.routing import Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.deadline import budget_from_headers, reset_deadline, set_deadline
+from app.core.load_shedding import LoadShedError, load_shedder
+from app.core.metrics import REQUEST_LATENCY, REQUESTS_IN_PROGRESS
+from app.core.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+SECURITY_HEADERS = [
+    # Prevent clickjacking
+    ("X-Frame-Options", "DENY"),
+    # Prevent MIME type sniffing
+    ("X-Content-Type-Options", "nosniff"),
+    # Enable XSS protection
+    ("X-XSS-Protection", "1; mode=block"),
+    # Content Security Policy
+    ("Content-Security-Policy", "default-src 'self'"),
+    # Referrer Policy
+    ("Referrer-Policy", "strict-origin-when-cross-origin"),
+    # Permissions Policy
+    ("Permissions-Policy", "geolocation=(), microphone=(), camera=()"),
+]
+
+
+class RequestContextMiddleware:
+    """Security headers, access log, metrics and tracing for every HTTP request"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self._route_paths: Optional[set] = None
+
+    def _route_label(self, scope: Scope) -> str:
+        """
+        Metric label for a request: the matched route path, never the raw URL
+
+        Before routing (as when load shedding decides) a path with parameters
+        is matched against the routes, so /jobs/abc is labelled
+        /jobs/{job_id}, not "unmatched".
+        """
+        route = scope.get("route")
+        if route is not None:
+            return route.path
+        if self._route_paths is None and "app" in scope:
+            # Paths of the registered routes, used to bound metric label cardinality
+            self._route_paths = {getattr(r, "path", "") for r in scope["app"].routes}
+        path = scope["path"]
+        if self._route_paths and path in self._route_paths:
+            return path
+        best, best_match = "unmatched", Match.NONE
+        for candidate in scope["app"].routes if "app" in scope else ():
+            match, _ = candidate.matches(scope)
+            if match.value > best_match.value:
+                best, best_match = candidate.path, match
+                if match == Match.FULL:
+                    break
+        return best
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        method = scope["method"]
+        path = scope["path"]
+        client = scope.get("client")
+        route = self._route_label(scope)
+        in_progress = REQUESTS_IN_PROGRESS.labels(route)
+        in_progress.inc()
+
+        logger.info(
+            f"Request: {method} {path}",
+            extra={
+                "method": method,
+                "path": path,
+                "client_ip": client[0] if client else "unknown",
+            }
+        )
+
+        status_code = 500
+        finished = False
+        first_body_at: Optional[float] = None
+        headers = Headers(scope=scope)
+
+        # Root span of the request trace, continuing the core-api's trace id if sent
+        span = tracer.start_trace(f"{method} {path}", headers)
+
+        def record():
+            """Record the access log and latency once the last body chunk is sent"""
+            nonlocal finished
+            if finished:
+                return
+            finished = True
+            in_progress.dec()
+            elapsed = time.perf_counter() - started
+            REQUEST_LATENCY.labels(method, self._route_label(scope), str(status_code)).observe(elapsed)
+            logger.info(
+                f"Response: {status_code}",
+                extra={
+                    "status_code": status_code,
+                    "path": path,
+                    "duration_ms": round(elapsed * 1000, 2),
+                }
+            )
+
+        disconnected = asyncio.Event()
+        body_read = False
+        watcher: Optional[asyncio.Task] = None
+        app_task: Optional[asyncio.Task] = None
+
+        async def watch_disconnect():
+            """After the body is read the only message left is http.disconnect"""
+            while (await receive())["type"] != "http.disconnect":
+                pass
+            disconnected.set()
+            if app_task is not None and not finished:
+                app_task.cancel()
+
+        async def receive_wrapper() -> Message:
+            nonlocal body_read, watcher
+            if body_read:
+                # Starlette's own disconnect listeners share the watcher's result
+                await disconnected.wait()
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                disconnected.set()
+            elif not message.get("more_body", False):
+                body_read = True
+                watcher = asyncio.create_task(watch_disconnect())
+            return message
+
+        async def send_wrapper(message: Message):
+            nonlocal status_code, first_body_at
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                span.set_attribute("status_code", status_code)
+                headers = MutableHeaders(scope=message)
+                for name, value in SECURITY_HEADERS:
+                    headers[name] = value
+                if span.sampled:
+                    headers["X-Trace-Id"] = span.trace_id
+                await send(message)
+            elif message["type"] == "http.response.body":
+                if first_body_at is None:
+                    first_body_at = time.perf_counter()
+                await send(message)
+                if not message.get("more_body", False):
+                    record()
+            else:
+                await send(message)
+
+        deadline_token = set_deadline(budget_from_headers(headers))
+        slot = None
+        with span:
+            try:
+                if load_shedder.applies(route):
+                    try:
+                        slot = await load_shedder.acquire(route)
+                    except LoadShedError as exc:
+                        span.set_attribute("shed", exc.reason)
+                        response = JSONResponse(
+                            status_code=503,
+                            content={
+                                "error": "Service Unavailable",
+                                "message": "The service is overloaded, please retry later",
+                            },
+                            headers={"Retry-After": str(exc.retry_after)},
+                        )
+                        await response(scope, receive, send_wrapper)
+                        return
+                    admitted = time.perf_counter()
+                
+                # Run the route in its own task so a disconnect can cancel it
+                app_task = asyncio.create_task(self.app(scope, receive_wrapper, send_wrapper))
+                try:
+                    await app_task
+                except asyncio.CancelledError:
+                    if not disconnected.is_set():
+                        app_task.cancel()
+                        raise
+                    status_code = 499
+                    span.set_attribute("client_disconnected", True)
+            finally:
+                if slot is not None:
+                    # Disconnected requests say nothing about upstream latency
+                    latency = first_body_at - admitted if first_body_at is not None and status_code != 499 else None
+                    load_shedder.release(slot, latency, ok=status_code < 500)
+                reset_deadline(deadline_token)
+                if watcher is not None:
+                    watcher.cancel()
+                # Errors and client disconnects end the request without a final body chunk
+                record()
@@ -0,0 +1,255 @@
+"""
+Shared rate limiting and Gemini quota state
+OWASP: Insufficient Logging & Monitoring - Limits are enforced consistently across workers
+
+Every route module used to create its own in-memory ``slowapi.Limiter``, so each
+worker process kept a private counter and the effective limit grew with the
+worker count. All limits now go through a single limiter backed by a storage
+that every worker on the host (or every host) can see:
+
+- ``sqlite:///path/to/file.db`` - file-backed counters shared by all workers on
+  one host (put the file on ``/dev/shm`` to keep it in shared memory)
+- ``redis://host:port/db`` - shared by every worker on every host
+- ``memory://`` - per-process counters, only correct with a single worker
+"""
+
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from limits import RateLimitItem, parse
+from limits.storage import Storage, storage_from_string
+from limits.strategies import FixedWindowRateLimiter
+from slowapi import Limiter
+from slowapi.util import get_remote_address
+from starlette.requests import Request
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class SQLiteStorage(Storage):
+    """
+    Fixed-window rate limit storage kept in a SQLite database file.
+
+    Counters live in a single table and every update runs in an immediate
+    transaction, so increments from concurrent worker processes are atomic.
+    Connections are opened per thread and re-opened after a fork.
+    """
+
+    STORAGE_SCHEME = ["sqlite"]
+
+    def __init__(self, uri: Optional[str] = None, wrap_exceptions: bool = False, **options):
+        # sqlite:///tmp/limits.db -> /tmp/limits.db
+        self.path = uri.split("://", 1)[1] if uri else ":memory:"
+        self.timeout = float(options.pop("timeout", 5.0))
+        self._local = threading.local()
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def _connection(self) -> sqlite3.Connection:
+        """Get the connection for the current thread, reconnecting after fork"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS counters ("
+                "key TEXT PRIMARY KEY, value INTEGER NOT NULL, expiry REAL NOT NULL)"
+            )
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def incr(self, key: str, expiry: float, amount: int = 1) -> int:
+        """Increment the counter for a key, starting a new window if it expired"""
+        now = time.time()
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM counters WHERE key = ? AND expiry <= ?", (key, now))
+            conn.execute(
+                "INSERT INTO counters (key, value, expiry) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = value + excluded.value",
+                (key, amount, now + expiry),
+            )
+            value = conn.execute("SELECT value FROM counters WHERE key = ?", (key,)).fetchone()[0]
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return value
+
+    def get(self, key: str) -> int:
+        """Get the current counter value for a key"""
+        row = self._connection().execute(
+            "SELECT value FROM counters WHERE key = ? AND expiry > ?", (key, time.time())
+        ).fetchone()
+        return row[0] if row else 0
+
+    def get_expiry(self, key: str) -> float:
+        """Get the epoch time at which the key's window resets"""
+        row = self._connection().execute(
+            "SELECT expiry FROM counters WHERE key = ? AND expiry > ?", (key, time.time())
+        ).fetchone()
+        return row[0] if row else time.time()
+
+    def check(self) -> bool:
+        """Check the database is reachable"""
+        try:
+            self._connection().execute("SELECT 1")
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self) -> Optional[int]:
+        """Remove every counter"""
+        return self._connection().execute("DELETE FROM counters").rowcount
+
+    def clear(self, key: str) -> None:
+        """Remove the counter for a key"""
+        self._connection().execute("DELETE FROM counters WHERE key = ?", (key,))
+
+
+class GeminiQuotaGuard:
+    """
+    Service-wide Gemini request budget shared by all workers.
+
+    - A fixed-window budget (GEMINI_REQUESTS_PER_MINUTE) caps upstream calls
+      across every worker, not per process.
+    - When any worker is rate limited by Gemini (429), it trips a shared
+      cooldown so the other workers back off too instead of piling on.
+
+    The storage calls block (a SQLite write waits for the lock), so async
+    callers run them in a thread: ``acquire``, ``trip_async`` and
+    ``has_headroom_async``.
+    """
+
+    BUDGET_KEY = "gemini"
+    COOLDOWN_KEY = "gemini:cooldown"
+
+    def __init__(self, storage: Storage, requests_per_minute: int = 0):
+        self.storage = storage
+        self._strategy = FixedWindowRateLimiter(storage)
+        self._budget = parse(f"{requests_per_minute}/minute") if requests_per_minute > 0 else None
+
+    def cooldown_remaining(self) -> float:
+        """Seconds left on the shared 429 cooldown"""
+        if self.storage.get(self.COOLDOWN_KEY) <= 0:
+            return 0.0
+        return max(self.storage.get_expiry(self.COOLDOWN_KEY) - time.time(), 0.0)
+
+    def trip(self, seconds: float):
+        """Start (or extend) the shared cooldown after a Gemini 429"""
+        if self.cooldown_remaining() >= seconds:
+            return
+        self.storage.clear(self.COOLDOWN_KEY)
+        self.storage.incr(self.COOLDOWN_KEY, max(int(seconds), 1))
+        logger.warning(f"Gemini quota cooldown started for {seconds}s across all workers")
+
+    async def trip_async(self, seconds: float):
+        """``trip`` off the event loop"""
+        await asyncio.to_thread(self.trip, seconds)
+
+    def has_headroom(self, reserve: float = 0.0) -> bool:
+        """
+        Whether optional calls (prefetches) may spend budget now
+
+        True if there is no cooldown and more than ``reserve`` (a fraction)
+        of this minute's budget is left for user requests. An unreachable or
+        busy storage means no headroom: optional work can wait.
+        """
+        try:
+            if self.cooldown_remaining() > 0:
+                return False
+            if self._budget is None:
+                return True
+            stats = self._strategy.get_window_stats(self._budget, self.BUDGET_KEY)
+        except Exception as e:
+            logger.warning(f"Gemini budget unavailable, skipping optional work: {e}")
+            return False
+        return stats.remaining > self._budget.amount * reserve
+
+    async def has_headroom_async(self, reserve: float = 0.0) -> bool:
+        """``has_headroom`` off the event loop"""
+        return await asyncio.to_thread(self.has_headroom, reserve)
+
+    def _try_acquire(self) -> float:
+        """Take a slot in the request budget; returns 0, or the seconds to wait before trying again"""
+        delay = self.cooldown_remaining()
+        if delay > 0:
+            return delay
+        if self._budget is None or self._strategy.hit(self._budget, self.BUDGET_KEY):
+            return 0.0
+        reset_time = self._strategy.get_window_stats(self._budget, self.BUDGET_KEY).reset_time
+        delay = max(reset_time - time.time(), 0.05)
+        logger.info(f"Gemini request budget exhausted, waiting {delay:.1f}s")
+        return delay
+
+    async def acquire(self) -> float:
+        """
+        Wait for the shared cooldown and a slot in the request budget
+
+        Returns:
+            Seconds spent waiting
+        """
+        waited = 0.0
+        while True:
+            delay = await asyncio.to_thread(self._try_acquire)
+            if delay <= 0:
+                return waited
+            await asyncio.sleep(delay)
+            waited += delay
+
+
+def _create_storage(uri: str) -> Storage:
+    """Create the shared storage, falling back to memory if it is unreachable"""
+    try:
+        storage = storage_from_string(uri)
+        if storage.check():
+            return storage
+        logger.error(f"Rate limit storage {uri.split('://', 1)[0]}:// is not reachable")
+    except Exception as e:
+        logger.error(f"Failed to create rate limit storage: {e}")
+    logger.warning("Falling back to per-process in-memory rate limiting")
+    return storage_from_string("memory://")
+
+
+# Single limiter shared by every route; its counters live in the shared storage
+limiter = Limiter(
+    key_func=get_remote_address,
+    key_style="url",
+    storage_uri=settings.RATE_LIMIT_STORAGE_URI,
+    in_memory_fallback_enabled=True,
+)
+
+quota_guard = GeminiQuotaGuard(
+    _create_storage(settings.RATE_LIMIT_STORAGE_URI),
+    requests_per_minute=settings.GEMINI_REQUESTS_PER_MINUTE,
+)
+
+
+def charge_route_limit(request: Request, path: str, limit: RateLimitItem) -> bool:
+    """
+    Count a call against a route's limit, for work run on its behalf (batch operations)
+
+    The call is counted under the key the limiter uses for a request to
+    ``path`` (key_style "url": the client's address, then the path), so it
+    shares that route's budget with the client's direct requests.
+
+    Returns:
+        Whether the call is within the limit
+    """
+    if not limiter.enabled:
+        return True
+    # ``limiter.limiter`` is the in-memory fallback while the shared storage is down
+    return limiter.limiter.hit(limit, get_remote_address(request), path)
@@ -0,0 +1,33 @@
+"""
+Server-Sent Events
+Shared frame encoding and response for the streaming routes
+
+Frames are built as bytes with orjson, so each model chunk costs one
+serialization and no str -> bytes re-encoding when Starlette sends it.
+orjson writes UTF-8 directly instead of ASCII escapes; both are valid JSON
+for the core-api's EventSource parser.
+"""
+
+from typing import Any, AsyncIterator, Dict
+
+import orjson
+from fastapi.responses import StreamingResponse
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    "X-Accel-Buffering": "no",
+}
+
+# Terminal frame of the chat and document streams
+DONE_EVENT = b"data: [DONE]\n\n"
+
+
+def sse_event(data: Dict[str, Any]) -> bytes:
+    """Encode one ``data: <json>`` frame"""
+    return b"data: " + orjson.dumps(data) + b"\n\n"
+
+
+def sse_response(events: AsyncIterator[bytes]) -> StreamingResponse:
+    """Stream encoded frames as text/event-stream"""
+    return StreamingResponse(events, media_type="text/event-stream", headers=SSE_HEADERS)
@@ -0,0 +1,237 @@
+"""
+Request tracing
+OWASP: Insufficient Logging & Monitoring - Per-phase timings for slow requests
+
+Lightweight span tracing for the route layer and GeminiService. A trace is
+started per request, continuing the trace id from the core-api's W3C
+``traceparent`` header (or ``X-Request-ID``) when present. Child spans record
+named phases (prompt build, quota wait, generation, JSON parsing) with timings
+and attributes.
+
+Sampling is decided once per trace from its id (TRACE_SAMPLE_RATE), so every
+service that sees the same id makes the same decision. Unsampled requests get
+a shared no-op span, which keeps tracing overhead to a context variable
+lookup. Finished spans are handed to a background thread that appends JSON
+lines to TRACE_EXPORT_PATH or posts batches to TRACE_COLLECTOR_URL.
+"""
+
+import json
+import logging
+import os
+import queue
+import re
+import secrets
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+TRACEPARENT_RE = re.compile(r"^[0-9a-f]{2}-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+
+class Span:
+    """A timed, named phase of a trace"""
+
+    __slots__ = ("tracer", "trace_id", "span_id", "parent_id", "name", "attributes",
+                 "start_time", "_started", "duration_ms", "error", "_token")
+
+    sampled = True
+
+    def __init__(self, tracer: "Tracer", name: str, trace_id: str, parent_id: Optional[str],
+                 attributes: Dict[str, Any]):
+        self.tracer = tracer
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = attributes
+        self.start_time = time.time()
+        self._started = time.perf_counter()
+        self.duration_ms: Optional[float] = None
+        self.error: Optional[str] = None
+        self._token = None
+
+    def set_attribute(self, key: str, value: Any):
+        """Attach an attribute to the span"""
+        self.attributes[key] = value
+
+    def end(self, **attributes: Any):
+        """Finish the span and queue it for export"""
+        if self.duration_ms is not None:
+            return
+        self.attributes.update(attributes)
+        self.duration_ms = round((time.perf_counter() - self._started) * 1000, 3)
+        self.tracer.exporter.export(self)
+
+    def __enter__(self) -> "Span":
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _current_span.reset(self._token)
+        if exc is not None:
+            self.error = f"{exc_type.__name__}: {exc}"
+        self.end()
+        return False
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Span as a JSON-serializable dictionary"""
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_time": self.start_time,
+            "duration_ms": self.duration_ms,
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class _NoopSpan:
+    """Span returned when the trace is not sampled; every operation is a no-op"""
+
+    sampled = False
+    trace_id = None
+
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+    def end(self, **attributes: Any):
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class SpanExporter:
+    """Exports finished spans from a background thread"""
+
+    def __init__(self, path: Optional[str] = None, collector_url: Optional[str] = None,
+                 batch_size: int = 100, max_queue: int = 10000):
+        self.path = path
+        self.collector_url = collector_url
+        self.batch_size = batch_size
+        self.dropped = 0
+        self._queue: "queue.Queue[Span]" = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path or self.collector_url)
+
+    def export(self, span: Span):
+        """Queue a span without blocking the request; drop it if the queue is full"""
+        if self._pid != os.getpid():
+            # (Re)start the writer in each worker process after fork
+            self._start()
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def _start(self):
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write([span.to_dict() for span in batch])
+            except Exception as e:
+                logger.warning(f"Failed to export {len(batch)} spans: {e}")
+
+    def _write(self, spans: List[Dict[str, Any]]):
+        if self.path:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write("".join(json.dumps(span, default=str) + "\n" for span in spans))
+        if self.collector_url:
+            import httpx
+
+            httpx.post(self.collector_url, json={"spans": spans}, timeout=5.0)
+
+
+class Tracer:
+    """Creates sampled traces and child spans"""
+
+    def __init__(self, exporter: SpanExporter, sample_rate: float = 0.1):
+        self.exporter = exporter
+        self.sample_rate = sample_rate if exporter.enabled else 0.0
+
+    def _is_sampled(self, trace_id: str) -> bool:
+        """Deterministic ratio sampling on the low 32 bits of the trace id"""
+        if self.sample_rate <= 0:
+            return False
+        return int(trace_id[-8:], 16) < self.sample_rate * 0x100000000
+
+    def start_trace(self, name: str, headers: Optional[Any] = None, **attributes: Any):
+        """
+        Start the root span of a request
+
+        Args:
+            name: Span name, e.g. "POST /api/llm/chat"
+            headers: Incoming request headers, used to continue an upstream trace
+            **attributes: Attributes to attach to the span
+
+        Returns:
+            A Span, or NOOP_SPAN if the trace is not sampled
+        """
+        trace_id, parent_id = parse_trace_headers(headers)
+        if not self._is_sampled(trace_id):
+            return NOOP_SPAN
+        return Span(self, name, trace_id, parent_id, attributes)
+
+    def span(self, name: str, **attributes: Any):
+        """
+        Start a child span of the current span
+
+        Use as a context manager to make it the parent of nested spans, or call
+        ``end()`` explicitly for phases without children.
+        """
+        parent = _current_span.get()
+        if parent is None:
+            return NOOP_SPAN
+        return Span(self, name, parent.trace_id, parent.span_id, attributes)
+
+
+def parse_trace_headers(headers: Optional[Any]) -> tuple[str, Optional[str]]:
+    """Get (trace_id, parent_span_id) from traceparent / X-Request-ID, or a new trace id"""
+    if headers is not None:
+        match = TRACEPARENT_RE.match(headers.get("traceparent", "").strip().lower())
+        if match:
+            return match.group(1), match.group(2)
+        request_id = headers.get("x-request-id", "").replace("-", "").lower()
+        if len(request_id) == 32 and all(c in "0123456789abcdef" for c in request_id):
+            return request_id, None
+    return secrets.token_hex(16), None
+
+
+def current_span():
+    """The active span, or NOOP_SPAN outside a sampled trace"""
+    return _current_span.get() or NOOP_SPAN
+
+
+tracer = Tracer(
+    SpanExporter(path=settings.TRACE_EXPORT_PATH, collector_url=settings.TRACE_COLLECTOR_URL),
+    sample_rate=settings.TRACE_SAMPLE_RATE,
+)
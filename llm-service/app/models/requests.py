@@ -6,6 +6,9 @@ OWASP: Input Validation
 from typing import Optional, Dict, Any, List
 from pydantic import BaseModel, Field, validator
 
+PROFILE_DIGEST_PATTERN = r"^[0-9a-f]{64}$"
+PROFILE_DIGEST_DESCRIPTION = "Digest of a profile registered with POST /profiles, instead of student_profile"
+
 
 class CVParseRequest(BaseModel):
     """Request model for CV parsing"""
@@ -19,11 +22,29 @@ class CVParseRequest(BaseModel):
         return v.strip()
 
 
+class ProfileRegisterRequest(BaseModel):
+    """Request model for registering a student profile"""
+    profile: Dict[str, Any] = Field(..., description="Student profile data")
+    profile_id: Optional[str] = Field(
+        default=None,
+        pattern=r"^[A-Za-z0-9_.:-]{1,128}$",
+        description="Caller's name for the profile (e.g. a user id); new content under it gets the next version"
+    )
+
+
 class ScholarshipMatchRequest(BaseModel):
     """Request model for scholarship matching"""
-    student_profile: Dict[str, Any] = Field(..., description="Student profile data")
+    student_profile: Optional[Dict[str, Any]] = Field(default=None, description="Student profile data")
+    profile_digest: Optional[str] = Field(default=None, pattern=PROFILE_DIGEST_PATTERN, description=PROFILE_DIGEST_DESCRIPTION)
     scholarships: List[Dict[str, Any]] = Field(..., min_items=1, max_items=100, description="List of scholarships to match")
     
+    @validator("profile_digest", always=True)
+    def validate_profile(cls, v, values):
+        """Require a profile inline or by digest"""
+        if v is None and values.get("student_profile") is None:
+            raise ValueError("student_profile or profile_digest is required")
+        return v
+    
     @validator("scholarships")
     def validate_scholarships(cls, v):
         """Validate scholarships list"""
@@ -35,11 +56,19 @@ class ScholarshipMatchRequest(BaseModel):
 class DocumentGenerateRequest(BaseModel):
     """Request model for document generation"""
     document_type: str = Field(..., description="Type of document to generate")
-    student_profile: Dict[str, Any] = Field(..., description="Student profile data")
+    student_profile: Optional[Dict[str, Any]] = Field(default=None, description="Student profile data")
+    profile_digest: Optional[str] = Field(default=None, pattern=PROFILE_DIGEST_PATTERN, description=PROFILE_DIGEST_DESCRIPTION)
     scholarship_info: Dict[str, Any] = Field(..., description="Scholarship information")
     additional_context: Optional[Dict[str, Any]] = Field(default=None, description="Additional context")
     word_limit: Optional[int] = Field(default=None, ge=100, le=5000, description="Word limit for document")
     
+    @validator("profile_digest", always=True)
+    def validate_profile(cls, v, values):
+        """Require a profile inline or by digest"""
+        if v is None and values.get("student_profile") is None:
+            raise ValueError("student_profile or profile_digest is required")
+        return v
+    
     @validator("document_type")
     def validate_document_type(cls, v):
         """Validate document type"""
@@ -61,7 +90,10 @@ class ChatRequest(BaseModel):
     """Request model for chat"""
     message: str = Field(..., min_length=1, max_length=2000, description="User message")
     conversation_history: Optional[List[Dict[str, str]]] = Field(default=None, description="Previous conversation")
-    attachments: Optional[List[Dict[str, Any]]] = Field(default=None, description="File attachments (base64 and mime_type)")
+    attachments: Optional[List[Dict[str, Any]]] = Field(
+        default=None,
+        description="File attachments: {id} of an uploaded attachment, or inline {base64, mime_type}"
+    )
     
     @validator("message")
     def validate_message(cls, v):
@@ -80,6 +112,15 @@ class ChatRequest(BaseModel):
                 if msg["role"] not in ["user", "assistant"]:
                     raise ValueError("Role must be 'user' or 'assistant'")
         return v
+    
+    @validator("attachments")
+    def validate_attachments(cls, v):
+        """Validate each attachment is a reference or inline data"""
+        if v is not None:
+            for att in v:
+                if "id" not in att and ("base64" not in att or "mime_type" not in att):
+                    raise ValueError("Each attachment must have an 'id', or 'base64' and 'mime_type'")
+        return v
 
 
 class InterviewPrepRequest(BaseModel):
@@ -119,6 +160,18 @@ class InterviewPrepRequest(BaseModel):
         return v
 
 
+class InterviewAnswer(BaseModel):
+    """A practice question and the student's answer to it"""
+    question: str = Field(..., min_length=1, max_length=1000, description="Interview question")
+    student_answer: str = Field(..., min_length=1, max_length=5000, description="Student's answer")
+
+
+class InterviewEvaluationRequest(BaseModel):
+    """Request model for evaluating a practice session's answers together"""
+    scholarship_info: Dict[str, Any] = Field(..., description="Scholarship information")
+    answers: List[InterviewAnswer] = Field(..., min_length=1, max_length=30, description="Answers in session order")
+
+
 class ScholarshipDiscoveryRequest(BaseModel):
     """Request model for scholarship discovery"""
     count: int = Field(default=10, ge=1, le=50, description="Number of scholarships to discover")
@@ -139,6 +192,7 @@ class FacultyDiscoveryRequest(BaseModel):
     department: Optional[str] = None
     faculty_name: Optional[str] = None
     student_profile: Optional[Dict[str, Any]] = None
+    profile_digest: Optional[str] = Field(default=None, pattern=PROFILE_DIGEST_PATTERN, description=PROFILE_DIGEST_DESCRIPTION)
 
 
 class InterviewPersonaRequest(BaseModel):
@@ -149,6 +203,7 @@ class InterviewPersonaRequest(BaseModel):
     user_answer: Optional[str] = None
     history: Optional[List[Dict[str, str]]] = None
     student_profile: Optional[Dict[str, Any]] = None
+    profile_digest: Optional[str] = Field(default=None, pattern=PROFILE_DIGEST_PATTERN, description=PROFILE_DIGEST_DESCRIPTION)
     selected_panelists: Optional[List[Dict[str, str]]] = Field(
         default=None,
         description="List of selected panelists with id, name, role, and title"
@@ -159,3 +214,17 @@ class InterviewPersonaRequest(BaseModel):
     )
 
 
+class BatchOperation(BaseModel):
+    """One operation of a batch; params are those of the operation type's endpoint"""
+    id: str = Field(..., pattern=r"^[A-Za-z0-9_.-]{1,64}$", description="Id of the operation within the batch")
+    type: str = Field(..., description="parse_cv, match_scholarships, discover_scholarships, discover_faculty, generate_document, chat, interview_practice, evaluate_interview")
+    params: Dict[str, Any] = Field(
+        default_factory=dict,
+        description='Request body of the operation; a value may be {"$ref": "<id>[/<key>...]"} to use an earlier result'
+    )
+    depends_on: List[str] = Field(default_factory=list, max_length=20, description="Ids of operations to wait for")
+
+
+class BatchRequest(BaseModel):
+    """Request model for running several operations in one request"""
+    operations: List[BatchOperation] = Field(..., min_length=1, max_length=10, description="Operations to run")
@@ -42,12 +42,48 @@ class InterviewPrepResponse(BaseModel):
     error: Optional[str] = Field(default=None, description="Error message if failed")
 
 
+class InterviewEvaluationResponse(BaseModel):
+    """Response model for a practice session's evaluation"""
+    success: bool = Field(..., description="Whether evaluation was successful")
+    evaluations: Optional[List[Dict[str, Any]]] = Field(default=None, description="Feedback per answer, in session order")
+    report: Optional[Dict[str, Any]] = Field(default=None, description="Aggregate report of the session")
+    error: Optional[str] = Field(default=None, description="Error message if failed")
+
+
 class ScholarshipDiscoveryResponse(BaseModel):
     """Response model for scholarship discovery"""
     scholarships: List[Dict[str, Any]] = Field(..., description="List of discovered scholarships")
     count: int = Field(..., description="Number of scholarships discovered")
 
 
+class AttachmentResponse(BaseModel):
+    """Response model for a stored chat attachment"""
+    id: str = Field(..., description="SHA-256 of the content; reference it in chat attachments as {\"id\": ...}")
+    mime_type: str = Field(..., description="Content type")
+    size: int = Field(..., description="Size in bytes")
+    expires_at: float = Field(..., description="When it is deleted unless used again (epoch seconds)")
+
+
+class ProfileResponse(BaseModel):
+    """Response model for a registered student profile"""
+    digest: str = Field(..., description="SHA-256 of the canonical profile; pass it as profile_digest")
+    profile_id: Optional[str] = Field(default=None, description="Caller's name for the profile")
+    version: int = Field(..., description="Revision of the profile under its profile_id")
+    expires_at: float = Field(..., description="When it is deleted unless used again (epoch seconds)")
+
+
+class JobResponse(BaseModel):
+    """Response model for a background job"""
+    job_id: str = Field(..., description="Job identifier")
+    kind: str = Field(..., description="Job type")
+    status: str = Field(..., description="queued, running, succeeded or failed")
+    created_at: float = Field(..., description="Submission time (epoch seconds)")
+    updated_at: float = Field(..., description="Last status change (epoch seconds)")
+    expires_at: Optional[float] = Field(default=None, description="When the finished job is deleted (epoch seconds)")
+    result: Optional[Dict[str, Any]] = Field(default=None, description="Result once the job succeeded")
+    error: Optional[str] = Field(default=None, description="Error message if the job failed")
+
+
 class ErrorResponse(BaseModel):
     """Generic error response"""
     error: str = Field(..., description="Error message")
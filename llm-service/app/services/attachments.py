@@ -0,0 +1,251 @@
+"""
+Chat Attachments
+Content-addressed store for files attached to chat messages
+
+Chat used to receive every attachment as base64 inside each request, so a
+PDF discussed over several turns was re-sent, held as a string, decoded and
+copied into the prompt every time. Files are now uploaded once and
+referenced by their SHA-256 in later messages:
+
+- POST /api/llm/attachments streams the raw request body to disk while
+  hashing it, so a file is never held in memory whole; content uploaded
+  twice is stored once
+- files live under ATTACHMENT_STORE_PATH, indexed in a SQLite file shared
+  by every worker on the host, for ATTACHMENT_TTL seconds after last use
+- chat messages reference them as {"id": "<sha256>"}; inline base64
+  attachments are still accepted
+- backends that support it (live Gemini) upload a file to the provider
+  once and the prompt carries the file handle until it expires, instead of
+  the bytes
+
+OWASP: Injection - ids are validated as hex digests before touching the
+filesystem, and only ATTACHMENT_MIME_TYPES are accepted.
+
+Workers add and purge files under the index's write lock, so a purge in one
+worker cannot delete a file another worker has just stored again.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+ATTACHMENT_ID = re.compile(r"^[0-9a-f]{64}$")
+
+# Provider file handles are not used in their last hour
+HANDLE_MARGIN_SECONDS = 3600
+
+# Upload bytes buffered before they are written to disk off the event loop
+WRITE_BUFFER_BYTES = 1024 * 1024
+
+
+class AttachmentTooLargeError(Exception):
+    """An upload exceeded the size limit"""
+
+
+class AttachmentNotFoundError(ValueError):
+    """A referenced attachment does not exist or has expired"""
+
+
+class AttachmentStore:
+    """
+    Attachment files on disk with a SQLite index.
+
+    Index connections are opened per thread and re-opened after a fork, like
+    the job store.
+    """
+
+    COLUMNS = ("id", "mime_type", "size", "created_at", "expires_at", "file_uri", "file_expires_at")
+
+    def __init__(self, directory: str, ttl: float, max_bytes: int, timeout: float = 5.0):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self._local = threading.local()
+        self._uploads: Dict[str, asyncio.Task] = {}
+
+    def _connection(self) -> sqlite3.Connection:
+        """Get the index connection for the current thread, reconnecting after fork"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            os.makedirs(self.directory, exist_ok=True)
+            conn = sqlite3.connect(os.path.join(self.directory, "index.db"), timeout=self.timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS attachments ("
+                "id TEXT PRIMARY KEY, mime_type TEXT NOT NULL, size INTEGER NOT NULL, "
+                "created_at REAL NOT NULL, expires_at REAL NOT NULL, file_uri TEXT, file_expires_at REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS attachments_expires_at ON attachments (expires_at)")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _path(self, attachment_id: str) -> str:
+        return os.path.join(self.directory, attachment_id)
+
+    async def save(self, chunks: AsyncIterator[bytes], mime_type: str) -> Dict[str, Any]:
+        """
+        Store an upload, streamed chunk by chunk
+
+        Returns:
+            The attachment's metadata
+
+        Raises:
+            AttachmentTooLargeError: If the upload exceeds ``max_bytes``
+        """
+        await asyncio.to_thread(self.purge)
+        digest = hashlib.sha256()
+        size = 0
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, prefix=".upload-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                buffer = bytearray()
+                async for chunk in chunks:
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise AttachmentTooLargeError(f"Attachment exceeds {self.max_bytes} bytes")
+                    digest.update(chunk)
+                    buffer += chunk
+                    if len(buffer) >= WRITE_BUFFER_BYTES:
+                        await asyncio.to_thread(f.write, buffer)
+                        buffer = bytearray()
+                await asyncio.to_thread(f.write, buffer)
+            attachment_id = digest.hexdigest()
+            await asyncio.to_thread(self._store, temp_path, attachment_id, mime_type, size)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        logger.info(f"Stored attachment {attachment_id[:12]} ({mime_type}, {size} bytes)")
+        return self.get(attachment_id)
+
+    def _store(self, temp_path: str, attachment_id: str, mime_type: str, size: int):
+        """Index an uploaded file and move it into place, under the index's write lock"""
+        now = time.time()
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT INTO attachments (id, mime_type, size, created_at, expires_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET mime_type = excluded.mime_type, expires_at = excluded.expires_at",
+                (attachment_id, mime_type, size, now, now + self.ttl),
+            )
+            # Same content under the same name, so replacing a stored copy is harmless
+            os.replace(temp_path, self._path(attachment_id))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def get(self, attachment_id: str) -> Optional[Dict[str, Any]]:
+        """Get an attachment's metadata, or None if it does not exist or has expired"""
+        if not ATTACHMENT_ID.match(attachment_id):
+            return None
+        row = self._connection().execute(
+            f"SELECT {', '.join(self.COLUMNS)} FROM attachments WHERE id = ? AND expires_at > ?",
+            (attachment_id, time.time()),
+        ).fetchone()
+        if row is None or not os.path.exists(self._path(attachment_id)):
+            return None
+        return dict(zip(self.COLUMNS, row))
+
+    def touch(self, attachment_id: str):
+        """Keep a used attachment for another TTL"""
+        self._connection().execute(
+            "UPDATE attachments SET expires_at = ? WHERE id = ?", (time.time() + self.ttl, attachment_id)
+        )
+
+    def purge(self):
+        """
+        Delete expired attachments
+
+        Runs under the index's write lock, like ``_store``: a file is only
+        removed together with its row, while no other worker can store it
+        again.
+        """
+        conn = self._connection()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            expired = [row[0] for row in conn.execute(
+                "SELECT id FROM attachments WHERE expires_at <= ? LIMIT 100", (now,)
+            )]
+            for attachment_id in expired:
+                conn.execute("DELETE FROM attachments WHERE id = ?", (attachment_id,))
+                try:
+                    os.remove(self._path(attachment_id))
+                except FileNotFoundError:
+                    pass
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    async def prompt_part(self, attachment_id: str, backend: Any) -> Dict[str, Any]:
+        """
+        Prompt part for a stored attachment: a provider file handle if the
+        backend has (or can create) one, else the file's bytes
+
+        Raises:
+            AttachmentNotFoundError: If the attachment does not exist or has expired
+        """
+        attachment = self.get(attachment_id)
+        if attachment is None:
+            raise AttachmentNotFoundError(f"Attachment {attachment_id} not found or expired; please upload it again")
+        self.touch(attachment_id)
+
+        file_uri = attachment["file_uri"]
+        if not file_uri or (attachment["file_expires_at"] or 0) <= time.time() + HANDLE_MARGIN_SECONDS:
+            # Concurrent messages with the same file share one upload
+            upload = self._uploads.get(attachment_id)
+            if upload is None:
+                upload = asyncio.create_task(self._upload(attachment, backend))
+                self._uploads[attachment_id] = upload
+                upload.add_done_callback(lambda _: self._uploads.pop(attachment_id, None))
+            file_uri = await asyncio.shield(upload)
+
+        if file_uri:
+            return {"file_data": {"mime_type": attachment["mime_type"], "file_uri": file_uri}}
+        data = await asyncio.to_thread(self._read, attachment_id)
+        return {"mime_type": attachment["mime_type"], "data": data}
+
+    def _read(self, attachment_id: str) -> bytes:
+        with open(self._path(attachment_id), "rb") as f:
+            return f.read()
+
+    async def _upload(self, attachment: Dict[str, Any], backend: Any) -> Optional[str]:
+        """Upload a file to the provider; None if the backend keeps no files or the upload failed"""
+        try:
+            handle = await backend.upload_file(self._path(attachment["id"]), attachment["mime_type"])
+        except Exception as e:
+            logger.warning(f"Provider upload of attachment {attachment['id'][:12]} failed, sending it inline: {e}")
+            return None
+        if handle is None:
+            return None
+        file_uri, expires_at = handle
+        self._connection().execute(
+            "UPDATE attachments SET file_uri = ?, file_expires_at = ? WHERE id = ?",
+            (file_uri, expires_at, attachment["id"]),
+        )
+        return file_uri
+
+
+attachment_store = AttachmentStore(
+    settings.ATTACHMENT_STORE_PATH,
+    ttl=settings.ATTACHMENT_TTL,
+    max_bytes=settings.MAX_FILE_SIZE_MB * 1024 * 1024,
+)
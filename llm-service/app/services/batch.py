@@ -0,0 +1,167 @@
+"""
+Batch Operations
+Runs several LLM operations from one request, concurrently where they are independent
+
+The core-api often needs a few related operations at once: parse a CV and
+match scholarships against it, or several faculty lookups. Sent as separate
+requests, each pays HTTP, authentication and validation overhead. A batch
+carries them together:
+
+- each operation has an id, a type and the params of that type's endpoint
+- a param may be a reference to an earlier operation's result,
+  {"$ref": "<id>"} or {"$ref": "<id>/<key>/<index>..."}; an operation waits
+  for the operations it references and those listed in its depends_on
+- dependencies must name operations listed before, so a batch cannot
+  contain a cycle
+- independent operations run concurrently, at most BATCH_MAX_CONCURRENCY at
+  a time; an operation whose dependency did not succeed is skipped
+- each operation's outcome is reported as soon as it finishes, so a client
+  can use fast results while slow ones are still running
+
+All operations share the request's deadline.
+"""
+
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Set
+
+from app.core.deadline import DeadlineExceededError
+from app.core.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+SKIPPED = "skipped"
+
+REF_KEY = "$ref"
+
+Runner = Callable[[Dict[str, Any]], Awaitable[Any]]
+
+
+class BatchValidationError(ValueError):
+    """A batch names unknown operation types or dependencies"""
+
+
+class BatchReferenceError(ValueError):
+    """A reference points at a part of a result that does not exist"""
+
+
+def references(value: Any) -> Set[str]:
+    """Ids of the operations referenced in a params value"""
+    found: Set[str] = set()
+    if isinstance(value, dict):
+        if set(value) == {REF_KEY} and isinstance(value[REF_KEY], str):
+            found.add(value[REF_KEY].split("/", 1)[0])
+        else:
+            for item in value.values():
+                found |= references(item)
+    elif isinstance(value, list):
+        for item in value:
+            found |= references(item)
+    return found
+
+
+def resolve(value: Any, results: Dict[str, Any]) -> Any:
+    """
+    Replace the references in a params value by the results they point at
+
+    Raises:
+        BatchReferenceError: If a reference path does not exist in its result
+    """
+    if isinstance(value, dict):
+        if set(value) == {REF_KEY} and isinstance(value[REF_KEY], str):
+            ref = value[REF_KEY]
+            op_id, _, path = ref.partition("/")
+            target = results[op_id]
+            for key in path.split("/") if path else []:
+                if isinstance(target, dict) and key in target:
+                    target = target[key]
+                elif isinstance(target, list) and key.isdigit() and int(key) < len(target):
+                    target = target[int(key)]
+                else:
+                    raise BatchReferenceError(f"Reference '{ref}' does not exist in the result of '{op_id}'")
+            return target
+        return {k: resolve(v, results) for k, v in value.items()}
+    if isinstance(value, list):
+        return [resolve(item, results) for item in value]
+    return value
+
+
+def plan(operations: List[Dict[str, Any]], runners: Dict[str, Runner]) -> Dict[str, List[str]]:
+    """
+    Check a batch and work out what each operation waits for
+
+    Returns:
+        Dependency ids of each operation, by operation id
+
+    Raises:
+        BatchValidationError: On duplicate ids, unknown types, or dependencies
+            on operations that are not listed earlier
+    """
+    dependencies: Dict[str, List[str]] = {}
+    for op in operations:
+        op_id = op["id"]
+        if op_id in dependencies:
+            raise BatchValidationError(f"Operation id '{op_id}' is used twice")
+        if op["type"] not in runners:
+            raise BatchValidationError(f"Operation '{op_id}' has unknown type '{op['type']}'; expected one of {sorted(runners)}")
+        needed = set(op.get("depends_on") or []) | references(op.get("params") or {})
+        unknown = sorted(needed - set(dependencies))
+        if unknown:
+            raise BatchValidationError(f"Operation '{op_id}' depends on {unknown}, which must be listed before it")
+        dependencies[op_id] = sorted(needed)
+    return dependencies
+
+
+async def run_batch(
+    operations: List[Dict[str, Any]],
+    runners: Dict[str, Runner],
+    dependencies: Dict[str, List[str]],
+    max_concurrency: int
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Run a planned batch, yielding each operation's outcome as it finishes
+
+    Outcomes are {"id", "type", "status"} plus the "result" of a succeeded
+    operation or the "error" of a failed or skipped one. Unfinished
+    operations are cancelled if the consumer stops early.
+    """
+    semaphore = asyncio.Semaphore(max(max_concurrency, 1))
+    tasks: Dict[str, asyncio.Task] = {}
+
+    async def run(op: Dict[str, Any]) -> Dict[str, Any]:
+        outcome: Dict[str, Any] = {"id": op["id"], "type": op["type"]}
+        results = {}
+        for dep in dependencies[op["id"]]:
+            dep_outcome = await tasks[dep]
+            if dep_outcome["status"] != SUCCEEDED:
+                outcome.update(status=SKIPPED, error=f"Dependency '{dep}' {dep_outcome['status']}")
+                return outcome
+            results[dep] = dep_outcome["result"]
+
+        try:
+            params = resolve(op.get("params") or {}, results)
+            async with semaphore:
+                with tracer.span("batch.operation", type=op["type"]):
+                    result = await runners[op["type"]](params)
+            outcome.update(status=SUCCEEDED, result=result)
+        except DeadlineExceededError:
+            outcome.update(status=FAILED, error="Request deadline exceeded")
+        except ValueError as e:
+            outcome.update(status=FAILED, error=str(e))
+        except Exception as e:
+            logger.error(f"Batch operation '{op['id']}' ({op['type']}) failed: {e}", exc_info=True)
+            outcome.update(status=FAILED, error=f"Failed to run {op['type']}: {e}")
+        return outcome
+
+    for op in operations:
+        tasks[op["id"]] = asyncio.create_task(run(op))
+    try:
+        for finished in asyncio.as_completed(list(tasks.values())):
+            yield await finished
+    finally:
+        pending = [task for task in tasks.values() if not task.done()]
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
@@ -0,0 +1,250 @@
+"""
+Chat Response Cache
+Serves repeated first chat questions from earlier answers
+
+Many chat messages are the same FAQ in slightly different words ("what is
+an SOP?", "What's an SOP"), and each one pays for the full chat_assistant
+prompt and a generation. Answers to messages that start a conversation are
+kept and reused for later messages that mean nearly the same:
+
+- only messages without conversation history or attachments, of at most
+  CHAT_CACHE_MAX_MESSAGE_CHARS, are cached; longer messages tend to carry
+  personal details, and their answer must not be shown to someone else
+- messages are normalized (case, punctuation, filler words) and turned into
+  sparse vectors of words, word pairs and character trigrams, so reworded
+  questions and small typos land close together; no model or external service
+  is involved
+- a message is answered from the cache when its cosine similarity to a
+  cached one reaches CHAT_CACHE_SIMILARITY and they use the same words up to
+  typos: a word only one of them has must be one edit away from a word only
+  the other has, and numbers and short words must match exactly. Cosine
+  alone scores a long question about Nigeria close to the same question
+  about Ghana; candidates come from an inverted index on words, so a lookup
+  compares against a handful of entries
+- entries expire after CACHE_TTL_SECONDS and the least recently used are
+  evicted beyond CHAT_CACHE_MAX_ENTRIES
+- the cache is emptied when the chat_assistant instruction is reloaded, so
+  an edited prompt is never answered with the old one's output
+
+The index is kept in memory per worker: a lookup is a few dict operations
+and a hit needs no I/O.
+"""
+
+import copy
+import logging
+import math
+import re
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Dict, List, Optional, Set
+
+from app.core.metrics import record_cache
+from app.services.json_decoding import decode_json
+from app.services.output_schema import find_problems
+
+logger = logging.getLogger(__name__)
+
+INSTRUCTION = "chat_assistant"
+
+# Words that do not change what a question asks. Pronouns ("can I apply"
+# vs "can you apply"), auxiliaries carrying tense or negation ("does",
+# "did", "don't") and "no"/"not" are meaning and stay in.
+FILLER_WORDS = frozenset(
+    "a an the is are of to in on at for about and please hi hello hey thanks thank".split()
+)
+
+# Cached entries scored per lookup, taken by the number of words they share
+MAX_CANDIDATES = 20
+
+# Shorter words are names, acronyms or numbers often enough ("mit", "uk") to need an exact match
+MIN_TYPO_LENGTH = 5
+
+_POSSESSIVE = re.compile(r"['’]s\b")
+_NON_WORD = re.compile(r"[^\w\s]+")
+
+
+def normalize(message: str) -> List[str]:
+    """Words of a message that carry its meaning, in order"""
+    text = _POSSESSIVE.sub("", message.casefold())
+    words = _NON_WORD.sub(" ", text).split()
+    meaningful = [w for w in words if w not in FILLER_WORDS]
+    # A message made only of filler ("hi there") is its own meaning
+    return meaningful or words
+
+
+def vectorize(words: List[str]) -> Dict[str, float]:
+    """
+    Unit-length sparse vector of a normalized message
+
+    Words and adjacent word pairs weigh 1 each, and the character trigrams
+    of a word together weigh as much as the word, so a misspelt word still
+    partly matches
+    """
+    features: Counter = Counter()
+    for word in words:
+        features[word] += 1.0
+        padded = f"#{word}#"
+        trigrams = [padded[i:i + 3] for i in range(len(padded) - 2)]
+        for trigram in trigrams:
+            features[f"~{trigram}"] += 1.0 / math.sqrt(len(trigrams))
+    for first, second in zip(words, words[1:]):
+        features[f"{first} {second}"] += 1.0
+
+    norm = math.sqrt(sum(v * v for v in features.values()))
+    return {k: v / norm for k, v in features.items()} if norm else {}
+
+
+def similarity(a: Dict[str, float], b: Dict[str, float]) -> float:
+    """Cosine similarity of two unit-length vectors"""
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(v * b.get(k, 0.0) for k, v in a.items())
+
+
+def is_typo(a: str, b: str) -> bool:
+    """Whether two words of MIN_TYPO_LENGTH or more letters are one insertion, deletion, substitution or swap apart"""
+    if min(len(a), len(b)) < MIN_TYPO_LENGTH or not (a.isalpha() and b.isalpha()):
+        return False
+    if len(a) > len(b):
+        a, b = b, a
+    if len(b) - len(a) > 1:
+        return False
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    if len(a) < len(b):
+        return a[i:] == b[i + 1:]
+    swapped = a[i:i + 1] == b[i + 1:i + 2] and a[i + 1:i + 2] == b[i:i + 1] and a[i + 2:] == b[i + 2:]
+    return a[i + 1:] == b[i + 1:] or swapped
+
+
+def same_terms(a: Set[str], b: Set[str]) -> bool:
+    """Whether two messages' words match, allowing a typo for each word only one of them has"""
+    only_a, only_b = a - b, b - a
+    return (
+        all(any(is_typo(x, y) for y in only_b) for x in only_a)
+        and all(any(is_typo(y, x) for x in only_a) for y in only_b)
+    )
+
+
+class _Entry:
+    __slots__ = ("key", "words", "vector", "response", "expires_at")
+
+    def __init__(self, key: str, words: List[str], response: Dict[str, Any], expires_at: float):
+        self.key = key
+        self.words: Set[str] = set(words)
+        self.vector = vectorize(words)
+        self.response = response
+        self.expires_at = expires_at
+
+
+class ChatCache:
+    """Chat answers indexed by the meaning of the message they answered"""
+
+    def __init__(self, max_entries: int, ttl: float, threshold: float, max_message_chars: int):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self.max_message_chars = max_message_chars
+        # Bumped on invalidation; answers generated before it are not stored
+        self.generation = 0
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._postings: Dict[str, Set[str]] = {}
+
+    def cacheable(
+        self,
+        message: str,
+        conversation_history: Optional[list] = None,
+        attachments: Optional[list] = None
+    ) -> bool:
+        """Whether the answer to a message may be shared with other users"""
+        return not conversation_history and not attachments and len(message) <= self.max_message_chars
+
+    def get(self, message: str) -> Optional[Dict[str, Any]]:
+        """Answer of a cached message meaning the same, or None"""
+        entry = self._find(normalize(message))
+        record_cache("chat", entry is not None)
+        if entry is None:
+            return None
+        self._entries.move_to_end(entry.key)
+        return copy.deepcopy(entry.response)
+
+    def _find(self, words: List[str]) -> Optional[_Entry]:
+        if not words:
+            return None
+        now = time.time()
+
+        key = " ".join(words)
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry.expires_at > now:
+                return entry
+            self._remove(key)
+
+        terms = set(words)
+        shared: Counter = Counter()
+        for word in terms:
+            shared.update(self._postings.get(word, ()))
+        vector = vectorize(words)
+        best, best_score = None, self.threshold
+        for candidate_key, _ in shared.most_common(MAX_CANDIDATES):
+            candidate = self._entries[candidate_key]
+            if candidate.expires_at <= now:
+                self._remove(candidate_key)
+                continue
+            score = similarity(vector, candidate.vector)
+            if score >= best_score and same_terms(terms, candidate.words):
+                best, best_score = candidate, score
+        return best
+
+    def put(self, message: str, response: Dict[str, Any], generation: int):
+        """
+        Keep the answer to a message
+
+        Args:
+            message: The message answered
+            response: The chat response
+            generation: ``generation`` when the answer was requested; stale answers are dropped
+        """
+        words = normalize(message)
+        if generation != self.generation or not words or self.max_entries <= 0:
+            return
+        key = " ".join(words)
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = _Entry(key, words, copy.deepcopy(response), time.time() + self.ttl)
+        for word in set(words):
+            self._postings.setdefault(word, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+
+    def put_streamed(self, message: str, text: str, generation: int, schema: Optional[Dict[str, Any]]):
+        """Keep a streamed answer if it decodes to a response matching the instruction's schema"""
+        try:
+            response = decode_json(text)
+        except ValueError:
+            return
+        if not isinstance(response, dict) or (schema and find_problems(response, schema)):
+            return
+        self.put(message, response, generation)
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key)
+        for word in entry.words:
+            keys = self._postings.get(word)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._postings[word]
+
+    def invalidate(self):
+        """Drop every cached answer"""
+        self.generation += 1
+        self._entries.clear()
+        self._postings.clear()
+        logger.info("Chat cache cleared")
+
+    def on_instruction_reload(self, instruction_name: str):
+        """Instruction loader hook: answers of an edited chat prompt are stale"""
+        if instruction_name == INSTRUCTION:
+            self.invalidate()
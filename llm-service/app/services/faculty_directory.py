@@ -0,0 +1,298 @@
+"""
+Faculty Directory
+Caches the university → department → faculty tree and prefetches the next level
+
+Faculty discovery is a drill-down: LIST_UNIVERSITIES for a continent, then
+LIST_DEPARTMENTS for a university, then LIST_FACULTY for a department. These
+lists barely change, so each level is cached and the level a user is likely
+to open next is fetched while they read the current one:
+
+- entries are kept in a SQLite file (FACULTY_CACHE_PATH) shared by every
+  worker on the host, for FACULTY_CACHE_TTL seconds
+- a level is keyed by its path in the tree: the continent, the university,
+  or the university and department, compared case- and space-insensitively
+- cold emails, and lists asked for with a student profile, are personal
+  and never cached; neither are lists that fail the response_schema
+- after a list is served, the first FACULTY_PREFETCH_COUNT entries are
+  prefetched: the departments of the top universities, or the faculty of
+  the top departments
+- prefetches are optional work: at most FACULTY_PREFETCH_CONCURRENCY run at
+  a time, each under its own deadline, and they are skipped while the
+  Gemini quota is cooling down or short, or the service is near its
+  concurrency limit
+- concurrent requests for the same uncached level share one Gemini call
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core import deadline
+from app.core.deadline import DeadlineExceededError, reset_deadline, set_deadline
+from app.core.load_shedding import load_shedder
+from app.core.metrics import FACULTY_PREFETCH, record_cache
+from app.core.rate_limit import quota_guard
+from app.core.tracing import tracer
+from app.services.output_schema import find_problems
+from app.services.profiles import StudentProfile
+
+logger = logging.getLogger(__name__)
+
+LIST_UNIVERSITIES = "LIST_UNIVERSITIES"
+LIST_DEPARTMENTS = "LIST_DEPARTMENTS"
+LIST_FACULTY = "LIST_FACULTY"
+
+# The level a user opens after each list
+NEXT_LEVEL = {LIST_UNIVERSITIES: LIST_DEPARTMENTS, LIST_DEPARTMENTS: LIST_FACULTY}
+
+# Share of the minute's Gemini budget kept for user requests
+PREFETCH_BUDGET_RESERVE = 0.5
+
+# Prefetches waiting on this worker beyond which new ones are dropped
+PREFETCH_MAX_PENDING = 50
+
+Level = Tuple[str, Optional[str], Optional[str], Optional[str]]
+
+
+def _normalize(value: Optional[str]) -> str:
+    return " ".join((value or "").split()).casefold()
+
+
+def cache_key(mode: str, continent: Optional[str], university: Optional[str], department: Optional[str]) -> Optional[str]:
+    """Path of a level in the tree, or None if the request is not a cacheable list"""
+    if mode == LIST_UNIVERSITIES and _normalize(continent):
+        return f"{mode}/{_normalize(continent)}"
+    if mode == LIST_DEPARTMENTS and _normalize(university):
+        return f"{mode}/{_normalize(university)}"
+    if mode == LIST_FACULTY and _normalize(university) and _normalize(department):
+        return f"{mode}/{_normalize(university)}/{_normalize(department)}"
+    return None
+
+
+class FacultyCache:
+    """
+    Discovery results kept in a SQLite database file.
+
+    Connections are opened per thread and re-opened after a fork, like the
+    job store; expired entries are removed as new ones are written.
+    """
+
+    def __init__(self, path: str, ttl: float, timeout: float = 5.0):
+        self.path = path
+        self.ttl = ttl
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        """Get the connection for the current thread, reconnecting after fork"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS faculty_cache ("
+                "key TEXT PRIMARY KEY, result TEXT NOT NULL, "
+                "created_at REAL NOT NULL, expires_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS faculty_cache_expires_at ON faculty_cache (expires_at)")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Get a cached result, or None if it is missing or expired"""
+        row = self._connection().execute(
+            "SELECT result FROM faculty_cache WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def contains(self, key: str) -> bool:
+        row = self._connection().execute(
+            "SELECT 1 FROM faculty_cache WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        return row is not None
+
+    def put(self, key: str, result: Dict[str, Any]):
+        now = time.time()
+        conn = self._connection()
+        conn.execute("DELETE FROM faculty_cache WHERE expires_at <= ?", (now,))
+        conn.execute(
+            "INSERT OR REPLACE INTO faculty_cache (key, result, created_at, expires_at) VALUES (?, ?, ?, ?)",
+            (key, json.dumps(result, ensure_ascii=False), now, now + self.ttl),
+        )
+
+
+class FacultyDirectory:
+    """Serves faculty discovery from the cache, prefetching the next level"""
+
+    def __init__(
+        self,
+        gemini_service: Any,
+        cache: Optional[FacultyCache],
+        prefetch_count: int = 3,
+        prefetch_concurrency: int = 2,
+        prefetch_timeout: float = 120.0,
+    ):
+        self.gemini_service = gemini_service
+        self.cache = cache
+        self.prefetch_count = prefetch_count
+        self.prefetch_timeout = prefetch_timeout
+        self._semaphore = asyncio.Semaphore(max(prefetch_concurrency, 1))
+        self._loading: Dict[str, asyncio.Future] = {}
+        self._prefetches: Dict[str, asyncio.Task] = {}
+
+    async def discover(
+        self,
+        mode: str,
+        continent: Optional[str] = None,
+        university: Optional[str] = None,
+        department: Optional[str] = None,
+        student_profile: Optional[StudentProfile] = None
+    ) -> Dict[str, Any]:
+        """Same as GeminiService.discover_faculty, answered from the cache where possible"""
+        key = cache_key(mode, continent, university, department)
+        if self.cache is None or key is None or student_profile:
+            return await self.gemini_service.discover_faculty(
+                mode=mode,
+                continent=continent,
+                university=university,
+                department=department,
+                student_profile=student_profile
+            )
+
+        result = self._cached(key)
+        record_cache("faculty", result is not None)
+        if result is None:
+            result = await self._load(key, (mode, continent, university, department))
+
+        self._prefetch_next(mode, university, result)
+        return result
+
+    def _cached(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            return self.cache.get(key)
+        except sqlite3.Error as e:
+            logger.warning(f"Faculty cache read failed: {e}")
+            return None
+
+    async def _load(self, key: str, level: Level) -> Dict[str, Any]:
+        """Ask Gemini for a level and cache it, sharing the call with concurrent requests for it"""
+        pending = self._loading.get(key)
+        if pending is not None:
+            try:
+                return await asyncio.wait_for(asyncio.shield(pending), timeout=deadline.remaining())
+            except asyncio.TimeoutError:
+                raise DeadlineExceededError("Request deadline exceeded while waiting for faculty discovery")
+            except asyncio.CancelledError:
+                # The request that started the call went away; make our own,
+                # unless this request is being cancelled as well
+                task = asyncio.current_task()
+                if not pending.cancelled() or (task is not None and task.cancelling()):
+                    raise
+
+        future = asyncio.get_running_loop().create_future()
+        # Nobody may be waiting on it; do not log its error as unretrieved
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._loading[key] = future
+        try:
+            mode, continent, university, department = level
+            result = await self.gemini_service.discover_faculty(
+                mode=mode,
+                continent=continent,
+                university=university,
+                department=department
+            )
+            if self._valid(result):
+                try:
+                    self.cache.put(key, result)
+                except sqlite3.Error as e:
+                    logger.warning(f"Faculty cache write failed: {e}")
+            else:
+                logger.warning(f"Not caching {mode} result that fails its response schema")
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            self._loading.pop(key, None)
+
+    def _valid(self, result: Dict[str, Any]) -> bool:
+        """Whether a result satisfies the faculty_discovery response_schema"""
+        instructions = self.gemini_service.yaml_loader.load_template("faculty_discovery").instruction
+        schema = instructions.get("response_schema")
+        return schema is None or not find_problems(result, schema)
+
+    def _prefetch_next(self, mode: str, university: Optional[str], result: Dict[str, Any]):
+        """Start prefetching the children of the first entries of a list"""
+        next_mode = NEXT_LEVEL.get(mode)
+        if next_mode is None or self.prefetch_count <= 0:
+            return
+
+        names: List[str] = []
+        for item in result.get("results") or []:
+            if isinstance(item, dict) and isinstance(item.get("name"), str) and item["name"].strip():
+                names.append(item["name"])
+            if len(names) >= self.prefetch_count:
+                break
+
+        for name in names:
+            if next_mode == LIST_DEPARTMENTS:
+                level: Level = (next_mode, None, name, None)
+            else:
+                level = (next_mode, None, university, name)
+            key = cache_key(*level)
+            if key is None or key in self._loading or key in self._prefetches:
+                continue
+            if len(self._prefetches) >= PREFETCH_MAX_PENDING:
+                FACULTY_PREFETCH.labels("dropped").inc()
+                continue
+            self._prefetches[key] = asyncio.create_task(self._prefetch(key, level))
+
+    async def _has_headroom(self) -> bool:
+        """Whether Gemini can take optional work without slowing user requests"""
+        return load_shedder.has_spare_capacity() and await quota_guard.has_headroom_async(PREFETCH_BUDGET_RESERVE)
+
+    async def _prefetch(self, key: str, level: Level):
+        try:
+            async with self._semaphore:
+                # A user request may have loaded it while this one waited
+                if key in self._loading or self.cache.contains(key):
+                    FACULTY_PREFETCH.labels("cached").inc()
+                    return
+                if not await self._has_headroom():
+                    FACULTY_PREFETCH.labels("busy").inc()
+                    return
+
+                # The prefetch gets its own time budget, not the request's that started it
+                deadline_token = set_deadline(self.prefetch_timeout)
+                try:
+                    with tracer.span("faculty.prefetch", mode=level[0]):
+                        await self._load(key, level)
+                    FACULTY_PREFETCH.labels("fetched").inc()
+                except Exception as e:
+                    FACULTY_PREFETCH.labels("failed").inc()
+                    logger.warning(f"Faculty prefetch of {level[0]} failed: {e}")
+                finally:
+                    reset_deadline(deadline_token)
+        except sqlite3.Error as e:
+            FACULTY_PREFETCH.labels("failed").inc()
+            logger.warning(f"Faculty cache read failed: {e}")
+        finally:
+            self._prefetches.pop(key, None)
+
+    async def shutdown(self):
+        """Cancel pending prefetches"""
+        tasks = list(self._prefetches.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
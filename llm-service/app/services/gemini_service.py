@@ -3,18 +3,277 @@ Gemini AI Service
 Handles all interactions with Google Gemini 3.0 API
 """
 
+import asyncio
+import base64
 import logging
 import json
-from typing import Dict, Any, Optional, List
+import time
+from typing import Dict, Any, Optional, List, AsyncIterator, Tuple
 import google.generativeai as genai
+import orjson
 
 from app.core.config import settings
-from app.services.yaml_loader import YAMLInstructionLoader
+from app.services.yaml_loader import instruction_loader
+from app.services.attachments import attachment_store
+from app.services.profiles import StudentProfile, profile_json
+from app.services.json_decoding import REPAIRED, decode_with_tier
+from app.services.output_schema import Path, find_problems, format_path, merge_patch, patch_schema
+from app.services.prompt_templates import PromptTemplate
+from app.services.llm_backends import LLMBackend, create_backend
+from app.core import deadline
+from app.core.deadline import DeadlineExceededError
 from app.core.security import sanitize_input
+from app.core.rate_limit import quota_guard
+from app.core.metrics import (
+    GEMINI_FALLBACKS,
+    GEMINI_LATENCY,
+    GEMINI_QUOTA_WAIT,
+    GEMINI_RATE_LIMIT_RETRIES,
+    GEMINI_TRUNCATIONS,
+    OUTPUT_VALIDATION,
+    observe_usage,
+)
+from app.core.tracing import tracer
 
 logger = logging.getLogger(__name__)
 
 
+def _prompt_size(prompt: Any) -> int:
+    """Characters of text in a prompt (string or list of parts)"""
+    if isinstance(prompt, str):
+        return len(prompt)
+    return sum(len(part) for part in prompt if isinstance(part, str))
+
+
+def _output_config(instructions: Dict[str, Any], streaming: bool = False) -> Dict[str, Any]:
+    """
+    GenerationConfig fields for the response format an instruction declares
+    
+    Instructions with a response_schema get schema-constrained JSON, those
+    with ``response_format: json`` bare JSON. Streams only ask for JSON:
+    constrained output orders an object's fields alphabetically, while the
+    prompt puts the fields shown first to the user (message, speech) first.
+    """
+    if instructions.get("response_format", "json" if "response_schema" in instructions else "text") != "json":
+        return {}
+    config = {"response_mime_type": "application/json"}
+    if not streaming and "response_schema" in instructions:
+        config["response_schema"] = instructions["response_schema"]
+    return config
+
+
+# Practice questions generated in one call to fill a question pool (see app.services.question_pool)
+QUESTION_BATCH_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "questions": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "question": {"type": "string"},
+                    "category": {"type": "string"},
+                    "difficulty": {"type": "string", "enum": ["Easy", "Medium", "Hard"]},
+                    "tips": {"type": "array", "items": {"type": "string"}},
+                    "follow_up_questions": {"type": "array", "items": {"type": "string"}},
+                },
+                "required": ["question", "category", "difficulty", "tips", "follow_up_questions"],
+            },
+        },
+    },
+    "required": ["questions"],
+}
+
+# Output tokens to allow per generated question
+QUESTION_TOKENS = 300
+
+# Practice answers evaluated in one call (see GeminiService.evaluate_answers)
+EVALUATION_BATCH_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "evaluations": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "answer": {"type": "integer"},
+                    "overall_score": {"type": "integer"},
+                    "strengths": {"type": "array", "items": {"type": "string"}},
+                    "improvements": {"type": "array", "items": {"type": "string"}},
+                    "content_feedback": {"type": "string"},
+                    "delivery_feedback": {"type": "string"},
+                    "suggested_answer": {"type": "string"},
+                    "next_steps": {"type": "array", "items": {"type": "string"}},
+                },
+                "required": [
+                    "answer", "overall_score", "strengths", "improvements",
+                    "content_feedback", "delivery_feedback", "suggested_answer", "next_steps",
+                ],
+            },
+        },
+    },
+    "required": ["evaluations"],
+}
+
+# Answers per evaluation call, and output tokens to allow per answer
+EVALUATION_BATCH_SIZE = 5
+EVALUATION_TOKENS = 800
+
+# Entries per list in a session report
+REPORT_LIST_LIMIT = 5
+
+
+def _batches(items: List[Any], size: int) -> List[List[Any]]:
+    """Split items into as few batches of at most ``size`` as possible, of even length"""
+    count = -(-len(items) // size)
+    length = -(-len(items) // count) if count else 0
+    return [items[i:i + length] for i in range(0, len(items), length)] if count else []
+
+
+def _merge_lists(lists: List[List[Any]], limit: int) -> List[str]:
+    """Take the first entry of each list, then the second, ..., skipping repeats"""
+    merged: List[str] = []
+    seen = set()
+    for position in range(max((len(items) for items in lists), default=0)):
+        for items in lists:
+            if position < len(items) and isinstance(items[position], str):
+                key = " ".join(items[position].split()).casefold()
+                if key and key not in seen:
+                    seen.add(key)
+                    merged.append(items[position])
+                    if len(merged) >= limit:
+                        return merged
+    return merged
+
+
+def _session_report(evaluations: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Aggregate report of a practice session's evaluations"""
+    scores = {
+        e["answer"]: e["overall_score"] for e in evaluations
+        if isinstance(e.get("overall_score"), (int, float)) and not isinstance(e.get("overall_score"), bool)
+    }
+    return {
+        "answers": len(evaluations),
+        "average_score": round(sum(scores.values()) / len(scores), 1) if scores else None,
+        "best_answer": max(scores, key=scores.get) if scores else None,
+        "weakest_answer": min(scores, key=scores.get) if scores else None,
+        "strengths": _merge_lists([e.get("strengths") or [] for e in evaluations], REPORT_LIST_LIMIT),
+        "improvements": _merge_lists([e.get("improvements") or [] for e in evaluations], REPORT_LIST_LIMIT),
+        "next_steps": _merge_lists([e.get("next_steps") or [] for e in evaluations], REPORT_LIST_LIMIT),
+    }
+
+
+# Sent after a response that stopped at max_output_tokens, with the partial output as the model's turn
+CONTINUATION_PROMPT = (
+    "Your previous response was cut off by the output length limit. Continue it exactly "
+    "where it stopped. Output only the remaining text: do not repeat anything already "
+    "written, and add no code fences or commentary."
+)
+
+# Longest repeated text looked for where a continuation is joined
+STITCH_MAX_OVERLAP = 200
+
+
+def _response_text(response: Any) -> str:
+    """Text of the first candidate (empty if it stopped before producing any)"""
+    parts = response.candidates[0].content.parts
+    return "".join(part.text for part in parts)
+
+
+def _finish_reason(response: Any) -> Optional[str]:
+    """Name of the first candidate's finish reason, e.g. STOP or MAX_TOKENS"""
+    reason = getattr(response.candidates[0], "finish_reason", None)
+    return getattr(reason, "name", reason)
+
+
+def _continuation_prompt(prompt: Any, partial: str) -> List[Dict[str, Any]]:
+    """Conversation that resumes a truncated response from ``partial``"""
+    return [
+        {"role": "user", "parts": prompt if isinstance(prompt, list) else [prompt]},
+        {"role": "model", "parts": [partial]},
+        {"role": "user", "parts": [CONTINUATION_PROMPT]},
+    ]
+
+
+def _is_json(text: str) -> bool:
+    try:
+        orjson.loads(text)
+        return True
+    except orjson.JSONDecodeError:
+        return False
+
+
+def _stitch(head: str, tail: str) -> str:
+    """
+    Join a truncated output and its continuation
+    
+    The model is told not to repeat itself, so the parts are joined as they
+    are, unless that is invalid JSON and dropping text the continuation
+    repeated from the end of the head makes it valid. JSON repeats itself a
+    lot (keys, item structure), so an overlap alone is no proof of a repeat.
+    """
+    # Models sometimes wrap the continuation in a fence of its own
+    if tail.lstrip().startswith("```"):
+        tail = tail.lstrip().partition("\n")[2]
+    joined = head + tail
+    if _is_json(joined):
+        return joined
+    for size in range(min(len(head), len(tail), STITCH_MAX_OVERLAP), 0, -1):
+        if tail.startswith(head[-size:]) and _is_json(head + tail[size:]):
+            return head + tail[size:]
+    return joined
+
+
+def _reask_prompt(prompt: Any, result: Any, problems: List[Tuple[Path, str]]) -> Any:
+    """The original prompt followed by the previous response and the fields to fix"""
+    fields = "\n".join(f"- {format_path(path)} {reason}" for path, reason in problems)
+    reask = (
+        f"\n\nYOUR PREVIOUS RESPONSE:\n{json.dumps(result, ensure_ascii=False)}\n\n"
+        f"These fields of your previous response are missing or invalid:\n{fields}\n\n"
+        "Return ONLY a JSON object with corrected values for these fields, nested as in your "
+        "previous response, with array positions written as keys (e.g. {\"3\": {...}}). "
+        "Do not repeat any other field."
+    )
+    if isinstance(prompt, list):
+        return [*prompt, reask]
+    return prompt + reask
+
+
+_warned_uncancellable = False
+
+
+async def _cancel_stream(response: Any, chunks: Optional[AsyncIterator[Any]]):
+    """
+    Stop a streaming response that will not be read to the end
+
+    The chunk iterator is ours and is closed first. That does not end the
+    gRPC call under it, which keeps generating (and billing) until it
+    finishes, so the call is cancelled too. google-generativeai only exposes
+    it as the private ``_iterator`` (the version is pinned in
+    requirements.txt); if an upgrade removes it, a warning says so instead of
+    failing silently.
+    """
+    global _warned_uncancellable
+    if chunks is not None:
+        try:
+            await chunks.aclose()
+        except Exception as e:
+            logger.debug(f"Closing an abandoned Gemini stream failed: {e}")
+
+    if not hasattr(response, "_iterator"):
+        # The SDK's own responses always have it; test backends may not
+        if type(response).__module__.startswith("google.") and not _warned_uncancellable:
+            _warned_uncancellable = True
+            logger.warning(
+                "Gemini stream responses no longer expose their call; "
+                "abandoned streams will not be cancelled upstream"
+            )
+        return
+    cancel = getattr(response._iterator, "cancel", None)
+    if cancel is not None:
+        cancel()
+
+
 class GeminiService:
     """Service for interacting with Google Gemini AI"""
     
@@ -30,26 +289,67 @@ class GeminiService:
     def __init__(self):
         self.model = None
         self.current_model_name = None
-        self.yaml_loader = YAMLInstructionLoader()
+        self.yaml_loader = instruction_loader
+        self.backend: Optional[LLMBackend] = None
+        self._models: Dict[str, Any] = {}
         self._initialized = False
     
     async def initialize(self):
         """Initialize Gemini AI with API key"""
         try:
-            # Configure Gemini API
-            genai.configure(api_key=settings.GEMINI_API_KEY)
+            # Configure the Gemini API (or the record/replay backend)
+            self.backend = create_backend(settings)
             
             # Initialize model
             self.current_model_name = settings.GEMINI_MODEL
-            self.model = genai.GenerativeModel(self.current_model_name)
+            self.model = self._get_model(self.current_model_name)
             
             self._initialized = True
-            logger.info(f"Gemini AI initialized successfully with model: {self.current_model_name}")
+            logger.info(
+                f"Gemini AI initialized successfully with model: {self.current_model_name} "
+                f"(backend: {self.backend.name})"
+            )
             
         except Exception as e:
             logger.error(f"Failed to initialize Gemini AI: {e}", exc_info=True)
             raise
     
+    def _get_model(self, model_name: str):
+        """Get the client for a model from the backend, creating it on first use"""
+        model = self._models.get(model_name)
+        if model is None:
+            model = self.backend.get_model(model_name)
+            self._models[model_name] = model
+        return model
+    
+    async def warm_up(self, timeout: float = 10.0) -> Dict[str, Any]:
+        """
+        Pre-create the model clients and open the transport connection
+        
+        The first call on a fresh process otherwise pays for the TLS/gRPC
+        handshake with Gemini. A token count request is used because it does
+        not consume generation quota.
+        
+        Args:
+            timeout: Maximum seconds to wait for the connection to open
+            
+        Returns:
+            Names of the prepared models and whether the connection was opened
+        """
+        self._ensure_initialized()
+        
+        for model_name in [settings.GEMINI_MODEL, *self.FALLBACK_MODELS]:
+            self._get_model(model_name)
+        
+        connected = False
+        try:
+            await asyncio.wait_for(self.model.count_tokens_async("ping"), timeout=timeout)
+            connected = True
+        except Exception as e:
+            logger.warning(f"Could not open Gemini connection during warmup: {e}")
+        
+        return {"models": list(self._models), "connected": connected}
+    
     def _switch_to_fallback_model(self, failed_model: str) -> bool:
         """
         Switch to a fallback model when the current one fails.
@@ -65,8 +365,9 @@ class GeminiService:
             for i in range(current_index + 1, len(self.FALLBACK_MODELS)):
                 next_model = self.FALLBACK_MODELS[i]
                 try:
-                    self.model = genai.GenerativeModel(next_model)
+                    self.model = self._get_model(next_model)
                     self.current_model_name = next_model
+                    GEMINI_FALLBACKS.labels(failed_model, next_model).inc()
                     logger.warning(f"Switched to fallback model: {next_model}")
                     return True
                 except Exception as e:
@@ -83,6 +384,11 @@ class GeminiService:
         self._initialized = False
         logger.info("Gemini AI service cleaned up")
     
+    @property
+    def initialized(self) -> bool:
+        """Whether the backend and model client are set up and not yet cleaned up"""
+        return self._initialized
+    
     def _ensure_initialized(self):
         """Ensure service is initialized"""
         if not self._initialized:
@@ -101,6 +407,8 @@ class GeminiService:
         self._ensure_initialized()
         
         try:
+            build_span = tracer.span("prompt.build", instruction="cv_parser")
+            
             # Load instructions
             instructions = self.yaml_loader.load_instruction("cv_parser")
             
@@ -110,15 +418,18 @@ class GeminiService:
             # Build prompt
             prompt = f"{instructions['system_prompt']}\n\nCV TEXT:\n{cv_text}\n\nExtract the information and return as JSON:"
             
+            build_span.end(prompt_chars=_prompt_size(prompt))
+            
             # Generate response
             response = await self._generate_content(
                 prompt=prompt,
                 temperature=instructions.get("temperature", 0.3),
                 max_tokens=instructions.get("max_tokens", 2048),
+                output_config=_output_config(instructions),
             )
             
-            # Parse JSON response
-            parsed_data = self._parse_json_response(response)
+            # Parse and validate JSON response
+            parsed_data = await self._parse_structured("cv_parser", instructions, prompt, response)
             
             logger.info("CV parsed successfully")
             return parsed_data
@@ -129,14 +440,14 @@ class GeminiService:
     
     async def match_scholarships(
         self,
-        student_profile: Dict[str, Any],
+        student_profile: StudentProfile,
         scholarships: list[Dict[str, Any]]
     ) -> list[Dict[str, Any]]:
         """
         Match student with scholarships using AI
         
         Args:
-            student_profile: Student's profile data
+            student_profile: Student's profile data, inline or registered
             scholarships: List of available scholarships
             
         Returns:
@@ -145,6 +456,8 @@ class GeminiService:
         self._ensure_initialized()
         
         try:
+            build_span = tracer.span("prompt.build", instruction="scholarship_matcher")
+            
             # Load instructions
             instructions = self.yaml_loader.load_instruction("scholarship_matcher")
             
@@ -152,7 +465,7 @@ class GeminiService:
             prompt = f"""{instructions['system_prompt']}
 
 STUDENT PROFILE:
-{json.dumps(student_profile, indent=2)}
+{profile_json(student_profile)}
 
 SCHOLARSHIPS TO MATCH:
 {json.dumps(scholarships, indent=2)}
@@ -160,15 +473,18 @@ SCHOLARSHIPS TO MATCH:
 Analyze the student profile and match with the most relevant scholarships. Return as JSON array:
 """
             
+            build_span.end(prompt_chars=_prompt_size(prompt))
+            
             # Generate response
             response = await self._generate_content(
                 prompt=prompt,
                 temperature=instructions.get("temperature", 0.4),
                 max_tokens=instructions.get("max_tokens", 3072),
+                output_config=_output_config(instructions),
             )
             
-            # Parse JSON response
-            matches = self._parse_json_response(response)
+            # Parse and validate JSON response
+            matches = await self._parse_structured("scholarship_matcher", instructions, prompt, response)
             
             logger.info(f"Matched {len(matches)} scholarships for student")
             return matches
@@ -180,7 +496,7 @@ Analyze the student profile and match with the most relevant scholarships. Retur
     async def generate_document(
         self,
         document_type: str,
-        student_profile: Dict[str, Any],
+        student_profile: StudentProfile,
         scholarship_info: Dict[str, Any],
         additional_context: Optional[Dict[str, Any]] = None
     ) -> Dict[str, Any]:
@@ -189,7 +505,7 @@ Analyze the student profile and match with the most relevant scholarships. Retur
         
         Args:
             document_type: Type of document (SOP, Personal Statement, etc.)
-            student_profile: Student's profile data
+            student_profile: Student's profile data, inline or registered
             scholarship_info: Scholarship information
             additional_context: Additional context for generation
             
@@ -199,6 +515,8 @@ Analyze the student profile and match with the most relevant scholarships. Retur
         self._ensure_initialized()
         
         try:
+            build_span = tracer.span("prompt.build", instruction="document_generator")
+            
             # Load instructions
             instructions = self.yaml_loader.load_instruction("document_generator")
             
@@ -209,7 +527,7 @@ Analyze the student profile and match with the most relevant scholarships. Retur
 DOCUMENT TYPE: {document_type}
 
 STUDENT PROFILE:
-{json.dumps(student_profile, indent=2)}
+{profile_json(student_profile)}
 
 SCHOLARSHIP INFORMATION:
 {json.dumps(scholarship_info, indent=2)}
@@ -220,15 +538,18 @@ ADDITIONAL CONTEXT:
 Generate a compelling {document_type} and return as JSON:
 """
             
+            build_span.end(prompt_chars=_prompt_size(prompt))
+            
             # Generate response
             response = await self._generate_content(
                 prompt=prompt,
                 temperature=instructions.get("temperature", 0.7),
                 max_tokens=instructions.get("max_tokens", 4096),
+                output_config=_output_config(instructions),
             )
             
-            # Parse JSON response
-            document = self._parse_json_response(response)
+            # Parse and validate JSON response
+            document = await self._parse_structured("document_generator", instructions, prompt, response)
             
             logger.info(f"Generated {document_type} successfully")
             return document
@@ -237,6 +558,30 @@ Generate a compelling {document_type} and return as JSON:
             logger.error(f"Error generating document: {e}", exc_info=True)
             raise
     
+    async def _attachment_parts(self, attachments: list[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Prompt parts for chat attachments
+        
+        Uploaded attachments become a provider file handle or their stored
+        bytes (see app.services.attachments); inline ones are decoded.
+        
+        Raises:
+            AttachmentNotFoundError: If a referenced attachment has expired
+        """
+        parts = []
+        for att in attachments:
+            if "id" in att:
+                parts.append(await attachment_store.prompt_part(str(att["id"]), self.backend))
+                continue
+            try:
+                parts.append({
+                    "mime_type": att["mime_type"],
+                    "data": base64.b64decode(att["base64"])
+                })
+            except Exception as e:
+                logger.error(f"Error decoding attachment: {e}")
+        return parts
+    
     async def chat(
         self,
         message: str,
@@ -249,7 +594,8 @@ Generate a compelling {document_type} and return as JSON:
         Args:
             message: User's message
             conversation_history: Previous conversation messages
-            attachments: Optional list of base64 encoded files with mime_type
+            attachments: Optional list of uploaded attachment ids ({"id"}) or
+                base64 encoded files ({"base64", "mime_type"})
             
         Returns:
             AI response with suggestions and resources
@@ -257,6 +603,8 @@ Generate a compelling {document_type} and return as JSON:
         self._ensure_initialized()
         
         try:
+            build_span = tracer.span("prompt.build", instruction="chat_assistant")
+            
             # Load instructions
             instructions = self.yaml_loader.load_instruction("chat_assistant")
             
@@ -279,26 +627,20 @@ Generate a compelling {document_type} and return as JSON:
 
             # Add attachments if any
             if attachments:
-                import base64
-                for att in attachments:
-                    try:
-                        data = base64.b64decode(att["base64"])
-                        prompt_parts.append({
-                            "mime_type": att["mime_type"],
-                            "data": data
-                        })
-                    except Exception as e:
-                        logger.error(f"Error decoding attachment: {e}")
+                prompt_parts.extend(await self._attachment_parts(attachments))
+            
+            build_span.end(prompt_chars=_prompt_size(prompt_parts))
             
             # Generate response
             response = await self._generate_content(
                 prompt=prompt_parts,
                 temperature=instructions.get("temperature", 0.6),
                 max_tokens=instructions.get("max_tokens", 4096),
+                output_config=_output_config(instructions),
             )
             
-            # Parse JSON response
-            chat_response = self._parse_json_response(response)
+            # Parse and validate JSON response
+            chat_response = await self._parse_structured("chat_assistant", instructions, prompt_parts, response)
             
             logger.info("Chat response generated successfully")
             return chat_response
@@ -319,7 +661,8 @@ Generate a compelling {document_type} and return as JSON:
         Args:
             message: User's message
             conversation_history: Previous conversation messages
-            attachments: Optional list of base64 encoded files with mime_type
+            attachments: Optional list of uploaded attachment ids ({"id"}) or
+                base64 encoded files ({"base64", "mime_type"})
             
         Yields:
             Chunks of the AI response
@@ -327,6 +670,8 @@ Generate a compelling {document_type} and return as JSON:
         self._ensure_initialized()
         
         try:
+            build_span = tracer.span("prompt.build", instruction="chat_assistant")
+            
             # Load instructions for temperature settings
             instructions = self.yaml_loader.load_instruction("chat_assistant")
             
@@ -349,35 +694,21 @@ Generate a compelling {document_type} and return as JSON:
 
             # Add attachments if any
             if attachments:
-                import base64
-                for att in attachments:
-                    try:
-                        data = base64.b64decode(att["base64"])
-                        prompt_parts.append({
-                            "mime_type": att["mime_type"],
-                            "data": data
-                        })
-                    except Exception as e:
-                        logger.error(f"Error decoding attachment: {e}")
+                prompt_parts.extend(await self._attachment_parts(attachments))
+            
+            build_span.end(prompt_chars=_prompt_size(prompt_parts))
             
             # Configure generation
             generation_config = genai.types.GenerationConfig(
                 temperature=instructions.get("temperature", 0.6),
                 max_output_tokens=instructions.get("max_tokens", 4096),
                 candidate_count=1,
-            )
-            
-            # Generate streaming response
-            response = self.model.generate_content(
-                prompt_parts,
-                generation_config=generation_config,
-                stream=True,
+                **_output_config(instructions, streaming=True),
             )
             
             # Yield chunks as they come
-            for chunk in response:
-                if chunk.text:
-                    yield chunk.text
+            async for chunk in self._stream_content(prompt_parts, generation_config):
+                yield chunk
             
             logger.info("Streaming chat response completed")
             
@@ -390,7 +721,8 @@ Generate a compelling {document_type} and return as JSON:
         mode: str,
         scholarship_info: Dict[str, Any],
         student_answer: Optional[str] = None,
-        question: Optional[str] = None
+        question: Optional[str] = None,
+        difficulty: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         Interview preparation - generate questions or evaluate answers
@@ -400,6 +732,7 @@ Generate a compelling {document_type} and return as JSON:
             scholarship_info: Scholarship information
             student_answer: Student's answer (for evaluation mode)
             question: Interview question (for evaluation mode)
+            difficulty: "easy", "medium" or "hard" (for question mode)
             
         Returns:
             Question or evaluation feedback
@@ -407,6 +740,8 @@ Generate a compelling {document_type} and return as JSON:
         self._ensure_initialized()
         
         try:
+            build_span = tracer.span("prompt.build", instruction="interview_prep")
+            
             # Load instructions
             instructions = self.yaml_loader.load_instruction("interview_prep")
             
@@ -418,6 +753,8 @@ MODE: Generate Question
 SCHOLARSHIP INFORMATION:
 {json.dumps(scholarship_info, indent=2)}
 
+DIFFICULTY: {(difficulty or "medium").capitalize()}
+
 Generate an interview question as JSON:
 """
             else:  # evaluate_answer
@@ -439,15 +776,18 @@ SCHOLARSHIP: {scholarship_info.get('name', 'Unknown')}
 Evaluate the answer and provide feedback as JSON:
 """
             
+            build_span.end(prompt_chars=_prompt_size(prompt))
+            
             # Generate response
             response = await self._generate_content(
                 prompt=prompt,
                 temperature=instructions.get("temperature", 0.5),
                 max_tokens=instructions.get("max_tokens", 2048),
+                output_config=_output_config(instructions),
             )
             
-            # Parse JSON response
-            result = self._parse_json_response(response)
+            # Parse and validate JSON response
+            result = await self._parse_structured("interview_prep", instructions, prompt, response)
             
             logger.info(f"Interview prep ({mode}) completed successfully")
             return result
@@ -456,13 +796,187 @@ Evaluate the answer and provide feedback as JSON:
             logger.error(f"Error in interview prep: {e}", exc_info=True)
             raise
     
+    async def evaluate_answers(
+        self,
+        scholarship_info: Dict[str, Any],
+        answers: List[Dict[str, str]]
+    ) -> Dict[str, Any]:
+        """
+        Evaluate a practice session's answers together, for the end-of-session report
+        
+        Answers are evaluated EVALUATION_BATCH_SIZE to a call, with the
+        system prompt sent once per call instead of once per answer; the
+        calls run concurrently. Answers a call leaves out are asked for
+        once more.
+        
+        Args:
+            scholarship_info: Scholarship information
+            answers: {"question", "student_answer"} pairs in session order
+            
+        Returns:
+            {"evaluations": one per answer, numbered from 1, shaped like
+            interview_prep's evaluate_answer result, "report": session summary}
+            
+        Raises:
+            ValueError: If some answers still have no evaluation
+        """
+        self._ensure_initialized()
+        
+        try:
+            # Load instructions
+            instructions = self.yaml_loader.load_instruction("interview_prep")
+            scholarship = scholarship_info.get('name', 'Unknown')
+            
+            numbered = [
+                (number, pair["question"], sanitize_input(pair["student_answer"], max_length=5000))
+                for number, pair in enumerate(answers, start=1)
+            ]
+            
+            evaluations: Dict[int, Dict[str, Any]] = {}
+            for result in await asyncio.gather(*(
+                self._evaluate_batch(instructions, scholarship, batch)
+                for batch in _batches(numbered, EVALUATION_BATCH_SIZE)
+            )):
+                evaluations.update(result)
+            
+            missing = [item for item in numbered if item[0] not in evaluations]
+            if missing:
+                logger.warning(f"Evaluation skipped answers {[item[0] for item in missing]}, asking again")
+                evaluations.update(await self._evaluate_batch(instructions, scholarship, missing))
+                missing = [item[0] for item in numbered if item[0] not in evaluations]
+                if missing:
+                    raise ValueError(f"No evaluation returned for answers {missing}")
+            
+            ordered = [evaluations[number] for number, _, _ in numbered]
+            logger.info(f"Evaluated {len(ordered)} answers in batches of up to {EVALUATION_BATCH_SIZE}")
+            return {"evaluations": ordered, "report": _session_report(ordered)}
+            
+        except Exception as e:
+            logger.error(f"Error evaluating answers: {e}", exc_info=True)
+            raise
+    
+    async def _evaluate_batch(
+        self,
+        instructions: Dict[str, Any],
+        scholarship: str,
+        batch: List[Tuple[int, str, str]]
+    ) -> Dict[int, Dict[str, Any]]:
+        """Evaluate (number, question, answer) triples in one call; returns evaluations by answer number"""
+        build_span = tracer.span("prompt.build", instruction="interview_prep")
+        
+        pairs = "\n\n".join(
+            f"ANSWER {number}\nQUESTION: {question}\nSTUDENT ANSWER: {answer}"
+            for number, question, answer in batch
+        )
+        prompt = f"""{instructions['system_prompt']}
+
+MODE: Evaluate Answers
+
+SCHOLARSHIP: {scholarship}
+
+{pairs}
+
+Evaluate each answer on its own and provide feedback as JSON:
+{{"evaluations": [one evaluation per answer, with "answer" set to its number]}}
+"""
+        
+        build_span.end(prompt_chars=_prompt_size(prompt))
+        
+        # Generate response
+        batch_instructions = {**instructions, "response_schema": EVALUATION_BATCH_SCHEMA}
+        response = await self._generate_content(
+            prompt=prompt,
+            temperature=instructions.get("temperature", 0.5),
+            max_tokens=max(instructions.get("max_tokens", 2048), EVALUATION_TOKENS * len(batch)),
+            output_config=_output_config(batch_instructions),
+        )
+        
+        # Parse and validate JSON response
+        result = await self._parse_structured("interview_prep", batch_instructions, prompt, response)
+        numbers = {number for number, _, _ in batch}
+        evaluations = {}
+        for evaluation in ((result.get("evaluations") or []) if isinstance(result, dict) else []):
+            if not isinstance(evaluation, dict):
+                continue
+            # The model may put anything here; only a listed answer number is a match
+            number = evaluation.get("answer")
+            if isinstance(number, int) and not isinstance(number, bool) and number in numbers:
+                evaluations.setdefault(number, evaluation)
+        return evaluations
+    
+    async def generate_interview_questions(
+        self,
+        scholarship_info: Dict[str, Any],
+        difficulty: str,
+        count: int,
+        avoid: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Generate several distinct practice questions in one call (to fill a question pool)
+        
+        Args:
+            scholarship_info: Scholarship information
+            difficulty: "easy", "medium" or "hard"
+            count: Number of questions
+            avoid: Questions already asked, not to be repeated or rephrased
+            
+        Returns:
+            Questions, each shaped like interview_prep's generate_question result
+        """
+        self._ensure_initialized()
+        
+        try:
+            build_span = tracer.span("prompt.build", instruction="interview_prep")
+            
+            # Load instructions
+            instructions = self.yaml_loader.load_instruction("interview_prep")
+            
+            avoid_block = ""
+            if avoid:
+                asked = "\n".join(f"- {q}" for q in avoid)
+                avoid_block = f"\nDo not repeat or rephrase these questions, which were already asked:\n{asked}\n"
+            
+            prompt = f"""{instructions['system_prompt']}
+
+MODE: Generate Questions
+
+SCHOLARSHIP INFORMATION:
+{json.dumps(scholarship_info, indent=2)}
+
+DIFFICULTY: {difficulty.capitalize()}
+
+Generate {count} distinct interview questions at this difficulty, spread over different categories.
+{avoid_block}
+Return them as JSON: {{"questions": [ ... ]}}
+"""
+            
+            build_span.end(prompt_chars=_prompt_size(prompt))
+            
+            # Generate response
+            batch_instructions = {**instructions, "response_schema": QUESTION_BATCH_SCHEMA}
+            response = await self._generate_content(
+                prompt=prompt,
+                temperature=instructions.get("temperature", 0.5),
+                max_tokens=max(instructions.get("max_tokens", 2048), QUESTION_TOKENS * count),
+                output_config=_output_config(batch_instructions),
+            )
+            
+            # Parse and validate JSON response
+            result = await self._parse_structured("interview_prep", batch_instructions, prompt, response)
+            questions = result.get("questions", []) if isinstance(result, dict) else []
+            return [q for q in questions if isinstance(q, dict) and isinstance(q.get("question"), str)]
+            
+        except Exception as e:
+            logger.error(f"Error generating interview questions: {e}", exc_info=True)
+            raise
+    
     async def discover_faculty(
         self,
         mode: str,
         continent: Optional[str] = None,
         university: Optional[str] = None,
         department: Optional[str] = None,
-        student_profile: Optional[Dict[str, Any]] = None
+        student_profile: Optional[StudentProfile] = None
     ) -> Dict[str, Any]:
         """
         Identify universities, departments, and faculty based on region
@@ -470,11 +984,14 @@ Evaluate the answer and provide feedback as JSON:
         self._ensure_initialized()
         
         try:
+            build_span = tracer.span("prompt.build", instruction="faculty_discovery")
+            
             # Load instructions
-            instructions = self.yaml_loader.load_instruction("faculty_discovery")
+            template = self.yaml_loader.load_template("faculty_discovery")
+            instructions = template.instruction
             
             # Build prompt
-            prompt = instructions['system_prompt'].format(
+            prompt = template.render(
                 mode=mode,
                 continent=continent or "Not Specified",
                 university=university or "Not Specified",
@@ -482,27 +999,86 @@ Evaluate the answer and provide feedback as JSON:
             )
             
             if student_profile:
-                prompt += f"\n\nSTUDENT PROFILE:\n{json.dumps(student_profile, indent=2)}"
+                prompt = f"{prompt}\n\nSTUDENT PROFILE:\n{profile_json(student_profile)}"
+            
+            build_span.end(prompt_chars=_prompt_size(prompt))
             
             # Generate response
             response = await self._generate_content(
                 prompt=prompt,
                 temperature=instructions.get("temperature", 0.3),
                 max_tokens=instructions.get("max_tokens", 2048),
+                output_config=_output_config(instructions),
             )
             
-            # Parse JSON response
-            result = self._parse_json_response(response)
+            # Parse and validate JSON response
+            result = await self._parse_structured("faculty_discovery", instructions, prompt, response)
             return result
             
         except Exception as e:
             logger.error(f"Error in faculty discovery: {e}", exc_info=True)
             raise
 
+    async def discover_scholarships(self, count: int = 10) -> List[Dict[str, Any]]:
+        """
+        Discover real, ongoing scholarship opportunities
+        
+        Args:
+            count: Number of scholarships to discover
+            
+        Returns:
+            Discovered scholarships
+            
+        Raises:
+            ValueError: If the response is not valid JSON
+        """
+        self._ensure_initialized()
+        
+        build_span = tracer.span("prompt.build", instruction="scholarship_discovery")
+        
+        # Load the compiled template (cached and validated at startup)
+        template = self.yaml_loader.load_template("scholarship_discovery")
+        
+        # Build the prompt with current date context
+        from datetime import datetime
+        current_date = datetime.now().strftime("%B %d, %Y")
+        current_year = datetime.now().year
+        
+        system_prompt = template.render(count=count)
+        
+        # Add explicit date context to the user prompt
+        date_context = f"\n\n🚨 CRITICAL DATE REQUIREMENTS 🚨\n- TODAY'S DATE: {current_date}\n- CURRENT YEAR: {current_year}\n- ALL deadlines MUST be in {current_year} or {current_year + 1}\n- NEVER use {current_year - 2} or {current_year - 1} dates\n- Example valid deadlines: {current_year}-10-31, {current_year + 1}-03-15\n"
+        
+        user_prompt = f"{date_context}\n\nFind {count} real, ongoing scholarship opportunities with deadlines in {current_year} or {current_year + 1}. Return ONLY a JSON object with this exact structure: {{\"scholarships\": [{{\"title\": \"...\", \"provider\": \"...\", \"country\": \"...\", \"educationLevel\": \"...\", \"fieldOfStudy\": \"...\", \"amount\": \"...\", \"currency\": \"...\", \"deadline\": \"YYYY-MM-DD\" (MUST be {current_year} or {current_year + 1}), \"description\": \"...\", \"eligibilityCriteria\": [\"...\"], \"applicationUrl\": \"...\", \"isActive\": true}}]}}"
+        
+        full_prompt = f"{system_prompt}\n\n{user_prompt}"
+        
+        build_span.end(prompt_chars=_prompt_size(full_prompt))
+        
+        # Generate response
+        instructions = template.instruction
+        result = await self._generate_content(
+            prompt=full_prompt,
+            temperature=instructions.get("temperature", 0.7),
+            max_tokens=instructions.get("max_tokens", 8192),
+            output_config=_output_config(instructions),
+        )
+        
+        scholarships_data = await self._parse_structured(
+            "scholarship_discovery", instructions, full_prompt, result
+        )
+        if not isinstance(scholarships_data, dict):
+            logger.error(f"Raw response (length={len(result)}): {result[:2000]}")
+            raise ValueError("Failed to parse scholarship data from AI response")
+        
+        scholarships = scholarships_data.get("scholarships", [])
+        logger.info(f"Successfully discovered {len(scholarships)} scholarships")
+        return scholarships
+
     async def generate_document_stream(
         self,
         document_type: str,
-        student_profile: Dict[str, Any],
+        student_profile: StudentProfile,
         scholarship_info: Dict[str, Any],
         additional_context: Optional[Dict[str, Any]] = None
     ):
@@ -512,6 +1088,8 @@ Evaluate the answer and provide feedback as JSON:
         self._ensure_initialized()
         
         try:
+            build_span = tracer.span("prompt.build", instruction="document_generator")
+            
             # Load instructions
             instructions = self.yaml_loader.load_instruction("document_generator")
             
@@ -522,7 +1100,7 @@ Evaluate the answer and provide feedback as JSON:
 DOCUMENT TYPE: {document_type}
 
 STUDENT PROFILE:
-{json.dumps(student_profile, indent=2)}
+{profile_json(student_profile)}
 
 SCHOLARSHIP INFORMATION:
 {json.dumps(scholarship_info, indent=2)}
@@ -533,24 +1111,19 @@ ADDITIONAL CONTEXT:
 Generate a compelling {document_type} and return as JSON:
 """
             
+            build_span.end(prompt_chars=_prompt_size(prompt))
+            
             # Configure generation
             generation_config = genai.types.GenerationConfig(
                 temperature=instructions.get("temperature", 0.7),
                 max_output_tokens=instructions.get("max_tokens", 4096),
                 candidate_count=1,
-            )
-            
-            # Generate streaming response
-            response = self.model.generate_content(
-                prompt,
-                generation_config=generation_config,
-                stream=True,
+                **_output_config(instructions, streaming=True),
             )
             
             # Yield chunks as they come
-            for chunk in response:
-                if chunk.text:
-                    yield chunk.text
+            async for chunk in self._stream_content(prompt, generation_config):
+                yield chunk
             
             logger.info(f"Streaming {document_type} generation completed")
             
@@ -558,6 +1131,59 @@ Generate a compelling {document_type} and return as JSON:
             logger.error(f"Error in streaming document generation: {e}", exc_info=True)
             raise
 
+    # Appended when the 5-minute warning fires
+    INTERVIEW_CONCLUSION_PROMPT = """
+
+IMPORTANT - TIME WARNING: The interview time is almost up (5 minutes remaining).
+You MUST now conclude the interview. Your response should:
+1. Acknowledge that time is running low
+2. Summarize the key points discussed during the interview
+3. Provide constructive feedback and advice to the candidate based on their responses
+4. Thank the candidate for their time
+5. Wrap up the session professionally
+
+This is the final response - make it meaningful and helpful for the candidate."""
+    
+    def _build_interview_prompt(
+        self,
+        template: PromptTemplate,
+        mode: str,
+        persona: str,
+        interview_type: str,
+        user_answer: Optional[str] = None,
+        history: Optional[List[Dict[str, str]]] = None,
+        student_profile: Optional[StudentProfile] = None,
+        selected_panelists: Optional[List[Dict[str, str]]] = None,
+        is_conclusion: bool = False
+    ) -> str:
+        """Build the interview prompt from the compiled template in a single join"""
+        parts = [template.render(mode=mode, persona=persona, interview_type=interview_type)]
+        
+        # Add selected panelists information
+        if selected_panelists:
+            parts.append("\n\nSELECTED PANELISTS FOR THIS INTERVIEW (ONLY use these panelists):\n")
+            for panelist in selected_panelists:
+                parts.append(f"- {panelist.get('id')}: {panelist.get('name')} ({panelist.get('role')}) - {panelist.get('title', '')}\n")
+            parts.append("\nIMPORTANT: Only introduce and use the panelists listed above. Do NOT mention or introduce any other panelists.")
+        
+        if student_profile:
+            parts.append(f"\n\nSTUDENT PROFILE:\n{profile_json(student_profile)}")
+        
+        if history:
+            parts.append("\n\nCONVERSATION HISTORY:\n")
+            for h in history:
+                parts.append(f"{h.get('role', 'user').upper()}: {h.get('content', '')}\n")
+        
+        if user_answer:
+            parts.append(f"\n\nSTUDENT'S LATEST ANSWER: {user_answer}")
+        
+        # Add conclusion instructions if this is a 5-minute warning
+        if is_conclusion:
+            parts.append(self.INTERVIEW_CONCLUSION_PROMPT)
+        
+        parts.append("\n\nResponse (JSON):")
+        return "".join(parts)
+    
     async def conduct_interview(
         self,
         mode: str,
@@ -565,7 +1191,7 @@ Generate a compelling {document_type} and return as JSON:
         interview_type: str,
         user_answer: Optional[str] = None,
         history: Optional[List[Dict[str, str]]] = None,
-        student_profile: Optional[Dict[str, Any]] = None,
+        student_profile: Optional[StudentProfile] = None,
         selected_panelists: Optional[List[Dict[str, str]]] = None,
         is_conclusion: bool = False
     ) -> Dict[str, Any]:
@@ -575,59 +1201,37 @@ Generate a compelling {document_type} and return as JSON:
         self._ensure_initialized()
         
         try:
+            build_span = tracer.span("prompt.build", instruction="interview_persona")
+            
             # Load instructions
-            instructions = self.yaml_loader.load_instruction("interview_persona")
+            template = self.yaml_loader.load_template("interview_persona")
+            instructions = template.instruction
             
             # Build prompt
-            prompt = instructions['system_prompt'].format(
+            prompt = self._build_interview_prompt(
+                template,
                 mode=mode,
                 persona=persona,
-                interview_type=interview_type
+                interview_type=interview_type,
+                user_answer=user_answer,
+                history=history,
+                student_profile=student_profile,
+                selected_panelists=selected_panelists,
+                is_conclusion=is_conclusion
             )
             
-            # Add selected panelists information
-            if selected_panelists:
-                prompt += "\n\nSELECTED PANELISTS FOR THIS INTERVIEW (ONLY use these panelists):\n"
-                for panelist in selected_panelists:
-                    prompt += f"- {panelist.get('id')}: {panelist.get('name')} ({panelist.get('role')}) - {panelist.get('title', '')}\n"
-                prompt += "\nIMPORTANT: Only introduce and use the panelists listed above. Do NOT mention or introduce any other panelists."
-            
-            if student_profile:
-                prompt += f"\n\nSTUDENT PROFILE:\n{json.dumps(student_profile, indent=2)}"
-            
-            if history:
-                prompt += "\n\nCONVERSATION HISTORY:\n"
-                for h in history:
-                    prompt += f"{h.get('role', 'user').upper()}: {h.get('content', '')}\n"
-            
-            if user_answer:
-                prompt += f"\n\nSTUDENT'S LATEST ANSWER: {user_answer}"
-            
-            # Add conclusion instructions if this is a 5-minute warning
-            if is_conclusion:
-                prompt += """
-
-IMPORTANT - TIME WARNING: The interview time is almost up (5 minutes remaining).
-You MUST now conclude the interview. Your response should:
-1. Acknowledge that time is running low
-2. Summarize the key points discussed during the interview
-3. Provide constructive feedback and advice to the candidate based on their responses
-4. Thank the candidate for their time
-5. Wrap up the session professionally
-
-This is the final response - make it meaningful and helpful for the candidate."""
-            
-            prompt += "\n\nResponse (JSON):"
+            build_span.end(prompt_chars=_prompt_size(prompt))
             
             # Generate response
             response = await self._generate_content(
                 prompt=prompt,
                 temperature=instructions.get("temperature", 0.7),
                 max_tokens=instructions.get("max_tokens", 2048),
+                output_config=_output_config(instructions),
             )
             
-            # Parse JSON response
-            result = self._parse_json_response(response)
+            # Parse and validate JSON response
+            result = await self._parse_structured("interview_persona", instructions, prompt, response)
             return result
             
         except Exception as e:
@@ -641,7 +1245,7 @@ This is the final response - make it meaningful and helpful for the candidate.""
         interview_type: str,
         user_answer: Optional[str] = None,
         history: Optional[List[Dict[str, str]]] = None,
-        student_profile: Optional[Dict[str, Any]] = None,
+        student_profile: Optional[StudentProfile] = None,
         selected_panelists: Optional[List[Dict[str, str]]] = None,
         is_conclusion: bool = False
     ):
@@ -652,169 +1256,406 @@ This is the final response - make it meaningful and helpful for the candidate.""
         self._ensure_initialized()
         
         try:
+            build_span = tracer.span("prompt.build", instruction="interview_persona")
+            
             # Load instructions
-            instructions = self.yaml_loader.load_instruction("interview_persona")
+            template = self.yaml_loader.load_template("interview_persona")
+            instructions = template.instruction
             
             # Build prompt (same as non-streaming version)
-            prompt = instructions['system_prompt'].format(
+            prompt = self._build_interview_prompt(
+                template,
                 mode=mode,
                 persona=persona,
-                interview_type=interview_type
+                interview_type=interview_type,
+                user_answer=user_answer,
+                history=history,
+                student_profile=student_profile,
+                selected_panelists=selected_panelists,
+                is_conclusion=is_conclusion
             )
             
-            if selected_panelists:
-                prompt += "\n\nSELECTED PANELISTS FOR THIS INTERVIEW (ONLY use these panelists):\n"
-                for panelist in selected_panelists:
-                    prompt += f"- {panelist.get('id')}: {panelist.get('name')} ({panelist.get('role')}) - {panelist.get('title', '')}\n"
-                prompt += "\nIMPORTANT: Only introduce and use the panelists listed above. Do NOT mention or introduce any other panelists."
-            
-            if student_profile:
-                prompt += f"\n\nSTUDENT PROFILE:\n{json.dumps(student_profile, indent=2)}"
-            
-            if history:
-                prompt += "\n\nCONVERSATION HISTORY:\n"
-                for h in history:
-                    prompt += f"{h.get('role', 'user').upper()}: {h.get('content', '')}\n"
-            
-            if user_answer:
-                prompt += f"\n\nSTUDENT'S LATEST ANSWER: {user_answer}"
-            
-            if is_conclusion:
-                prompt += """
-
-IMPORTANT - TIME WARNING: The interview time is almost up (5 minutes remaining).
-You MUST now conclude the interview. Your response should:
-1. Acknowledge that time is running low
-2. Summarize the key points discussed during the interview
-3. Provide constructive feedback and advice to the candidate based on their responses
-4. Thank the candidate for their time
-5. Wrap up the session professionally
-
-This is the final response - make it meaningful and helpful for the candidate."""
-            
-            prompt += "\n\nResponse (JSON):"
+            build_span.end(prompt_chars=_prompt_size(prompt))
             
             # Configure generation with reduced tokens for faster response
             generation_config = genai.types.GenerationConfig(
                 temperature=instructions.get("temperature", 0.7),
                 max_output_tokens=instructions.get("max_tokens", 512),
                 candidate_count=1,
-            )
-            
-            # Generate streaming response
-            response = self.model.generate_content(
-                prompt,
-                generation_config=generation_config,
-                stream=True,
+                **_output_config(instructions, streaming=True),
             )
             
             # Yield chunks as they arrive
-            for chunk in response:
-                if chunk.text:
-                    yield chunk.text
+            async for chunk in self._stream_content(prompt, generation_config):
+                yield chunk
             
             logger.info("Streaming interview response completed")
             
         except Exception as e:
             logger.error(f"Error in streaming interview: {e}", exc_info=True)
             raise
+    
+    async def complete_interview_stream(
+        self,
+        response: str,
+        mode: str,
+        persona: str,
+        interview_type: str,
+        user_answer: Optional[str] = None,
+        history: Optional[List[Dict[str, str]]] = None,
+        student_profile: Optional[StudentProfile] = None,
+        selected_panelists: Optional[List[Dict[str, str]]] = None,
+        is_conclusion: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Parse the full text of an interview stream into the interview turn
+        
+        Streams only ask for bare JSON, so the turn is validated here and
+        missing fields (such as ``speech``) are re-asked with the stream's
+        prompt. Takes the arguments given to conduct_interview_stream.
+        """
+        template = self.yaml_loader.load_template("interview_persona")
+        prompt = self._build_interview_prompt(
+            template,
+            mode=mode,
+            persona=persona,
+            interview_type=interview_type,
+            user_answer=user_answer,
+            history=history,
+            student_profile=student_profile,
+            selected_panelists=selected_panelists,
+            is_conclusion=is_conclusion
+        )
+        return await self._parse_structured("interview_persona", template.instruction, prompt, response)
 
+    async def _acquire_quota(self):
+        """Wait for the shared Gemini budget and any 429 cooldown, within the request deadline"""
+        with tracer.span("gemini.quota_wait") as wait_span:
+            try:
+                waited = await asyncio.wait_for(quota_guard.acquire(), timeout=deadline.remaining())
+            except asyncio.TimeoutError:
+                raise DeadlineExceededError("Request deadline exceeded while waiting for the Gemini quota")
+            wait_span.set_attribute("waited_s", waited)
+        GEMINI_QUOTA_WAIT.inc(waited)
+    
+    async def _stream_content(self, prompt: Any, generation_config) -> AsyncIterator[str]:
+        """
+        Stream text chunks from Gemini, recording latency and token usage
+        
+        The stream as a whole is bounded by the request deadline and each wait
+        for the next chunk by GEMINI_TIMEOUT. If the consumer stops early
+        (client disconnect, cancellation) the Gemini call is cancelled.
+        
+        Args:
+            prompt: The prompt to send to Gemini (string or list of parts)
+            generation_config: Generation configuration for the call
+            
+        Yields:
+            Non-empty text chunks
+        """
+        # Wait for the shared Gemini budget before opening the stream
+        await self._acquire_quota()
+        
+        model_name = self.current_model_name
+        started = time.perf_counter()
+        # Not entered as a context manager: the span stays open across yields
+        stream_span = tracer.span("gemini.stream", model=model_name, prompt_chars=_prompt_size(prompt))
+        
+        left = deadline.remaining()
+        response = None
+        response_chunks = None
+        completed = False
+        chunks = 0
+        try:
+            # Generate streaming response
+            response = await asyncio.wait_for(
+                self.model.generate_content_async(
+                    prompt,
+                    generation_config=generation_config,
+                    stream=True,
+                    request_options={"timeout": left} if left is not None else None,
+                ),
+                timeout=deadline.attempt_timeout(settings.GEMINI_TIMEOUT),
+            )
+            
+            response_chunks = response.__aiter__()
+            while True:
+                chunk = await asyncio.wait_for(
+                    anext(response_chunks, None),
+                    timeout=deadline.attempt_timeout(settings.GEMINI_TIMEOUT),
+                )
+                if chunk is None:
+                    break
+                if chunk.text:
+                    if chunks == 0:
+                        stream_span.set_attribute("first_chunk_ms", round((time.perf_counter() - started) * 1000, 3))
+                    chunks += 1
+                    yield chunk.text
+            completed = True
+        except asyncio.TimeoutError:
+            if deadline.expired():
+                raise DeadlineExceededError("Request deadline exceeded while streaming from Gemini")
+            raise TimeoutError(f"Gemini stream from {model_name} exceeded timeout of {settings.GEMINI_TIMEOUT}s")
+        finally:
+            if completed:
+                GEMINI_LATENCY.labels(model_name, "stream").observe(time.perf_counter() - started)
+                observe_usage(model_name, response)
+            elif response is not None:
+                await _cancel_stream(response, response_chunks)
+            stream_span.end(chunks=chunks, completed=completed)
+    
     async def _generate_content(
         self,
         prompt: Any,
         temperature: float = 0.7,
-        max_tokens: int = 2048
+        max_tokens: int = 2048,
+        output_config: Optional[Dict[str, Any]] = None
     ) -> str:
         """
-        Generate content using Gemini AI with automatic model fallback and rate limit handling
+        Generate content, continuing responses that stop at max_tokens
+        
+        When Gemini stops at max_output_tokens, up to GEMINI_MAX_CONTINUATIONS
+        follow-up calls resume from the partial output, so a truncated
+        generation costs only its missing tail instead of a full retry. The
+        follow-ups ask for plain text: they produce the rest of a JSON
+        document, not a document of their own.
         
         Args:
             prompt: The prompt to send to Gemini (string or list of parts)
             temperature: Sampling temperature
-            max_tokens: Maximum tokens to generate
+            max_tokens: Maximum tokens to generate per call
+            output_config: Response format fields from ``_output_config``
             
         Returns:
             Generated text response
+            
+        Raises:
+            DeadlineExceededError: If the request deadline passes before a response
         """
-        import asyncio
-        
-        max_retries = len(self.FALLBACK_MODELS) + 3  # Extra retries for rate limiting
-        rate_limit_retries = 0
-        max_rate_limit_retries = 5
-        last_error = None
+        response = await self._generate_response(prompt, temperature, max_tokens, output_config)
+        text = _response_text(response)
         
-        for attempt in range(max_retries):
-            try:
-                # Configure generation
-                generation_config = genai.types.GenerationConfig(
-                    temperature=temperature,
-                    max_output_tokens=max_tokens,
-                    candidate_count=1,
+        continuations = 0
+        while _finish_reason(response) == "MAX_TOKENS":
+            if continuations >= settings.GEMINI_MAX_CONTINUATIONS:
+                GEMINI_TRUNCATIONS.labels(self.current_model_name, "returned").inc()
+                logger.warning(
+                    f"Response still truncated after {continuations} continuations "
+                    f"(length={len(text)}); returning it as is"
                 )
-                
-                # Generate content
-                response = self.model.generate_content(
-                    prompt,
-                    generation_config=generation_config,
+                break
+            
+            continuations += 1
+            GEMINI_TRUNCATIONS.labels(self.current_model_name, "continued").inc()
+            logger.info(f"Response stopped at max_tokens (length={len(text)}); requesting continuation {continuations}")
+            
+            with tracer.span("gemini.continuation", number=continuations, partial_chars=len(text)):
+                response = await self._generate_response(
+                    _continuation_prompt(prompt, text), temperature, max_tokens
                 )
-                
-                # Extract text
-                if response.candidates:
-                    return response.candidates[0].content.parts[0].text
-                else:
-                    raise ValueError("No response generated from Gemini")
+            text = _stitch(text, _response_text(response))
+        
+        return text
+    
+    async def _generate_response(
+        self,
+        prompt: Any,
+        temperature: float,
+        max_tokens: int,
+        output_config: Optional[Dict[str, Any]] = None
+    ) -> Any:
+        """
+        Call Gemini with automatic model fallback and rate limit handling
+        
+        Each attempt is bounded by GEMINI_TIMEOUT, and all attempts together
+        (including 429 cooldowns) by the request deadline.
+        
+        Returns:
+            The SDK response, with at least one candidate
+            
+        Raises:
+            DeadlineExceededError: If the request deadline passes before a response
+        """
+        with tracer.span("gemini.generate", prompt_chars=_prompt_size(prompt), max_tokens=max_tokens) as span:
+            max_retries = len(self.FALLBACK_MODELS) + 3  # Extra retries for rate limiting
+            rate_limit_retries = 0
+            max_rate_limit_retries = 5
+            last_error = None
+        
+            for attempt in range(max_retries):
+                try:
+                    span.set_attribute("attempts", attempt + 1)
                     
-            except Exception as e:
-                last_error = e
-                error_str = str(e).lower()
+                    # Respect the Gemini budget and any cooldown shared across workers
+                    await self._acquire_quota()
+                    
+                    # Bound the attempt by GEMINI_TIMEOUT and the time left in the request
+                    timeout = deadline.attempt_timeout(settings.GEMINI_TIMEOUT)
                 
-                # Check if this is a rate limit error (429)
-                if "429" in error_str or "rate" in error_str or "quota" in error_str or "resource_exhausted" in error_str:
-                    rate_limit_retries += 1
-                    if rate_limit_retries <= max_rate_limit_retries:
-                        # Exponential backoff: 2^retry * 1 second (2s, 4s, 8s, 16s, 32s)
-                        wait_time = min(2 ** rate_limit_retries, 60)  # Cap at 60 seconds
-                        logger.warning(f"Rate limit hit (attempt {rate_limit_retries}/{max_rate_limit_retries}). Waiting {wait_time}s before retry...")
-                        await asyncio.sleep(wait_time)
-                        continue
+                    # Configure generation
+                    generation_config = genai.types.GenerationConfig(
+                        temperature=temperature,
+                        max_output_tokens=max_tokens,
+                        candidate_count=1,
+                        **(output_config or {}),
+                    )
+                
+                    # Generate content
+                    model_name = self.current_model_name
+                    started = time.perf_counter()
+                    with tracer.span("gemini.call", model=model_name, attempt=attempt + 1, timeout_s=round(timeout, 3)):
+                        response = await asyncio.wait_for(
+                            self.model.generate_content_async(
+                                prompt,
+                                generation_config=generation_config,
+                                request_options={"timeout": timeout},
+                            ),
+                            timeout=timeout,
+                        )
+                    GEMINI_LATENCY.labels(model_name, "unary").observe(time.perf_counter() - started)
+                    observe_usage(model_name, response)
+                    span.set_attribute("model", model_name)
+                
+                    if response.candidates:
+                        return response
                     else:
-                        logger.error(f"Rate limit exceeded after {max_rate_limit_retries} retries")
-                        raise ValueError(f"Rate limit exceeded. Please try again later. Original error: {e}")
+                        raise ValueError("No response generated from Gemini")
+                
+                except DeadlineExceededError:
+                    raise
                 
-                # Check if this is a timeout or model availability error
-                elif "deadline" in error_str or "timeout" in error_str or "504" in error_str or "unavailable" in error_str:
-                    logger.warning(f"Model {self.current_model_name} failed with timeout/availability error: {e}")
+                except asyncio.TimeoutError:
+                    if deadline.expired():
+                        raise DeadlineExceededError(f"Request deadline exceeded waiting for {model_name}")
+                    last_error = TimeoutError(f"Gemini call to {model_name} exceeded timeout of {timeout:.1f}s")
+                    logger.warning(f"{last_error}")
                     
                     # Try to switch to a fallback model
-                    if self._switch_to_fallback_model(self.current_model_name):
+                    if self._switch_to_fallback_model(model_name):
                         logger.info(f"Retrying with fallback model: {self.current_model_name}")
                         continue
+                    logger.error("No more fallback models available")
+                    break
+                    
+                except Exception as e:
+                    last_error = e
+                    error_str = str(e).lower()
+                
+                    # Check if this is a rate limit error (429)
+                    if "429" in error_str or "rate" in error_str or "quota" in error_str or "resource_exhausted" in error_str:
+                        rate_limit_retries += 1
+                        if rate_limit_retries <= max_rate_limit_retries:
+                            GEMINI_RATE_LIMIT_RETRIES.labels(self.current_model_name).inc()
+                            span.set_attribute("rate_limit_retries", rate_limit_retries)
+                            # Exponential backoff: 2^retry * 1 second (2s, 4s, 8s, 16s, 32s)
+                            wait_time = min(2 ** rate_limit_retries, 60)  # Cap at 60 seconds
+                            logger.warning(f"Rate limit hit (attempt {rate_limit_retries}/{max_rate_limit_retries}). Waiting {wait_time}s before retry...")
+                            # Share the cooldown so other workers back off as well;
+                            # the next acquire() waits it out
+                            await quota_guard.trip_async(wait_time)
+                            continue
+                        else:
+                            logger.error(f"Rate limit exceeded after {max_rate_limit_retries} retries")
+                            raise ValueError(f"Rate limit exceeded. Please try again later. Original error: {e}")
+                
+                    # Check if this is a timeout or model availability error
+                    elif "deadline" in error_str or "timeout" in error_str or "504" in error_str or "unavailable" in error_str:
+                        logger.warning(f"Model {self.current_model_name} failed with timeout/availability error: {e}")
+                    
+                        # Try to switch to a fallback model
+                        if self._switch_to_fallback_model(self.current_model_name):
+                            logger.info(f"Retrying with fallback model: {self.current_model_name}")
+                            continue
+                        else:
+                            logger.error("No more fallback models available")
+                            break
                     else:
-                        logger.error("No more fallback models available")
-                        break
-                else:
-                    # For other errors, don't retry with fallback
-                    logger.error(f"Error generating content: {e}", exc_info=True)
-                    raise
+                        # For other errors, don't retry with fallback
+                        logger.error(f"Error generating content: {e}", exc_info=True)
+                        raise
         
-        # If we get here, all retries failed
-        logger.error(f"All model attempts failed. Last error: {last_error}")
-        raise last_error if last_error else ValueError("Failed to generate content")
+            # If we get here, all retries failed
+            logger.error(f"All model attempts failed. Last error: {last_error}")
+            raise last_error if last_error else ValueError("Failed to generate content")
     
-    def _parse_json_response(self, response: str) -> Dict[str, Any]:
+    async def _parse_structured(
+        self,
+        instruction_name: str,
+        instructions: Dict[str, Any],
+        prompt: Any,
+        response: str
+    ) -> Any:
         """
-        Parse JSON from AI response with robust repair
+        Parse a response and fix the fields that fail the instruction's response_schema
+        
+        Missing or invalid fields are requested with one short follow-up call
+        that returns only those fields (see app.services.output_schema), and
+        merged in, instead of regenerating the whole response. A response
+        that is still invalid afterwards is returned as is.
+        
+        Args:
+            instruction_name: Instruction the response was generated with
+            instructions: The instruction's YAML data
+            prompt: The prompt the response answers
+            response: Response text
+            
+        Returns:
+            The parsed (and possibly patched) response
         """
-        import json_repair
+        result = self._parse_json_response(response)
+        schema = instructions.get("response_schema")
+        if schema is None:
+            return result
         
-        # Clean common artifacts
-        json_str = response.strip()
+        problems = find_problems(result, schema)
+        if not problems:
+            OUTPUT_VALIDATION.labels(instruction_name, "valid").inc()
+            return result
         
-        try:
-            # json_repair handles missing commas, trailing commas, 
-            # unquoted keys, and markdown blocks automatically.
-            return json_repair.loads(json_str)
-        except Exception as e:
-            logger.error(f"Failed to repair and parse JSON: {e}")
-            logger.debug(f"Raw string: {response}")
-            raise ValueError(f"Invalid JSON response from AI even after repair: {str(e)}")
+        paths = [path for path, _ in problems]
+        logger.warning(
+            f"{instruction_name} response failed validation: "
+            + "; ".join(f"{format_path(path)} {reason}" for path, reason in problems[:10])
+        )
+        
+        # A response that is wrong as a whole, or in too many places, is not worth patching
+        if settings.OUTPUT_REASK_ENABLED and () not in paths and len(paths) <= settings.OUTPUT_REASK_MAX_FIELDS:
+            try:
+                with tracer.span("output.reask", instruction=instruction_name, fields=len(paths)):
+                    patch = await self._generate_content(
+                        prompt=_reask_prompt(prompt, result, problems),
+                        temperature=instructions.get("temperature", 0.7),
+                        max_tokens=instructions.get("max_tokens", 2048),
+                        output_config={
+                            "response_mime_type": "application/json",
+                            "response_schema": patch_schema(schema, paths),
+                        },
+                    )
+                    patch = self._parse_json_response(patch)
+                if isinstance(patch, dict):
+                    merge_patch(result, patch)
+                problems = find_problems(result, schema)
+            except Exception as e:
+                # Including the deadline: the unpatched response is better than none
+                logger.warning(f"Re-ask for {instruction_name} fields failed: {e}")
+        
+        OUTPUT_VALIDATION.labels(instruction_name, "invalid" if problems else "fixed").inc()
+        return result
+    
+    def _parse_json_response(self, response: str) -> Dict[str, Any]:
+        """
+        Parse JSON from AI response, repairing it only if it is malformed
+        
+        See app.services.json_decoding for the decoding tiers.
+        """
+        with tracer.span("json.parse", response_chars=len(response)) as parse_span:
+            try:
+                result, tier = decode_with_tier(response)
+            except ValueError as e:
+                logger.error(f"Failed to repair and parse JSON: {e}")
+                logger.debug(f"Raw string: {response}")
+                raise
+            parse_span.set_attribute("tier", tier)
+        if tier == REPAIRED:
+            logger.warning(f"Repaired malformed JSON response (length={len(response)})")
+        return result
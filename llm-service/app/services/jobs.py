@@ -0,0 +1,340 @@
+"""
+Background Jobs
+Runs long generations (documents, scholarship discovery) outside the HTTP request
+
+A client submits a job and gets its id straight away, then polls the job or
+subscribes to its events instead of holding a connection open while Gemini
+works:
+
+- jobs are kept in a SQLite file (JOB_STORE_PATH) shared by every worker on
+  the host, so any worker can answer a poll; the worker that accepted a job
+  runs it
+- each worker runs at most JOB_MAX_CONCURRENCY jobs at a time and keeps at
+  most JOB_MAX_PENDING waiting; beyond that submissions are refused
+- a job is bounded by JOB_TIMEOUT through the request deadline
+  (app.core.deadline), so its Gemini calls stop when it runs out of time
+- the running worker refreshes its jobs every few seconds; a job whose
+  worker stopped (crash, restart) is reported failed after JOB_LEASE_SECONDS
+- finished jobs are kept for JOB_RESULT_TTL seconds
+- submissions are idempotent: resubmitting with the same Idempotency-Key
+  (or, without one, the same request) returns the existing job unless it
+  failed
+
+OWASP: Sensitive Data Exposure - only a hash of the request is stored; the
+result is kept until its TTL expires.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from app.core.deadline import reset_deadline, set_deadline
+from app.core.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+FINISHED = (SUCCEEDED, FAILED)
+
+
+class JobConflictError(Exception):
+    """An idempotency key was reused for a different request"""
+
+
+class JobQueueFullError(Exception):
+    """The worker already has JOB_MAX_PENDING jobs waiting"""
+
+
+def request_hash(kind: str, payload: Dict[str, Any]) -> str:
+    """Stable hash of a job's kind and request body"""
+    encoded = json.dumps({"kind": kind, "request": payload}, sort_keys=True, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class JobStore:
+    """
+    Jobs kept in a SQLite database file.
+
+    Connections are opened per thread and re-opened after a fork, like the
+    rate limit storage; every state change is a single short statement.
+    """
+
+    COLUMNS = (
+        "id", "kind", "status", "idempotency_key", "request_hash", "result", "error",
+        "worker_pid", "created_at", "updated_at", "expires_at",
+    )
+
+    def __init__(self, path: str, lease_seconds: float = 60.0, timeout: float = 5.0):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        """Get the connection for the current thread, reconnecting after fork"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, kind TEXT NOT NULL, status TEXT NOT NULL, "
+                "idempotency_key TEXT NOT NULL UNIQUE, request_hash TEXT NOT NULL, "
+                "result TEXT, error TEXT, worker_pid INTEGER, "
+                "created_at REAL NOT NULL, updated_at REAL NOT NULL, expires_at REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_expires_at ON jobs (expires_at)")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _row(self, row: Optional[tuple]) -> Optional[Dict[str, Any]]:
+        if row is None:
+            return None
+        job = dict(zip(self.COLUMNS, row))
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def create(self, kind: str, idempotency_key: str, hashed: str, ttl: float) -> Tuple[Dict[str, Any], bool]:
+        """
+        Create a queued job, or return the job already submitted under the key
+
+        Returns:
+            (job, created)
+
+        Raises:
+            JobConflictError: If the key belongs to a job for a different request
+        """
+        now = time.time()
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM jobs WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+            existing = self._row(conn.execute(
+                f"SELECT {', '.join(self.COLUMNS)} FROM jobs WHERE idempotency_key = ?", (idempotency_key,)
+            ).fetchone())
+            if existing is not None:
+                existing = self._check_lease(existing, ttl)
+                if existing["request_hash"] != hashed:
+                    raise JobConflictError(f"Idempotency key was already used for a different {existing['kind']} request")
+                if existing["status"] != FAILED:
+                    conn.execute("COMMIT")
+                    return existing, False
+                # Failed jobs can be retried under the same key
+                conn.execute("DELETE FROM jobs WHERE id = ?", (existing["id"],))
+
+            job_id = uuid.uuid4().hex
+            conn.execute(
+                "INSERT INTO jobs (id, kind, status, idempotency_key, request_hash, worker_pid, "
+                "created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, QUEUED, idempotency_key, hashed, os.getpid(), now, now),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return self.get(job_id, ttl), True
+
+    def get(self, job_id: str, ttl: float) -> Optional[Dict[str, Any]]:
+        """Get a job, or None if it does not exist or has expired"""
+        conn = self._connection()
+        job = self._row(conn.execute(
+            f"SELECT {', '.join(self.COLUMNS)} FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone())
+        if job is None or (job["expires_at"] is not None and job["expires_at"] <= time.time()):
+            return None
+        return self._check_lease(job, ttl)
+
+    def find(self, idempotency_key: str, ttl: float) -> Optional[Dict[str, Any]]:
+        """Get the job submitted under an idempotency key"""
+        row = self._connection().execute(
+            "SELECT id FROM jobs WHERE idempotency_key = ?", (idempotency_key,)
+        ).fetchone()
+        return self.get(row[0], ttl) if row else None
+
+    def _check_lease(self, job: Dict[str, Any], ttl: float) -> Dict[str, Any]:
+        """Fail an unfinished job whose worker stopped refreshing it"""
+        if job["status"] in FINISHED or job["updated_at"] > time.time() - self.lease_seconds:
+            return job
+        logger.warning(f"Job {job['id']} was lost by worker {job['worker_pid']}")
+        self.finish(job["id"], FAILED, ttl, error="Job was interrupted; please resubmit")
+        job.update(status=FAILED, error="Job was interrupted; please resubmit")
+        return job
+
+    def mark_running(self, job_id: str):
+        self._connection().execute(
+            "UPDATE jobs SET status = ?, updated_at = ? WHERE id = ? AND status = ?",
+            (RUNNING, time.time(), job_id, QUEUED),
+        )
+
+    def touch(self, job_ids):
+        """Refresh the lease of unfinished jobs"""
+        if not job_ids:
+            return
+        placeholders = ", ".join("?" for _ in job_ids)
+        self._connection().execute(
+            f"UPDATE jobs SET updated_at = ? WHERE id IN ({placeholders}) AND status IN (?, ?)",
+            (time.time(), *job_ids, QUEUED, RUNNING),
+        )
+
+    def finish(self, job_id: str, status: str, ttl: float, result: Any = None, error: Optional[str] = None):
+        """Store a job's outcome and start its retention period"""
+        now = time.time()
+        self._connection().execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, updated_at = ?, expires_at = ? "
+            "WHERE id = ? AND status IN (?, ?)",
+            (
+                status,
+                json.dumps(result, default=str) if result is not None else None,
+                error,
+                now,
+                now + ttl,
+                job_id,
+                QUEUED,
+                RUNNING,
+            ),
+        )
+
+
+JobHandler = Callable[[], Awaitable[Any]]
+
+
+class JobRunner:
+    """Runs this worker's jobs with bounded concurrency"""
+
+    def __init__(
+        self,
+        store: JobStore,
+        max_concurrency: int = 4,
+        max_pending: int = 100,
+        timeout: float = 600.0,
+        result_ttl: float = 3600.0,
+    ):
+        self.store = store
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.result_ttl = result_ttl
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._done: Dict[str, asyncio.Event] = {}
+        self._heartbeat: Optional[asyncio.Task] = None
+
+    async def submit(
+        self,
+        kind: str,
+        payload: Dict[str, Any],
+        handler: JobHandler,
+        idempotency_key: Optional[str] = None,
+    ) -> Tuple[Dict[str, Any], bool]:
+        """
+        Submit a job, or find the one already submitted for the same key
+
+        Args:
+            kind: Job type, e.g. "generate-document"
+            payload: JSON-serializable request, used for the idempotency hash
+            handler: Coroutine function producing the job's result
+            idempotency_key: Client-supplied key; defaults to the request hash
+
+        Returns:
+            (job, created)
+
+        Raises:
+            JobConflictError: If the key was used for a different request
+            JobQueueFullError: If this worker has too many jobs waiting
+        """
+        hashed = request_hash(kind, payload)
+        key = f"{kind}:{idempotency_key or hashed}"
+
+        if len(self._tasks) >= self.max_pending:
+            # Resubmissions of known jobs are still answered
+            existing = self.store.find(key, self.result_ttl)
+            if existing is None or existing["status"] == FAILED or existing["request_hash"] != hashed:
+                raise JobQueueFullError(f"{len(self._tasks)} jobs pending on this worker")
+            return existing, False
+
+        job, created = self.store.create(kind, key, hashed, self.result_ttl)
+        if created:
+            self._done[job["id"]] = asyncio.Event()
+            self._tasks[job["id"]] = asyncio.create_task(self._run(job["id"], kind, handler))
+            self._start_heartbeat()
+            logger.info(f"Job {job['id']} ({kind}) submitted")
+        return job, created
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self.store.get(job_id, self.result_ttl)
+
+    async def wait(self, job_id: str, timeout: float):
+        """Wait until a local job finishes or ``timeout`` passes; jobs on other workers are polled"""
+        done = self._done.get(job_id)
+        if done is None:
+            await asyncio.sleep(timeout)
+            return
+        try:
+            await asyncio.wait_for(done.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _run(self, job_id: str, kind: str, handler: JobHandler):
+        try:
+            async with self._semaphore:
+                self.store.mark_running(job_id)
+                # The job gets its own time budget, not the submitting request's
+                deadline_token = set_deadline(self.timeout)
+                started = time.perf_counter()
+                try:
+                    with tracer.span("job.run", kind=kind, job_id=job_id):
+                        result = await handler()
+                    self.store.finish(job_id, SUCCEEDED, self.result_ttl, result=result)
+                    logger.info(
+                        f"Job {job_id} ({kind}) succeeded",
+                        extra={"duration_ms": round((time.perf_counter() - started) * 1000, 2)}
+                    )
+                except asyncio.CancelledError:
+                    self.store.finish(job_id, FAILED, self.result_ttl, error="Service shut down; please resubmit")
+                    raise
+                except Exception as e:
+                    logger.error(f"Job {job_id} ({kind}) failed: {e}", exc_info=True)
+                    self.store.finish(job_id, FAILED, self.result_ttl, error=str(e))
+                finally:
+                    reset_deadline(deadline_token)
+        finally:
+            self._tasks.pop(job_id, None)
+            done = self._done.pop(job_id, None)
+            if done is not None:
+                done.set()
+
+    def _start_heartbeat(self):
+        if self._heartbeat is None or self._heartbeat.done():
+            self._heartbeat = asyncio.create_task(self._refresh_leases())
+
+    async def _refresh_leases(self):
+        """Keep this worker's unfinished jobs from being reported lost"""
+        interval = self.store.lease_seconds / 3
+        while self._tasks:
+            await asyncio.sleep(interval)
+            try:
+                self.store.touch(list(self._tasks))
+            except sqlite3.Error as e:
+                logger.warning(f"Failed to refresh job leases: {e}")
+
+    async def shutdown(self):
+        """Cancel this worker's jobs, marking them failed so clients can resubmit"""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if tasks:
+            logger.info(f"Cancelled {len(tasks)} running jobs")
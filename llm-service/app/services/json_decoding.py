@@ -0,0 +1,127 @@
+"""
+Model Output JSON Decoding
+Parses the JSON in a model response, trying the cheapest tier first
+
+Most responses are valid JSON (structured output) or valid JSON in a
+markdown fence; only the rest need json_repair, which is a pure-Python
+parser and costs milliseconds on a long document. The tiers are:
+
+- strict: the whole response is JSON, parsed by orjson
+- fenced: JSON inside a ``` or ```json fence, possibly with prose around it;
+  the fence is located with str.find (no regex, no strip) and the body is
+  sliced once and parsed by orjson
+- repaired: anything else (truncated output, trailing commas, unquoted
+  keys) goes through json_repair
+- failed: no JSON object or array could be recovered
+
+Each decode is counted and timed per tier in llm_json_decode_total and
+llm_json_decode_seconds.
+"""
+
+import logging
+import time
+from typing import Any, Optional, Tuple
+
+import orjson
+
+from app.core.metrics import JSON_DECODE, JSON_DECODE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+STRICT = "strict"
+FENCED = "fenced"
+REPAIRED = "repaired"
+FAILED = "failed"
+
+FENCE = "```"
+WHITESPACE = " \t\r\n"
+
+
+def _first_char(text: str, start: int = 0) -> str:
+    """First non-whitespace character at or after ``start`` ("" if none)"""
+    length = len(text)
+    while start < length and text[start] in WHITESPACE:
+        start += 1
+    return text[start] if start < length else ""
+
+
+def fence_bounds(text: str) -> Optional[Tuple[int, int]]:
+    """
+    Locate the body of the first markdown code fence
+
+    Returns:
+        (start, end) of the fence body, or None if the text has no fence.
+        A fence that is never closed (truncated output) runs to the end.
+    """
+    opening = text.find(FENCE)
+    if opening < 0:
+        return None
+    # Skip the language tag (```json) up to the end of the line
+    start = text.find("\n", opening + len(FENCE))
+    if start < 0:
+        return None
+    start += 1
+    # The last fence closes the block, so fences quoted inside the
+    # document's own strings do not cut it short
+    end = text.rfind(FENCE, start)
+    return start, end if end >= 0 else len(text)
+
+
+def decode_with_tier(text: str) -> Tuple[Any, str]:
+    """
+    Decode the JSON object or array in a model response
+
+    Returns:
+        The decoded value and the tier that produced it
+
+    Raises:
+        ValueError: If no JSON object or array could be recovered
+    """
+    started = time.perf_counter()
+    tier = FAILED
+    try:
+        # orjson skips surrounding whitespace itself; only try it when the
+        # response can be JSON at all, so fenced text does not pay a failed parse
+        if _first_char(text) in ("{", "["):
+            try:
+                result = orjson.loads(text)
+                tier = STRICT
+                return result, tier
+            except orjson.JSONDecodeError:
+                pass
+
+        bounds = fence_bounds(text)
+        if bounds is not None and _first_char(text, bounds[0]) in ("{", "["):
+            try:
+                result = orjson.loads(text[bounds[0]:bounds[1]])
+                tier = FENCED
+                return result, tier
+            except orjson.JSONDecodeError:
+                pass
+
+        import json_repair
+
+        # json_repair handles missing commas, trailing commas,
+        # unquoted keys, and markdown blocks automatically.
+        try:
+            result = json_repair.loads(text)
+        except Exception as e:
+            raise ValueError(f"Invalid JSON response from AI even after repair: {e}")
+        # json_repair returns "" rather than raising when it finds nothing
+        if not isinstance(result, (dict, list)):
+            raise ValueError("Invalid JSON response from AI even after repair: no JSON object or array found")
+        tier = REPAIRED
+        return result, tier
+    finally:
+        JSON_DECODE.labels(tier).inc()
+        JSON_DECODE_SECONDS.labels(tier).observe(time.perf_counter() - started)
+
+
+def decode_json(text: str) -> Any:
+    """
+    Decode the JSON object or array in a model response
+
+    Raises:
+        ValueError: If no JSON object or array could be recovered
+    """
+    return decode_with_tier(text)[0]
@@ -0,0 +1,408 @@
+"""
+LLM Backends
+Where GeminiService's model clients come from: live Gemini, recording, or replay
+
+GeminiService only needs model clients with the SDK's async methods,
+``generate_content_async`` (unary or ``stream=True``) and
+``count_tokens_async``. A backend hands out those clients:
+
+- live: ``genai.GenerativeModel`` instances talking to Gemini
+- record: live clients whose calls are also appended to a cassette file
+  (JSON lines with the prompt, generation settings, response text, token
+  usage, errors and, for streams, every chunk with its offset from the call)
+- replay: clients that serve a cassette with the recorded timing, optionally
+  accelerated, so production workloads can be reproduced offline and the
+  service's own CPU and memory costs profiled without model latency noise
+
+OWASP: Sensitive Data Exposure - cassettes contain user prompts (CVs,
+profiles); recording is refused in production and cassettes must be handled
+as user data.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+import google.generativeai as genai
+
+logger = logging.getLogger(__name__)
+
+
+def _normalize_prompt(prompt: Any) -> List[Any]:
+    """
+    JSON-serializable prompt parts; binary parts are replaced by their hash and size
+
+    Multi-turn prompts (content dicts with a role and parts) keep their
+    structure, with their parts normalized the same way.
+    """
+    parts = prompt if isinstance(prompt, list) else [prompt]
+    normalized = []
+    for part in parts:
+        if isinstance(part, dict) and "parts" in part:
+            normalized.append({"role": part.get("role"), "parts": _normalize_prompt(part["parts"])})
+        elif isinstance(part, dict) and isinstance(part.get("data"), (bytes, bytearray)):
+            normalized.append({
+                "mime_type": part.get("mime_type"),
+                "sha256": hashlib.sha256(part["data"]).hexdigest(),
+                "bytes": len(part["data"]),
+            })
+        else:
+            normalized.append(part if isinstance(part, (str, dict)) else str(part))
+    return normalized
+
+
+def prompt_key(prompt: Any) -> str:
+    """Stable key of a prompt, used to match replayed calls to recordings"""
+    encoded = json.dumps(_normalize_prompt(prompt), sort_keys=True, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def _usage_dict(response: Any) -> Optional[Dict[str, int]]:
+    usage = getattr(response, "usage_metadata", None)
+    if not usage:
+        return None
+    return {
+        "prompt_token_count": getattr(usage, "prompt_token_count", 0) or 0,
+        "candidates_token_count": getattr(usage, "candidates_token_count", 0) or 0,
+    }
+
+
+def _finish_reason_name(response: Any) -> Optional[str]:
+    if not response.candidates:
+        return None
+    reason = getattr(response.candidates[0], "finish_reason", None)
+    return getattr(reason, "name", reason)
+
+
+def _error_dict(error: Exception) -> Dict[str, str]:
+    return {"type": type(error).__name__, "message": getattr(error, "message", None) or str(error)}
+
+
+def _config_dict(generation_config: Any) -> Dict[str, Any]:
+    if generation_config is None:
+        return {}
+    return {
+        key: getattr(generation_config, key, None)
+        for key in ("temperature", "max_output_tokens", "candidate_count", "response_mime_type")
+    }
+
+
+class LLMBackend:
+    """Creates the model clients used by GeminiService"""
+
+    name = "base"
+
+    def get_model(self, model_name: str):
+        raise NotImplementedError
+
+    async def upload_file(self, path: str, mime_type: str) -> Optional[Tuple[str, float]]:
+        """
+        Upload a file for use in prompts
+
+        Returns:
+            (file URI, expiry as epoch seconds), or None if the backend keeps
+            no files and prompts must carry the bytes
+        """
+        return None
+
+
+class LiveBackend(LLMBackend):
+    """Google Gemini"""
+
+    name = "live"
+
+    def __init__(self, api_key: str):
+        genai.configure(api_key=api_key)
+
+    def get_model(self, model_name: str):
+        return genai.GenerativeModel(model_name)
+
+    async def upload_file(self, path: str, mime_type: str) -> Optional[Tuple[str, float]]:
+        """Upload to the Gemini Files API, which keeps files for 48 hours"""
+        uploaded = await asyncio.to_thread(genai.upload_file, path, mime_type=mime_type)
+        # Large or video files are processed first; send those inline rather than wait
+        if getattr(uploaded.state, "name", uploaded.state) != "ACTIVE":
+            return None
+        return uploaded.uri, uploaded.expiration_time.timestamp()
+
+
+class CassetteWriter:
+    """Appends interactions to a cassette file, one JSON object per line"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+    def write(self, entry: Dict[str, Any]):
+        line = json.dumps(entry, default=str) + "\n"
+        with self._lock:
+            # One write per entry so appends from several workers do not interleave
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+
+
+class _RecordedStream:
+    """Passes a streaming response through while recording each chunk and its offset"""
+
+    def __init__(self, response: Any, entry: Dict[str, Any], started: float, writer: CassetteWriter):
+        self._response = response
+        self._entry = entry
+        self._started = started
+        self._writer = writer
+
+    @property
+    def usage_metadata(self):
+        return getattr(self._response, "usage_metadata", None)
+
+    @property
+    def _iterator(self):
+        # The underlying call, so GeminiService can cancel an abandoned stream
+        return getattr(self._response, "_iterator", None)
+
+    async def __aiter__(self) -> AsyncIterator[Any]:
+        chunks = []
+        try:
+            async for chunk in self._response:
+                chunks.append({"offset": round(time.perf_counter() - self._started, 4), "text": chunk.text})
+                yield chunk
+        except Exception as e:
+            self._entry["error"] = _error_dict(e)
+            raise
+        finally:
+            self._entry["chunks"] = chunks
+            self._entry["latency"] = round(time.perf_counter() - self._started, 4)
+            self._entry["usage"] = _usage_dict(self._response)
+            self._writer.write(self._entry)
+
+
+class _RecordingModel:
+    """Live model client that records every call"""
+
+    def __init__(self, model: Any, model_name: str, writer: CassetteWriter):
+        self._model = model
+        self.model_name = model_name
+        self._writer = writer
+
+    async def generate_content_async(
+        self,
+        prompt: Any,
+        generation_config: Any = None,
+        stream: bool = False,
+        request_options: Any = None,
+    ):
+        entry = {
+            "key": prompt_key(prompt),
+            "model": self.model_name,
+            "stream": stream,
+            "recorded_at": time.time(),
+            "config": _config_dict(generation_config),
+            "prompt": _normalize_prompt(prompt),
+        }
+        started = time.perf_counter()
+        try:
+            response = await self._model.generate_content_async(
+                prompt,
+                generation_config=generation_config,
+                stream=stream,
+                request_options=request_options,
+            )
+        except Exception as e:
+            entry["latency"] = round(time.perf_counter() - started, 4)
+            entry["error"] = _error_dict(e)
+            self._writer.write(entry)
+            raise
+
+        if stream:
+            return _RecordedStream(response, entry, started, self._writer)
+
+        entry["latency"] = round(time.perf_counter() - started, 4)
+        entry["text"] = response.candidates[0].content.parts[0].text if response.candidates else None
+        entry["finish_reason"] = _finish_reason_name(response)
+        entry["usage"] = _usage_dict(response)
+        self._writer.write(entry)
+        return response
+
+    async def count_tokens_async(self, contents: Any):
+        return await self._model.count_tokens_async(contents)
+
+
+class RecordingBackend(LiveBackend):
+    """Google Gemini, with every call appended to a cassette"""
+
+    name = "record"
+
+    def __init__(self, api_key: str, cassette_path: str):
+        super().__init__(api_key)
+        self.writer = CassetteWriter(cassette_path)
+        logger.warning(f"Recording LLM calls to {cassette_path}; the cassette contains user prompts")
+
+    def get_model(self, model_name: str):
+        return _RecordingModel(super().get_model(model_name), model_name, self.writer)
+
+    async def upload_file(self, path: str, mime_type: str) -> Optional[Tuple[str, float]]:
+        # Cassettes keep the bytes' hash, so replayed prompts match without the Files API
+        return None
+
+
+class CassetteMiss(LookupError):
+    """A replayed prompt has no recording"""
+
+
+def _replayed_error(error: Dict[str, str]) -> Exception:
+    """Rebuild a recorded SDK error so GeminiService handles it the same way"""
+    from google.api_core import exceptions as google_exceptions
+
+    error_class = getattr(google_exceptions, error.get("type", ""), None)
+    if isinstance(error_class, type) and issubclass(error_class, google_exceptions.GoogleAPICallError):
+        return error_class(error["message"])
+    return RuntimeError(error["message"])
+
+
+def _usage_namespace(usage: Optional[Dict[str, int]]) -> Optional[SimpleNamespace]:
+    return SimpleNamespace(**usage) if usage else None
+
+
+class _ReplayedStream:
+    """Streams recorded chunks at their recorded offsets"""
+
+    def __init__(self, entry: Dict[str, Any], speed: float):
+        self._entry = entry
+        self._speed = speed
+        self.usage_metadata = _usage_namespace(entry.get("usage"))
+
+    async def __aiter__(self) -> AsyncIterator[SimpleNamespace]:
+        started = time.perf_counter()
+        chunks = self._entry.get("chunks")
+        if chunks is None:
+            # Recorded as a unary call: replay the text as one chunk
+            chunks = [{"offset": self._entry.get("latency", 0), "text": self._entry.get("text") or ""}]
+        for chunk in chunks:
+            if self._speed > 0:
+                delay = chunk["offset"] / self._speed - (time.perf_counter() - started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            yield SimpleNamespace(text=chunk["text"])
+        if self._entry.get("error"):
+            raise _replayed_error(self._entry["error"])
+
+
+class Cassette:
+    """Recorded interactions indexed by prompt key"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries: List[Dict[str, Any]] = []
+        self.by_key: Dict[str, List[Dict[str, Any]]] = {}
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self.entries.append(entry)
+                    self.by_key.setdefault(entry["key"], []).append(entry)
+        self._positions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        if not self.entries:
+            raise ValueError(f"Cassette {path} has no recordings")
+
+    def _next(self, key: str, candidates: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Cycle through candidates so repeated prompts replay each recording in turn"""
+        with self._lock:
+            position = self._positions.get(key, 0)
+            self._positions[key] = position + 1
+        return candidates[position % len(candidates)]
+
+    def lookup(self, prompt: Any, strict: bool) -> Dict[str, Any]:
+        key = prompt_key(prompt)
+        candidates = self.by_key.get(key)
+        if candidates:
+            return self._next(key, candidates)
+        if strict:
+            raise CassetteMiss(f"No recording for prompt {key[:12]} in {self.path}")
+        # Unknown prompt: serve the recordings in order, keeping their sizes and timing
+        return self._next("*", self.entries)
+
+
+class _ReplayModel:
+    """Model client that serves a cassette"""
+
+    def __init__(self, cassette: Cassette, model_name: str, speed: float, strict: bool):
+        self.cassette = cassette
+        self.model_name = model_name
+        self.speed = speed
+        self.strict = strict
+
+    async def generate_content_async(
+        self,
+        prompt: Any,
+        generation_config: Any = None,
+        stream: bool = False,
+        request_options: Any = None,
+    ):
+        entry = self.cassette.lookup(prompt, self.strict)
+
+        if stream:
+            if entry.get("error") and entry.get("chunks") is None:
+                await self._sleep(entry.get("latency", 0))
+                raise _replayed_error(entry["error"])
+            return _ReplayedStream(entry, self.speed)
+
+        await self._sleep(entry.get("latency", 0))
+        if entry.get("error"):
+            raise _replayed_error(entry["error"])
+
+        text = entry.get("text")
+        if text is None:
+            text = "".join(chunk["text"] for chunk in entry.get("chunks") or [])
+        return SimpleNamespace(
+            candidates=[SimpleNamespace(
+                content=SimpleNamespace(parts=[SimpleNamespace(text=text)]),
+                finish_reason=entry.get("finish_reason"),
+            )],
+            usage_metadata=_usage_namespace(entry.get("usage")),
+        )
+
+    async def _sleep(self, latency: float):
+        if self.speed > 0 and latency:
+            await asyncio.sleep(latency / self.speed)
+
+    async def count_tokens_async(self, contents: Any):
+        return SimpleNamespace(total_tokens=0)
+
+
+class ReplayBackend(LLMBackend):
+    """Serves recorded interactions from a cassette instead of calling Gemini"""
+
+    name = "replay"
+
+    def __init__(self, cassette_path: str, speed: float = 1.0, strict: bool = False):
+        self.cassette = Cassette(cassette_path)
+        self.speed = speed
+        self.strict = strict
+        logger.info(
+            f"Replaying {len(self.cassette.entries)} LLM calls from {cassette_path} "
+            f"(speed={speed}, strict={strict})"
+        )
+
+    def get_model(self, model_name: str):
+        return _ReplayModel(self.cassette, model_name, self.speed, self.strict)
+
+
+def create_backend(settings) -> LLMBackend:
+    """Backend selected by LLM_BACKEND"""
+    if settings.LLM_BACKEND == "live":
+        return LiveBackend(settings.GEMINI_API_KEY)
+
+    if not settings.LLM_CASSETTE_PATH:
+        raise ValueError(f"LLM_CASSETTE_PATH is required for LLM_BACKEND={settings.LLM_BACKEND}")
+
+    if settings.LLM_BACKEND == "record":
+        return RecordingBackend(settings.GEMINI_API_KEY, settings.LLM_CASSETTE_PATH)
+    return ReplayBackend(settings.LLM_CASSETTE_PATH, settings.LLM_REPLAY_SPEED, settings.LLM_REPLAY_STRICT)
@@ -0,0 +1,125 @@
+"""
+Model Output Validation
+Checks decoded model output against an instruction's response_schema and builds targeted re-asks
+
+Schema-constrained output is valid by construction, but responses that were
+repaired, continued after max_tokens, or streamed (which ask for bare JSON)
+can still miss required fields or carry values of the wrong type. Rather
+than regenerating the whole response, GeminiService asks the model for only
+the faulty fields:
+
+- ``find_problems`` lists the faulty paths, e.g. ``[3].match_score``
+- ``patch_schema`` is the schema of an object holding only those paths,
+  with array positions as keys (``{"3": {"match_score": 87}}``)
+- ``merge_patch`` writes the model's answer back into the response
+"""
+
+from typing import Any, Dict, List, Tuple, Union
+
+PathKey = Union[str, int]
+Path = Tuple[PathKey, ...]
+
+_TYPES = {
+    "string": (str,),
+    "integer": (int,),
+    "number": (int, float),
+    "boolean": (bool,),
+    "array": (list,),
+    "object": (dict,),
+}
+
+
+def format_path(path: Path) -> str:
+    """``("scholarships", 3, "amount")`` -> ``scholarships[3].amount``"""
+    text = ""
+    for key in path:
+        text += f"[{key}]" if isinstance(key, int) else (f".{key}" if text else key)
+    return text or "(root)"
+
+
+def _type_matches(value: Any, schema_type: str) -> bool:
+    # bool is an int subclass, but true is not a number here
+    if isinstance(value, bool) and schema_type != "boolean":
+        return False
+    return isinstance(value, _TYPES[schema_type])
+
+
+def find_problems(value: Any, schema: Dict[str, Any], path: Path = ()) -> List[Tuple[Path, str]]:
+    """
+    Paths where ``value`` does not satisfy ``schema``
+
+    Returns:
+        (path, reason) pairs; a faulty value is reported once, not its children
+    """
+    if value is None:
+        return [] if schema.get("nullable") else [(path, "is null")]
+
+    schema_type = schema["type"]
+    if not _type_matches(value, schema_type):
+        return [(path, f"is not of type {schema_type}")]
+
+    if "enum" in schema and value not in schema["enum"]:
+        return [(path, f"is not one of {schema['enum']}")]
+
+    problems: List[Tuple[Path, str]] = []
+    if schema_type == "array":
+        for i, item in enumerate(value):
+            problems.extend(find_problems(item, schema["items"], path + (i,)))
+    elif schema_type == "object":
+        properties = schema["properties"]
+        for name in schema.get("required", []):
+            if name not in value:
+                problems.append((path + (name,), "is missing"))
+        for name, item in value.items():
+            if name in properties:
+                problems.extend(find_problems(item, properties[name], path + (name,)))
+    return problems
+
+
+def _schema_at(schema: Dict[str, Any], path: Path) -> Dict[str, Any]:
+    for key in path:
+        schema = schema["items"] if isinstance(key, int) else schema["properties"][key]
+    return schema
+
+
+def patch_schema(schema: Dict[str, Any], paths: List[Path]) -> Dict[str, Any]:
+    """
+    Schema of an object holding only ``paths``, nested as in the response
+
+    Array positions become object keys, since a patch names single items.
+    Every level is required, so the model cannot leave a field out. Paths
+    must be non-empty: a response that is wrong as a whole has no patch.
+    """
+    patch: Dict[str, Any] = {"type": "object", "properties": {}, "required": []}
+    for path in paths:
+        node = patch
+        for key in path[:-1]:
+            name = str(key)
+            if name not in node["properties"]:
+                node["properties"][name] = {"type": "object", "properties": {}, "required": []}
+                node["required"].append(name)
+            node = node["properties"][name]
+        name = str(path[-1])
+        node["properties"][name] = _schema_at(schema, path)
+        node["required"].append(name)
+    return patch
+
+
+def merge_patch(value: Any, patch: Dict[str, Any]) -> Any:
+    """Write the fields of a patch (as described by ``patch_schema``) into ``value`` in place"""
+    for name, item in patch.items():
+        if isinstance(value, list):
+            if not name.isdigit() or int(name) >= len(value):
+                continue
+            key: PathKey = int(name)
+            current = value[key]
+        elif isinstance(value, dict):
+            key = name
+            current = value.get(key)
+        else:
+            continue
+        if isinstance(item, dict) and isinstance(current, (dict, list)):
+            merge_patch(current, item)
+        else:
+            value[key] = item
+    return value
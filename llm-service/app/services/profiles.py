@@ -0,0 +1,267 @@
+"""
+Student Profile Registry
+Registers student profiles once so requests can refer to them by digest
+
+Matching, document generation, faculty discovery and interviews all take the
+student's profile, and callers sent it in full on every request, where it was
+validated and serialized into the prompt again each time. A profile is now
+registered once and later requests pass its digest:
+
+- POST /api/llm/profiles stores the profile's canonical form: string values
+  trimmed, empty values dropped, keys sorted; the digest is the SHA-256 of
+  that form, so the same profile always gets the same digest
+- the prompt fragment (the indented JSON the prompts embed) is serialized at
+  registration, not per request
+- a caller may name the profile (e.g. a user id); each registration of new
+  content under a name gets the next version number, so callers can tell
+  which revision a digest is
+- profiles are kept in a SQLite file (PROFILE_STORE_PATH) shared by every
+  worker on the host, for PROFILE_TTL seconds after last use; each worker
+  also keeps recently used profiles in memory, since a digest's content
+  never changes
+- callers keep digests across restarts of this service, so the file belongs
+  on persistent storage (a volume in containers); an instance that does not
+  know a digest answers 422 and the caller registers the profile again
+
+OWASP: Sensitive Data Exposure - profiles are only returned to the prompt
+builder; the API returns their metadata, not their content.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple, Union
+
+from app.core.config import settings
+from app.core.metrics import record_cache
+
+logger = logging.getLogger(__name__)
+
+PROFILE_DIGEST = re.compile(r"^[0-9a-f]{64}$")
+
+# Largest canonical profile accepted, in bytes
+MAX_PROFILE_BYTES = 64 * 1024
+
+# Profiles kept in memory per worker
+MEMORY_ENTRIES = 1000
+
+
+class ProfileNotFoundError(ValueError):
+    """A profile digest is unknown or has expired"""
+
+
+class ProfileTooLargeError(ValueError):
+    """A profile exceeds MAX_PROFILE_BYTES"""
+
+
+def canonical_profile(value: Any) -> Any:
+    """Profile with strings trimmed and empty values (None, "", [], {}) dropped"""
+    if isinstance(value, dict):
+        items = ((str(k), canonical_profile(v)) for k, v in value.items())
+        return {k: v for k, v in items if v not in (None, "", [], {})}
+    if isinstance(value, list):
+        items = (canonical_profile(v) for v in value)
+        return [v for v in items if v not in (None, "", [], {})]
+    if isinstance(value, str):
+        return value.strip()
+    return value
+
+
+def prompt_fragment(profile: Dict[str, Any]) -> str:
+    """The canonical profile as the prompts embed it"""
+    return json.dumps(profile, indent=2, sort_keys=True)
+
+
+class RegisteredProfile:
+    """A registered profile: its canonical form and pre-serialized prompt fragment"""
+
+    __slots__ = ("digest", "profile", "prompt_fragment", "profile_id", "version", "expires_at")
+
+    def __init__(
+        self,
+        digest: str,
+        profile: Dict[str, Any],
+        fragment: str,
+        profile_id: Optional[str],
+        version: int,
+        expires_at: float
+    ):
+        self.digest = digest
+        self.profile = profile
+        self.prompt_fragment = fragment
+        self.profile_id = profile_id
+        self.version = version
+        self.expires_at = expires_at
+
+
+StudentProfile = Union[Dict[str, Any], RegisteredProfile]
+
+
+def profile_json(student_profile: StudentProfile) -> str:
+    """Prompt text of a profile passed inline or by digest; both give the same text for the same profile"""
+    if isinstance(student_profile, RegisteredProfile):
+        return student_profile.prompt_fragment
+    return prompt_fragment(canonical_profile(student_profile))
+
+
+class ProfileRegistry:
+    """
+    Registered profiles in a SQLite database file.
+
+    Connections are opened per thread and re-opened after a fork, like the
+    job store.
+    """
+
+    def __init__(self, path: str, ttl: float, timeout: float = 5.0):
+        self.path = path
+        self.ttl = ttl
+        self.timeout = timeout
+        self._local = threading.local()
+        self._memory: "OrderedDict[str, RegisteredProfile]" = OrderedDict()
+
+    def _connection(self) -> sqlite3.Connection:
+        """Get the connection for the current thread, reconnecting after fork"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS profiles ("
+                "digest TEXT PRIMARY KEY, profile_id TEXT, version INTEGER NOT NULL, "
+                "canonical TEXT NOT NULL, fragment TEXT NOT NULL, "
+                "created_at REAL NOT NULL, expires_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS profiles_profile_id ON profiles (profile_id, version)")
+            conn.execute("CREATE INDEX IF NOT EXISTS profiles_expires_at ON profiles (expires_at)")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def register(self, profile: Dict[str, Any], profile_id: Optional[str] = None) -> Tuple[RegisteredProfile, bool]:
+        """
+        Register a profile, or refresh it if the same content is registered
+
+        Returns:
+            The registered profile (a new version if ``profile_id`` had other
+            content), and whether it was new
+
+        Raises:
+            ProfileTooLargeError: If the canonical profile exceeds MAX_PROFILE_BYTES
+        """
+        canonical = canonical_profile(profile)
+        encoded = json.dumps(canonical, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+        if len(encoded.encode("utf-8")) > MAX_PROFILE_BYTES:
+            raise ProfileTooLargeError(f"Profile exceeds {MAX_PROFILE_BYTES} bytes")
+        digest = hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+        canonical = json.loads(encoded)
+        fragment = prompt_fragment(canonical)
+
+        now = time.time()
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM profiles WHERE expires_at <= ?", (now,))
+            row = conn.execute("SELECT profile_id, version FROM profiles WHERE digest = ?", (digest,)).fetchone()
+            if row is not None:
+                stored_id, version = row
+                conn.execute("UPDATE profiles SET expires_at = ? WHERE digest = ?", (now + self.ttl, digest))
+            else:
+                stored_id, version = profile_id, 1
+                if profile_id is not None:
+                    latest = conn.execute(
+                        "SELECT MAX(version) FROM profiles WHERE profile_id = ?", (profile_id,)
+                    ).fetchone()[0]
+                    version = (latest or 0) + 1
+                conn.execute(
+                    "INSERT INTO profiles (digest, profile_id, version, canonical, fragment, created_at, expires_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (digest, profile_id, version, encoded, fragment, now, now + self.ttl),
+                )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+        registered = RegisteredProfile(digest, canonical, fragment, stored_id, version, now + self.ttl)
+        self._remember(registered)
+        if row is None:
+            logger.info(f"Registered profile {digest[:12]} (version {version})")
+        return registered, row is None
+
+    def get(self, digest: str) -> Optional[RegisteredProfile]:
+        """Get a registered profile, or None if it is unknown or has expired"""
+        if not PROFILE_DIGEST.match(digest):
+            return None
+        now = time.time()
+        registered = self._memory.get(digest)
+        record_cache("profiles", registered is not None)
+        if registered is not None:
+            self._memory.move_to_end(digest)
+            # Refresh the shared expiry now and then, not on every use
+            if registered.expires_at - now < self.ttl * 0.9:
+                registered = self._touch(registered, now)
+            return registered
+
+        row = self._connection().execute(
+            "SELECT profile_id, version, canonical, fragment, expires_at FROM profiles "
+            "WHERE digest = ? AND expires_at > ?",
+            (digest, now),
+        ).fetchone()
+        if row is None:
+            return None
+        profile_id, version, canonical, fragment, expires_at = row
+        registered = RegisteredProfile(digest, json.loads(canonical), fragment, profile_id, version, expires_at)
+        registered = self._touch(registered, now)
+        self._remember(registered)
+        return registered
+
+    def _touch(self, registered: RegisteredProfile, now: float) -> Optional[RegisteredProfile]:
+        updated = self._connection().execute(
+            "UPDATE profiles SET expires_at = ? WHERE digest = ? AND expires_at > ?",
+            (now + self.ttl, registered.digest, now),
+        ).rowcount
+        if not updated:
+            # Expired on the shared store; this copy must not outlive it
+            self._memory.pop(registered.digest, None)
+            return None
+        registered.expires_at = now + self.ttl
+        return registered
+
+    def _remember(self, registered: RegisteredProfile):
+        self._memory[registered.digest] = registered
+        self._memory.move_to_end(registered.digest)
+        while len(self._memory) > MEMORY_ENTRIES:
+            self._memory.popitem(last=False)
+
+    def resolve(
+        self,
+        student_profile: Optional[Dict[str, Any]],
+        profile_digest: Optional[str]
+    ) -> Optional[StudentProfile]:
+        """
+        The profile of a request: the registered one if a digest is given, else the inline one
+
+        Raises:
+            ProfileNotFoundError: If the digest is unknown or has expired
+        """
+        if not profile_digest:
+            return student_profile
+        try:
+            registered = self.get(profile_digest)
+        except sqlite3.Error as e:
+            logger.error(f"Profile registry read failed: {e}")
+            registered = None
+        if registered is None:
+            raise ProfileNotFoundError(f"Profile {profile_digest} not found or expired; please register it again")
+        return registered
+
+
+profile_registry = ProfileRegistry(settings.PROFILE_STORE_PATH, ttl=settings.PROFILE_TTL)
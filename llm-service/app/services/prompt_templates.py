@@ -0,0 +1,82 @@
+"""
+Prompt Templates
+Compiles instruction system prompts once into reusable templates
+"""
+
+import string
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class PromptTemplate:
+    """
+    Compiled system prompt of an instruction file
+
+    Instructions that declare ``placeholders`` are compiled as ``str.format``
+    templates: the prompt is split into literal segments and fields once, and
+    the fields are checked against the declaration at load time, so rendering
+    is a single join. Instructions without the key are literal text (their
+    braces are JSON examples, not fields) and render to the prompt unchanged.
+    """
+
+    def __init__(self, name: str, instruction: Dict[str, Any], mtime: float = 0.0):
+        self.name = name
+        self.instruction = instruction
+        self.mtime = mtime
+        self.placeholders: Tuple[str, ...] = tuple(instruction.get("placeholders") or ())
+        self._segments: List[Tuple[str, Optional[str]]] = self._compile(instruction["system_prompt"])
+        # Prompts without placeholders render to the same string every time
+        self._static: Optional[str] = self._segments[0][0] if not self.placeholders else None
+
+    def _compile(self, text: str) -> List[Tuple[str, Optional[str]]]:
+        """Split the prompt into (literal, field) segments and validate the fields"""
+        if not self.placeholders:
+            return [(text, None)]
+
+        try:
+            parsed = list(string.Formatter().parse(text))
+        except ValueError as e:
+            raise ValueError(f"Invalid template in '{self.name}': {e}")
+
+        segments = []
+        used = set()
+        for literal, field, format_spec, conversion in parsed:
+            if field is not None:
+                if not field.isidentifier() or format_spec or conversion:
+                    raise ValueError(
+                        f"Invalid placeholder '{{{field}}}' in '{self.name}': "
+                        "only plain {name} placeholders are supported"
+                    )
+                if field not in self.placeholders:
+                    raise ValueError(f"Undeclared placeholder '{{{field}}}' in '{self.name}'")
+                used.add(field)
+            segments.append((literal, field))
+
+        unused = set(self.placeholders) - used
+        if unused:
+            raise ValueError(f"Declared placeholders not used in '{self.name}': {sorted(unused)}")
+
+        return segments
+
+    def render(self, **values: Any) -> str:
+        """
+        Render the prompt
+
+        Args:
+            **values: A value for every declared placeholder
+
+        Returns:
+            The system prompt with placeholders filled in
+        """
+        if self._static is not None:
+            return self._static
+
+        missing = [name for name in self.placeholders if name not in values]
+        if missing:
+            raise ValueError(f"Missing values for placeholders in '{self.name}': {missing}")
+
+        parts = []
+        for literal, field in self._segments:
+            parts.append(literal)
+            if field is not None:
+                parts.append(str(values[field]))
+        return "".join(parts)
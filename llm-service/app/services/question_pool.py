@@ -0,0 +1,337 @@
+"""
+Interview Question Pools
+Serves practice questions from pre-generated pools instead of one Gemini call per question
+
+Students practising for a scholarship ask for question after question, and
+each used to wait seconds for a fresh call. Questions are now generated in
+batches ahead of need:
+
+- a pool holds the questions for one scholarship (a fingerprint of its
+  information) at one difficulty, in a SQLite file (QUESTION_POOL_PATH)
+  shared by every worker on the host
+- each question is served once; served questions are kept until
+  QUESTION_POOL_TTL expires so that refills do not ask them again
+- questions are deduplicated within a pool by their words, so rephrasings
+  of a question already in it are dropped as well as exact repeats
+- when fewer than QUESTION_POOL_MIN_AVAILABLE are left, the pool is filled
+  back up to QUESTION_POOL_SIZE with one call in the background; the call
+  lists recent questions to avoid, is leased so one worker refills a pool
+  at a time, and is skipped while the Gemini quota is cooling down or
+  short, or the service is near its concurrency limit
+- an empty pool (a scholarship nobody has practised yet) is answered with a
+  single fresh question, as before, while the refill runs
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+from app.core.deadline import reset_deadline, set_deadline
+from app.core.load_shedding import load_shedder
+from app.core.metrics import QUESTION_POOL_QUESTIONS, QUESTION_POOL_REFILLS, record_cache
+from app.core.rate_limit import quota_guard
+from app.core.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+# Scholarship fields that change without changing what it asks of applicants
+VOLATILE_KEYS = ("createdAt", "updatedAt", "created_at", "updated_at")
+
+# Share of shared words above which two questions count as the same
+SIMILARITY_THRESHOLD = 0.8
+
+# Most recent questions a refill is told not to repeat
+AVOID_LIMIT = 30
+
+# Share of the minute's Gemini budget kept for user requests
+REFILL_BUDGET_RESERVE = 0.5
+
+
+def scholarship_fingerprint(scholarship_info: Dict[str, Any]) -> str:
+    """Stable hash of the scholarship a question pool belongs to"""
+    stable = {k: v for k, v in scholarship_info.items() if k not in VOLATILE_KEYS}
+    encoded = json.dumps(stable, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def _words(text: str) -> FrozenSet[str]:
+    return frozenset(re.findall(r"\w+", text.casefold()))
+
+
+def _similar(a: FrozenSet[str], b: FrozenSet[str]) -> bool:
+    if not a or not b:
+        return a == b
+    return len(a & b) / len(a | b) >= SIMILARITY_THRESHOLD
+
+
+class QuestionPoolStore:
+    """
+    Question pools kept in a SQLite database file.
+
+    Connections are opened per thread and re-opened after a fork, like the
+    job store; taking and adding questions are single transactions, so
+    workers never serve the same question twice.
+    """
+
+    def __init__(self, path: str, ttl: float, timeout: float = 5.0):
+        self.path = path
+        self.ttl = ttl
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        """Get the connection for the current thread, reconnecting after fork"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS questions ("
+                "fingerprint TEXT NOT NULL, difficulty TEXT NOT NULL, text TEXT NOT NULL, "
+                "question TEXT NOT NULL, created_at REAL NOT NULL, served_at REAL, expires_at REAL NOT NULL, "
+                "PRIMARY KEY (fingerprint, difficulty, text))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS questions_expires_at ON questions (expires_at)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS refills ("
+                "fingerprint TEXT NOT NULL, difficulty TEXT NOT NULL, leased_until REAL NOT NULL, "
+                "PRIMARY KEY (fingerprint, difficulty))"
+            )
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def take(self, fingerprint: str, difficulty: str) -> Tuple[Optional[Dict[str, Any]], int]:
+        """
+        Serve the oldest unserved question of a pool
+
+        Returns:
+            (question or None if the pool is empty, questions left)
+        """
+        now = time.time()
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM questions WHERE expires_at <= ?", (now,))
+            rows = conn.execute(
+                "SELECT rowid, question FROM questions WHERE fingerprint = ? AND difficulty = ? "
+                "AND served_at IS NULL ORDER BY created_at LIMIT 2",
+                (fingerprint, difficulty),
+            ).fetchall()
+            question = None
+            if rows:
+                conn.execute("UPDATE questions SET served_at = ? WHERE rowid = ?", (now, rows[0][0]))
+                question = json.loads(rows[0][1])
+                left = self.available(fingerprint, difficulty) if len(rows) > 1 else 0
+            else:
+                left = 0
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return question, left
+
+    def available(self, fingerprint: str, difficulty: str) -> int:
+        """Unserved questions in a pool"""
+        return self._connection().execute(
+            "SELECT COUNT(*) FROM questions WHERE fingerprint = ? AND difficulty = ? "
+            "AND served_at IS NULL AND expires_at > ?",
+            (fingerprint, difficulty, time.time()),
+        ).fetchone()[0]
+
+    def recent(self, fingerprint: str, difficulty: str, limit: int) -> List[str]:
+        """Texts of the newest questions of a pool, served or not"""
+        rows = self._connection().execute(
+            "SELECT text FROM questions WHERE fingerprint = ? AND difficulty = ? AND expires_at > ? "
+            "ORDER BY created_at DESC LIMIT ?",
+            (fingerprint, difficulty, time.time(), limit),
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def add(self, fingerprint: str, difficulty: str, questions: List[Dict[str, Any]], served: bool = False) -> int:
+        """
+        Add questions to a pool, dropping those too close to one already in it
+
+        Returns:
+            Number of questions added
+        """
+        now = time.time()
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            known = [_words(row[0]) for row in conn.execute(
+                "SELECT text FROM questions WHERE fingerprint = ? AND difficulty = ? AND expires_at > ?",
+                (fingerprint, difficulty, now),
+            )]
+            added = 0
+            for question in questions:
+                text = " ".join(question["question"].split())
+                words = _words(text)
+                if not words or any(_similar(words, other) for other in known):
+                    continue
+                known.append(words)
+                conn.execute(
+                    "INSERT OR IGNORE INTO questions (fingerprint, difficulty, text, question, created_at, "
+                    "served_at, expires_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        fingerprint,
+                        difficulty,
+                        text,
+                        json.dumps(question, ensure_ascii=False),
+                        now,
+                        now if served else None,
+                        now + self.ttl,
+                    ),
+                )
+                added += 1
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return added
+
+    def lease_refill(self, fingerprint: str, difficulty: str, seconds: float) -> bool:
+        """Claim a pool's refill; False if another worker holds it"""
+        now = time.time()
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT leased_until FROM refills WHERE fingerprint = ? AND difficulty = ?",
+                (fingerprint, difficulty),
+            ).fetchone()
+            if row is not None and row[0] > now:
+                conn.execute("ROLLBACK")
+                return False
+            conn.execute("DELETE FROM refills WHERE leased_until <= ?", (now,))
+            conn.execute(
+                "INSERT INTO refills (fingerprint, difficulty, leased_until) VALUES (?, ?, ?)",
+                (fingerprint, difficulty, now + seconds),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return True
+
+    def release_refill(self, fingerprint: str, difficulty: str):
+        self._connection().execute(
+            "DELETE FROM refills WHERE fingerprint = ? AND difficulty = ?", (fingerprint, difficulty)
+        )
+
+
+class QuestionPool:
+    """Serves practice questions from the pools, refilling them in the background"""
+
+    def __init__(
+        self,
+        gemini_service: Any,
+        store: Optional[QuestionPoolStore],
+        size: int = 10,
+        min_available: int = 3,
+        refill_concurrency: int = 2,
+        refill_timeout: float = 120.0,
+    ):
+        self.gemini_service = gemini_service
+        self.store = store
+        self.size = size
+        self.min_available = min_available
+        self.refill_timeout = refill_timeout
+        self._semaphore = asyncio.Semaphore(max(refill_concurrency, 1))
+        self._refills: Dict[Tuple[str, str], asyncio.Task] = {}
+
+    async def next_question(self, scholarship_info: Dict[str, Any], difficulty: str = "medium") -> Dict[str, Any]:
+        """Same as GeminiService.interview_prep in generate_question mode, served from the pool where possible"""
+        if self.store is None:
+            return await self._fresh_question(scholarship_info, difficulty)
+
+        fingerprint = scholarship_fingerprint(scholarship_info)
+        try:
+            question, left = self.store.take(fingerprint, difficulty)
+        except sqlite3.Error as e:
+            logger.warning(f"Question pool read failed: {e}")
+            question, left = None, 0
+        record_cache("question_pool", question is not None)
+
+        if left < self.min_available:
+            self._schedule_refill(fingerprint, difficulty, scholarship_info)
+
+        if question is None:
+            question = await self._fresh_question(scholarship_info, difficulty)
+            # Recorded as served, so refills do not repeat it
+            if isinstance(question.get("question"), str):
+                try:
+                    self.store.add(fingerprint, difficulty, [question], served=True)
+                except sqlite3.Error as e:
+                    logger.warning(f"Question pool write failed: {e}")
+        return question
+
+    async def _fresh_question(self, scholarship_info: Dict[str, Any], difficulty: str) -> Dict[str, Any]:
+        return await self.gemini_service.interview_prep(
+            mode="generate_question",
+            scholarship_info=scholarship_info,
+            difficulty=difficulty
+        )
+
+    def _schedule_refill(self, fingerprint: str, difficulty: str, scholarship_info: Dict[str, Any]):
+        key = (fingerprint, difficulty)
+        if key not in self._refills:
+            self._refills[key] = asyncio.create_task(self._refill(fingerprint, difficulty, scholarship_info))
+
+    async def _has_headroom(self) -> bool:
+        """Whether Gemini can take optional work without slowing user requests"""
+        return load_shedder.has_spare_capacity() and await quota_guard.has_headroom_async(REFILL_BUDGET_RESERVE)
+
+    async def _refill(self, fingerprint: str, difficulty: str, scholarship_info: Dict[str, Any]):
+        try:
+            async with self._semaphore:
+                if not await self._has_headroom():
+                    QUESTION_POOL_REFILLS.labels("busy").inc()
+                    return
+                if not self.store.lease_refill(fingerprint, difficulty, self.refill_timeout):
+                    QUESTION_POOL_REFILLS.labels("leased").inc()
+                    return
+
+                # The refill gets its own time budget, not the request's that started it
+                deadline_token = set_deadline(self.refill_timeout)
+                try:
+                    missing = self.size - self.store.available(fingerprint, difficulty)
+                    if missing <= 0:
+                        QUESTION_POOL_REFILLS.labels("full").inc()
+                        return
+                    avoid = self.store.recent(fingerprint, difficulty, AVOID_LIMIT)
+                    with tracer.span("question_pool.refill", difficulty=difficulty, count=missing):
+                        questions = await self.gemini_service.generate_interview_questions(
+                            scholarship_info, difficulty, missing, avoid
+                        )
+                    added = self.store.add(fingerprint, difficulty, questions)
+                    QUESTION_POOL_REFILLS.labels("refilled").inc()
+                    QUESTION_POOL_QUESTIONS.labels("added").inc(added)
+                    QUESTION_POOL_QUESTIONS.labels("duplicate").inc(len(questions) - added)
+                    logger.info(f"Question pool ({difficulty}) refilled with {added} of {len(questions)} questions")
+                except Exception as e:
+                    QUESTION_POOL_REFILLS.labels("failed").inc()
+                    logger.warning(f"Question pool refill ({difficulty}) failed: {e}")
+                finally:
+                    reset_deadline(deadline_token)
+                    self.store.release_refill(fingerprint, difficulty)
+        except sqlite3.Error as e:
+            QUESTION_POOL_REFILLS.labels("failed").inc()
+            logger.warning(f"Question pool refill lease failed: {e}")
+        finally:
+            self._refills.pop((fingerprint, difficulty), None)
+
+    async def shutdown(self):
+        """Cancel pending refills"""
+        tasks = list(self._refills.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
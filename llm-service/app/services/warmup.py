@@ -0,0 +1,111 @@
+"""
+Startup Warmup
+Runs the expensive one-off work at boot so the first request to each route does not pay for it
+"""
+
+import importlib
+import logging
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from app.core.config import settings
+from app.services.yaml_loader import instruction_loader
+
+logger = logging.getLogger(__name__)
+
+# Modules that are imported lazily inside request handlers
+HEAVY_MODULES = [
+    "json_repair",
+    "google.generativeai.types",
+]
+
+
+class StartupReport:
+    """Timings for each phase of process startup"""
+
+    def __init__(self, boot_started: Optional[float] = None):
+        self.boot_started = boot_started or time.perf_counter()
+        self.phases: List[Dict[str, Any]] = []
+        self.ready = False
+
+    def record(self, name: str, started: float, detail: Any = None, error: Optional[str] = None):
+        """Record a finished phase"""
+        phase = {
+            "phase": name,
+            "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+        }
+        if detail is not None:
+            phase["detail"] = detail
+        if error:
+            phase["error"] = error
+        self.phases.append(phase)
+
+    @property
+    def total_ms(self) -> float:
+        """Milliseconds since the process started booting"""
+        return round((time.perf_counter() - self.boot_started) * 1000, 2)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Report as a JSON-serializable dictionary"""
+        return {
+            "ready": self.ready,
+            "total_ms": self.total_ms,
+            "phases": self.phases,
+        }
+
+    def log(self):
+        """Log a one-line summary of where boot time went"""
+        summary = ", ".join(f"{p['phase']}={p['duration_ms']}ms" for p in self.phases)
+        logger.info(f"Startup completed in {self.total_ms}ms ({summary})")
+
+
+async def _run_phase(report: StartupReport, name: str, func: Callable, required: bool = False):
+    """Run one warmup phase, recording its timing and any failure"""
+    started = time.perf_counter()
+    try:
+        result = func()
+        if hasattr(result, "__await__"):
+            result = await result
+        report.record(name, started, detail=result)
+    except Exception as e:
+        report.record(name, started, error=str(e))
+        if required:
+            raise
+        logger.warning(f"Warmup phase '{name}' failed: {e}")
+
+
+def _import_heavy_modules() -> List[str]:
+    """Import modules that request handlers otherwise import on first use"""
+    for module in HEAVY_MODULES:
+        importlib.import_module(module)
+    return HEAVY_MODULES
+
+
+async def run_warmup(gemini_service, report: StartupReport) -> StartupReport:
+    """
+    Run the warmup phases in order
+
+    - import_modules: import heavy modules used lazily by request handlers
+    - load_instructions: parse and validate every instruction file (fails startup if invalid)
+    - warm_connections: pre-create per-model clients and open the Gemini connection
+
+    Args:
+        gemini_service: Initialized GeminiService
+        report: Report to record phase timings into
+
+    Returns:
+        The report, marked ready
+    """
+    await _run_phase(report, "import_modules", _import_heavy_modules)
+    await _run_phase(report, "load_instructions", instruction_loader.preload, required=True)
+
+    if settings.WARMUP_CONNECTIONS:
+        await _run_phase(
+            report,
+            "warm_connections",
+            lambda: gemini_service.warm_up(timeout=settings.WARMUP_TIMEOUT),
+        )
+
+    report.ready = True
+    report.log()
+    return report
@@ -4,20 +4,89 @@ Loads and caches YAML instruction files for Gemini AI
 """
 
 import os
+import asyncio
 import logging
-from typing import Dict, Any
+from typing import Callable, Dict, Any, List, Optional, Set
 import yaml
 from pathlib import Path
 
+from app.core.metrics import record_cache
+from app.services.prompt_templates import PromptTemplate
+
 logger = logging.getLogger(__name__)
 
+RESPONSE_FORMATS = ("text", "json")
+
+# The subset of OpenAPI that Gemini accepts as a response schema
+SCHEMA_TYPES = {"string", "number", "integer", "boolean", "array", "object"}
+SCHEMA_KEYS = {
+    "type", "format", "description", "nullable", "enum",
+    "items", "min_items", "max_items", "properties", "required",
+}
+
+
+def validate_response_schema(instruction_name: str, schema: Any, path: str = "response_schema"):
+    """
+    Validate a response schema before it is sent to Gemini
+
+    Raises:
+        ValueError: If the schema uses keys or types Gemini does not accept
+    """
+    where = f"Instruction '{instruction_name}' {path}"
+    if not isinstance(schema, dict):
+        raise ValueError(f"{where} must be a mapping")
+    
+    unknown = set(schema) - SCHEMA_KEYS
+    if unknown:
+        raise ValueError(f"{where} has unsupported keys: {sorted(unknown)}")
+    
+    schema_type = schema.get("type")
+    if schema_type not in SCHEMA_TYPES:
+        raise ValueError(f"{where} type must be one of {sorted(SCHEMA_TYPES)}")
+    
+    if "enum" in schema and (
+        schema_type != "string" or not isinstance(schema["enum"], list)
+        or not all(isinstance(v, str) for v in schema["enum"])
+    ):
+        raise ValueError(f"{where} enum must be a list of strings on a string")
+    
+    if schema_type == "array":
+        if "items" not in schema:
+            raise ValueError(f"{where} is an array without items")
+        validate_response_schema(instruction_name, schema["items"], f"{path}.items")
+    
+    if schema_type == "object":
+        # Gemini rejects objects without properties
+        properties = schema.get("properties")
+        if not isinstance(properties, dict) or not properties:
+            raise ValueError(f"{where} is an object without properties")
+        for name, value in properties.items():
+            validate_response_schema(instruction_name, value, f"{path}.{name}")
+        required = schema.get("required", [])
+        if not isinstance(required, list) or not set(required) <= set(properties):
+            raise ValueError(f"{where} required must list some of its properties")
+
 
 class YAMLInstructionLoader:
-    """Loader for YAML instruction files"""
+    """
+    Loader for YAML instruction files
+    
+    Each instruction is cached as a compiled PromptTemplate together with the
+    file's mtime. A background watcher polls the mtimes and swaps in a freshly
+    compiled template when a file changes, so prompts can be edited without a
+    restart. A file that fails validation keeps its previous version.
+    """
     
     def __init__(self):
         self.instructions_dir = Path(__file__).parent.parent.parent / "instructions"
-        self._cache: Dict[str, Dict[str, Any]] = {}
+        self._cache: Dict[str, PromptTemplate] = {}
+        self._watch_task: Optional[asyncio.Task] = None
+        # mtime of edits that failed validation, so they are reported once
+        self._rejected_mtimes: Dict[str, float] = {}
+        # Cached instructions whose file is gone, so it is reported once
+        self._missing: Set[str] = set()
+        # Called with an instruction's name after it is reloaded
+        self._reload_listeners: List[Callable[[str], None]] = []
     
     def load_instruction(self, instruction_name: str) -> Dict[str, Any]:
         """
@@ -29,26 +98,48 @@ class YAMLInstructionLoader:
         Returns:
             Parsed YAML data as dictionary
         """
+        return self.load_template(instruction_name).instruction
+    
+    def load_template(self, instruction_name: str) -> PromptTemplate:
+        """
+        Load the compiled prompt template of an instruction
+        
+        Args:
+            instruction_name: Name of instruction file (without .yaml extension)
+            
+        Returns:
+            Compiled template; its ``instruction`` holds the parsed YAML data
+        """
         # Check cache first
-        if instruction_name in self._cache:
-            logger.debug(f"Loading instruction '{instruction_name}' from cache")
-            return self._cache[instruction_name]
+        template = self._cache.get(instruction_name)
+        record_cache("instructions", template is not None)
+        if template is not None:
+            return template
+        
+        template = self._read_template(instruction_name)
         
-        # Load from file
+        # Cache the compiled template
+        self._cache[instruction_name] = template
+        
+        logger.info(f"Loaded instruction '{instruction_name}' from {self.instructions_dir}")
+        return template
+    
+    def _read_template(self, instruction_name: str) -> PromptTemplate:
+        """Read, validate and compile an instruction file"""
         file_path = self.instructions_dir / f"{instruction_name}.yaml"
         
         if not file_path.exists():
             raise FileNotFoundError(f"Instruction file not found: {file_path}")
         
         try:
+            mtime = file_path.stat().st_mtime
             with open(file_path, 'r', encoding='utf-8') as f:
                 data = yaml.safe_load(f)
             
-            # Cache the loaded data
-            self._cache[instruction_name] = data
+            # Fail at load time rather than in the middle of a request
+            self.validate_instruction(instruction_name, data)
             
-            logger.info(f"Loaded instruction '{instruction_name}' from {file_path}")
-            return data
+            return PromptTemplate(instruction_name, data, mtime=mtime)
             
         except yaml.YAMLError as e:
             logger.error(f"Error parsing YAML file {file_path}: {e}", exc_info=True)
@@ -57,28 +148,170 @@ class YAMLInstructionLoader:
             logger.error(f"Error loading instruction file {file_path}: {e}", exc_info=True)
             raise
     
-    def reload_instruction(self, instruction_name: str) -> Dict[str, Any]:
+    @staticmethod
+    def validate_instruction(instruction_name: str, data: Any):
+        """
+        Validate the structure of a parsed instruction file
+        
+        Raises:
+            ValueError: If required fields are missing or have the wrong type
+        """
+        if not isinstance(data, dict):
+            raise ValueError(f"Instruction '{instruction_name}' must be a YAML mapping")
+        
+        system_prompt = data.get("system_prompt")
+        if not isinstance(system_prompt, str) or not system_prompt.strip():
+            raise ValueError(f"Instruction '{instruction_name}' is missing a system_prompt")
+        
+        for key in ("temperature", "top_p"):
+            if key in data and not isinstance(data[key], (int, float)):
+                raise ValueError(f"Instruction '{instruction_name}' has a non-numeric {key}")
+        
+        for key in ("max_tokens", "top_k"):
+            if key in data and not isinstance(data[key], int):
+                raise ValueError(f"Instruction '{instruction_name}' has a non-integer {key}")
+        
+        placeholders = data.get("placeholders")
+        if placeholders is not None and (
+            not isinstance(placeholders, list) or not all(isinstance(p, str) for p in placeholders)
+        ):
+            raise ValueError(f"Instruction '{instruction_name}' placeholders must be a list of names")
+        
+        response_format = data.get("response_format", "json" if "response_schema" in data else "text")
+        if response_format not in RESPONSE_FORMATS:
+            raise ValueError(f"Instruction '{instruction_name}' response_format must be one of {RESPONSE_FORMATS}")
+        if "response_schema" in data:
+            if response_format != "json":
+                raise ValueError(f"Instruction '{instruction_name}' has a response_schema but no JSON response_format")
+            validate_response_schema(instruction_name, data["response_schema"])
+    
+    def reload_instruction(self, instruction_name: str, notify: bool = True) -> Dict[str, Any]:
         """
         Reload instruction file (bypass cache)
         
+        The new template is compiled before it replaces the cached one, so
+        concurrent requests see either the old or the new version. Reload
+        listeners are called once it is in place.
+        
         Args:
             instruction_name: Name of instruction file
+            notify: Call the reload listeners; off when reloading on a worker
+                thread, whose caller notifies them on the event loop
             
         Returns:
             Parsed YAML data
         """
-        # Clear from cache
-        if instruction_name in self._cache:
-            del self._cache[instruction_name]
+        template = self._read_template(instruction_name)
+        self._cache[instruction_name] = template
+        if notify:
+            self._notify_reload(instruction_name)
+        return template.instruction
+    
+    def _notify_reload(self, instruction_name: str):
+        for listener in list(self._reload_listeners):
+            try:
+                listener(instruction_name)
+            except Exception as e:
+                logger.error(f"Reload listener failed for instruction '{instruction_name}': {e}", exc_info=True)
+    
+    def add_reload_listener(self, listener: Callable[[str], None]):
+        """
+        Call ``listener`` with an instruction's name whenever it is reloaded, e.g. to drop cached output
+
+        Reloads found by the background watcher are reported on the event loop.
+        """
+        self._reload_listeners.append(listener)
+    
+    def remove_reload_listener(self, listener: Callable[[str], None]):
+        """Stop calling a listener added with ``add_reload_listener``"""
+        if listener in self._reload_listeners:
+            self._reload_listeners.remove(listener)
+    
+    def check_for_updates(self, notify: bool = True) -> list[str]:
+        """
+        Reload cached instructions whose files changed on disk
         
-        # Load fresh
-        return self.load_instruction(instruction_name)
+        Args:
+            notify: Call the reload listeners for each reloaded instruction
+            
+        Returns:
+            Names of the instructions that were reloaded
+        """
+        reloaded = []
+        for name, template in list(self._cache.items()):
+            file_path = self.instructions_dir / f"{name}.yaml"
+            try:
+                mtime = file_path.stat().st_mtime
+            except FileNotFoundError:
+                # Deleted or being renamed: keep serving the cached version
+                if name not in self._missing:
+                    self._missing.add(name)
+                    logger.warning(f"Instruction file {file_path} is missing; keeping the cached version")
+                continue
+            self._missing.discard(name)
+            try:
+                if mtime in (template.mtime, self._rejected_mtimes.get(name)):
+                    continue
+                self.reload_instruction(name, notify=notify)
+                reloaded.append(name)
+                logger.info(f"Reloaded instruction '{name}' after file change")
+            except Exception as e:
+                self._rejected_mtimes[name] = mtime
+                logger.error(f"Keeping previous version of instruction '{name}': {e}")
+        return reloaded
+    
+    async def watch(self, interval: float):
+        """Poll instruction files for changes every ``interval`` seconds"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                # Files are read off the loop; listeners run on it, where the caches they clear are used
+                reloaded = await asyncio.to_thread(self.check_for_updates, False)
+                for name in reloaded:
+                    self._notify_reload(name)
+            except Exception:
+                # One bad pass must not stop hot reload for the worker's lifetime
+                logger.exception("Instruction update check failed")
+    
+    def start_watching(self, interval: float):
+        """Start the background watcher on the running event loop"""
+        if interval > 0 and self._watch_task is None:
+            self._watch_task = asyncio.create_task(self.watch(interval))
+            logger.info(f"Watching instruction files for changes every {interval}s")
+    
+    async def stop_watching(self):
+        """Stop the background watcher"""
+        if self._watch_task is not None:
+            self._watch_task.cancel()
+            try:
+                await self._watch_task
+            except asyncio.CancelledError:
+                pass
+            self._watch_task = None
     
     def clear_cache(self):
-        """Clear all cached instructions"""
+        """Clear all cached instructions; they are read again from disk, so listeners are told they were reloaded"""
+        names = list(self._cache)
         self._cache.clear()
+        for name in names:
+            self._notify_reload(name)
         logger.info("Instruction cache cleared")
     
+    def preload(self) -> list[str]:
+        """
+        Load every available instruction file into the cache
+        
+        Called in the gunicorn master before workers are forked so the parsed
+        instructions are shared copy-on-write instead of loaded once per worker.
+        
+        Returns:
+            Names of the loaded instructions
+        """
+        names = self.list_available_instructions()
+        for name in names:
+            self.load_instruction(name)
+        return names
+    
     def list_available_instructions(self) -> list[str]:
         """
         List all available instruction files
@@ -94,3 +327,7 @@ class YAMLInstructionLoader:
             instructions.append(file_path.stem)
         
         return sorted(instructions)
+
+
+# Shared loader so instructions preloaded before fork are reused by every worker
+instruction_loader = YAMLInstructionLoader()
@@ -0,0 +1,295 @@
+"""
+Fake Gemini backend
+An LLM backend whose clients stand in for ``genai.GenerativeModel``, so the
+service can be load tested without spending quota
+
+The fake answers ``generate_content_async`` (unary and ``stream=True``) and
+``count_tokens_async`` with JSON text shaped like each route expects (a value
+conforming to the response schema, when the call sends one), after sampled
+latencies:
+
+- unary calls sleep for a latency drawn from the configured distribution
+- streams wait a time-to-first-chunk, then emit chunks of ``chunk_chars``
+  characters every ``chunk_interval`` seconds (with jitter)
+- a fraction of calls fail with a 429 (ResourceExhausted) or, after
+  ``timeout`` seconds, a 504 (DeadlineExceeded), the errors the SDK raises
+- a fraction of unary calls stop halfway with finish reason MAX_TOKENS;
+  a continuation request (the prompt, the partial output as the model's
+  turn, then a user turn) gets the rest, after a proportionally shorter
+  latency
+- with ``capacity`` set, the upstream saturates: beyond ``capacity``
+  concurrent calls they share the capacity (processor sharing), so every
+  call slows down as more arrive, as when Gemini slows down under load
+
+The sleeps are asyncio sleeps, like the SDK's async client waiting on the
+network, so the load test sees the same event-loop behaviour the service has
+against live Gemini.
+"""
+
+import asyncio
+import json
+import math
+import random
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from google.api_core import exceptions as google_exceptions
+
+from app.services.llm_backends import LLMBackend
+
+LATENCY_DISTRIBUTIONS = ("lognormal", "uniform", "fixed")
+
+
+class FakeProfile:
+    """Latency, output size and failure settings for the fake backend"""
+
+    def __init__(
+        self,
+        latency_median: float = 0.8,
+        latency_sigma: float = 0.5,
+        latency_distribution: str = "lognormal",
+        first_chunk: float = 0.4,
+        chunk_interval: float = 0.04,
+        chunk_chars: int = 60,
+        output_chars: int = 3000,
+        rate_limit_rate: float = 0.0,
+        timeout_rate: float = 0.0,
+        timeout: float = 2.0,
+        truncate_rate: float = 0.0,
+        capacity: int = 0,
+        seed: int = 0,
+    ):
+        if latency_distribution not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"latency_distribution must be one of {LATENCY_DISTRIBUTIONS}")
+        self.latency_median = latency_median
+        self.latency_sigma = latency_sigma
+        self.latency_distribution = latency_distribution
+        self.first_chunk = first_chunk
+        self.chunk_interval = chunk_interval
+        self.chunk_chars = chunk_chars
+        self.output_chars = output_chars
+        self.rate_limit_rate = rate_limit_rate
+        self.timeout_rate = timeout_rate
+        self.timeout = timeout
+        self.truncate_rate = truncate_rate
+        self.capacity = capacity
+        self.in_flight = 0
+        # Rest of each truncated output, by the partial output, for its continuation
+        self.remainders: Dict[str, str] = {}
+        self.random = random.Random(seed)
+
+    def sample(self, median: float) -> float:
+        """Draw a latency (seconds) around ``median``"""
+        if median <= 0:
+            return 0.0
+        if self.latency_distribution == "fixed":
+            return median
+        if self.latency_distribution == "uniform":
+            spread = median * self.latency_sigma
+            return max(0.0, self.random.uniform(median - spread, median + spread))
+        return self.random.lognormvariate(math.log(median), self.latency_sigma)
+
+    async def wait(self, work: float, tick: float = 0.02):
+        """Take ``work`` seconds of upstream time, shared with the other calls beyond capacity"""
+        if not self.capacity:
+            await asyncio.sleep(work)
+            return
+        while work > 0:
+            share = min(1.0, self.capacity / max(self.in_flight, 1))
+            step = min(tick, work / share)
+            await asyncio.sleep(step)
+            work -= step * share
+
+    def to_dict(self) -> dict:
+        """Settings as a JSON-serializable dictionary"""
+        return {k: v for k, v in vars(self).items() if k not in ("random", "in_flight", "remainders")}
+
+
+def _prompt_text(prompt: Any) -> str:
+    if isinstance(prompt, list):
+        return "".join(part for part in prompt if isinstance(part, str))
+    return str(prompt)
+
+
+FILLER = "Strong fit based on the academic record and leadership experience. "
+
+
+def _variant(index: int) -> str:
+    # Words no other item shares, so items do not look like duplicates of each other
+    return " " + " ".join(f"v{index}w{j}" for j in range(10))
+
+
+def fake_value(schema: Dict[str, Any], fill_chars: int = 0, suffix: str = "", number: int = 87) -> Any:
+    """
+    A value conforming to a response schema
+
+    The first array on the way down is filled up to about ``fill_chars``
+    characters, with distinct strings in each item and its integers
+    numbering the items from 1; arrays inside it get two items.
+    """
+    schema_type = schema["type"]
+    if "enum" in schema:
+        return schema["enum"][0]
+    if schema_type == "object":
+        return {name: fake_value(prop, fill_chars, suffix, number) for name, prop in schema["properties"].items()}
+    if schema_type == "array":
+        if not fill_chars:
+            return [fake_value(schema["items"], 0, suffix, number)] * 2
+        count = max(1, fill_chars // len(json.dumps(fake_value(schema["items"], 0, _variant(0), 1))))
+        return [fake_value(schema["items"], 0, _variant(i), i + 1) for i in range(count)]
+    return {"string": FILLER + suffix, "integer": number, "number": 25000, "boolean": False}[schema_type]
+
+
+def fake_output(prompt: Any, output_chars: int, schema: Optional[Dict[str, Any]] = None) -> str:
+    """
+    JSON text of roughly ``output_chars`` characters for a prompt
+
+    With a response schema the text conforms to it. Without one, the matcher
+    asks for a JSON array; every other route accepts an object, so one object
+    carries the keys the routes read (scholarships, speech, question).
+    """
+    if schema is not None:
+        return json.dumps(fake_value(schema, output_chars))
+
+    item = {
+        "title": "International Excellence Scholarship",
+        "provider": "Example University",
+        "match_score": 87,
+        "rationale": FILLER * 2,
+        "deadline": "2027-03-01",
+    }
+    items: List[dict] = []
+    size = 0
+    item_size = len(json.dumps(item))
+    while size < output_chars or not items:
+        items.append(dict(item, id=len(items)))
+        size += item_size
+
+    if "JSON array" in _prompt_text(prompt):
+        return json.dumps(items)
+    return json.dumps({
+        "message": FILLER,
+        "question": FILLER,
+        "speaker_id": "sarah",
+        "speaker_name": "Dr. Sarah Mitchell",
+        "speech": FILLER,
+        "transcription": FILLER,
+        "is_final": False,
+        "scholarships": items,
+    })
+
+
+def _continued(prompt: Any) -> Optional[Tuple[Any, str]]:
+    """(original prompt, partial output) if the prompt is a continuation request"""
+    if isinstance(prompt, list) and len(prompt) == 3 and isinstance(prompt[1], dict) and prompt[1].get("role") == "model":
+        return prompt[0]["parts"], prompt[1]["parts"][0]
+    return None
+
+
+def _usage(prompt: Any, text: str) -> SimpleNamespace:
+    # Roughly four characters per token
+    return SimpleNamespace(
+        prompt_token_count=len(_prompt_text(prompt)) // 4,
+        candidates_token_count=len(text) // 4,
+    )
+
+
+class FakeStream:
+    """Async streaming response, like the SDK's AsyncGenerateContentResponse with stream=True"""
+
+    def __init__(self, profile: FakeProfile, prompt: Any, text: str):
+        self.profile = profile
+        self.text = text
+        self.usage_metadata = _usage(prompt, text)
+
+    async def __aiter__(self) -> AsyncIterator[SimpleNamespace]:
+        profile = self.profile
+        profile.in_flight += 1
+        try:
+            await profile.wait(profile.sample(profile.first_chunk))
+            for i in range(0, len(self.text), profile.chunk_chars):
+                if i:
+                    await profile.wait(profile.sample(profile.chunk_interval))
+                yield SimpleNamespace(text=self.text[i:i + profile.chunk_chars])
+        finally:
+            profile.in_flight -= 1
+
+
+class FakeGenerativeModel:
+    """Drop-in for ``genai.GenerativeModel`` backed by a FakeProfile"""
+
+    def __init__(self, model_name: str, profile: FakeProfile):
+        self.model_name = model_name
+        self.profile = profile
+        self.calls = 0
+
+    async def _maybe_fail(self):
+        profile = self.profile
+        roll = profile.random.random()
+        if roll < profile.rate_limit_rate:
+            raise google_exceptions.ResourceExhausted("Resource has been exhausted (fake backend)")
+        if roll < profile.rate_limit_rate + profile.timeout_rate:
+            await asyncio.sleep(profile.timeout)
+            raise google_exceptions.DeadlineExceeded("Deadline Exceeded (fake backend)")
+
+    async def generate_content_async(
+        self,
+        prompt: Any,
+        generation_config: Any = None,
+        stream: bool = False,
+        request_options: Any = None,
+    ):
+        self.calls += 1
+        await self._maybe_fail()
+        continued = _continued(prompt)
+        if continued:
+            text = self.profile.remainders.get(continued[1], "")
+            share = len(text) / max(len(continued[1]) + len(text), 1)
+        else:
+            schema = getattr(generation_config, "response_schema", None)
+            text = fake_output(prompt, self.profile.output_chars, schema)
+            share = 1.0
+        if stream:
+            return FakeStream(self.profile, prompt, text)
+
+        finish_reason = "STOP"
+        if not continued and self.profile.random.random() < self.profile.truncate_rate:
+            self.profile.remainders[text[:len(text) // 2]] = text[len(text) // 2:]
+            text = text[:len(text) // 2]
+            share = 0.5
+            finish_reason = "MAX_TOKENS"
+
+        self.profile.in_flight += 1
+        try:
+            await self.profile.wait(self.profile.sample(self.profile.latency_median) * share)
+        finally:
+            self.profile.in_flight -= 1
+        return SimpleNamespace(
+            candidates=[SimpleNamespace(
+                content=SimpleNamespace(parts=[SimpleNamespace(text=text)]),
+                finish_reason=finish_reason,
+            )],
+            usage_metadata=_usage(prompt, text),
+        )
+
+    async def count_tokens_async(self, contents: Any) -> SimpleNamespace:
+        return SimpleNamespace(total_tokens=len(_prompt_text(contents)) // 4)
+
+
+class FakeBackend(LLMBackend):
+    """LLM backend serving FakeGenerativeModel clients"""
+
+    name = "fake"
+
+    def __init__(self, profile: FakeProfile):
+        self.profile = profile
+
+    def get_model(self, model_name: str):
+        return FakeGenerativeModel(model_name, self.profile)
+
+
+def install(profile: FakeProfile):
+    """Make every GeminiService use the fake backend instead of the configured one"""
+    from app.services import gemini_service
+
+    gemini_service.create_backend = lambda settings: FakeBackend(profile)
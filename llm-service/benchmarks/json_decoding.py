@@ -0,0 +1,195 @@
+"""
+JSON decoding benchmark
+Measures the CPU cost per model response of app.services.json_decoding against always running json_repair
+
+The corpus covers each response shape the service parses, at the sizes that
+matter: a CV (the cv_parser example output), a chat answer, an interview
+turn, 20 scholarship matches, 30 and 60 discovered scholarships, and 4K and
+8K token documents. Each appears as:
+
+- plain: bare JSON, as structured output returns it (strict tier)
+- fenced: inside a ```json fence after a sentence of prose (fenced tier)
+- trailing_comma: a trailing comma before the last bracket (repaired tier)
+- truncated: cut off at 97% of its length, as at max_tokens (repaired tier)
+
+Responses captured with LLM_BACKEND=record can be added with --cassette;
+every recorded response (unary or the joined chunks of a stream) becomes a
+case of its own. The "exact" column tells whether the decoded value equals
+the original; repair of a malformed response can be lossy.
+
+Usage (from llm-service/):
+    python benchmarks/json_decoding.py [--cassette cassettes/run.jsonl] [--only plain,fenced]
+"""
+
+import argparse
+import json
+import os
+import sys
+import timeit
+from typing import Any, Dict, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Settings are loaded on import; the benchmark never calls Gemini or the core-api
+os.environ.setdefault("GEMINI_API_KEY", "benchmark-placeholder")
+os.environ.setdefault("CORE_API_SECRET", "benchmark-placeholder")
+
+import json_repair  # noqa: E402
+import yaml  # noqa: E402
+
+from app.services.json_decoding import decode_with_tier  # noqa: E402
+
+INSTRUCTIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "instructions")
+
+PARAGRAPH = (
+    "During my undergraduate research in computational biology I learned that the "
+    "questions worth asking rarely fit inside one discipline. Working with the "
+    "\"Genomics for All\" outreach programme, I taught 120 secondary-school students "
+    "to read sequencing data, and saw how access to tools shapes who gets to do science. "
+)
+
+
+def _cv() -> Dict[str, Any]:
+    with open(os.path.join(INSTRUCTIONS_DIR, "cv_parser.yaml"), encoding="utf-8") as f:
+        return json.loads(yaml.safe_load(f)["examples"][0]["output"])
+
+
+def _document(tokens: int) -> Dict[str, Any]:
+    # Roughly four characters per token
+    paragraphs = max(1, tokens * 4 // len(PARAGRAPH))
+    content = "\n\n".join(PARAGRAPH for _ in range(paragraphs))
+    return {
+        "document_type": "personal_statement",
+        "title": "From Sequencing Data to Public Health",
+        "content": content,
+        "word_count": len(content.split()),
+        "key_themes": ["interdisciplinary research", "science outreach", "public health"],
+        "strengths": ["Concrete outcomes", "Clear motivation"],
+        "suggestions": ["Name the target lab", "Shorten the opening paragraph"],
+        "tone": "Academic",
+    }
+
+
+def _scholarships(count: int) -> Dict[str, Any]:
+    return {"scholarships": [
+        {
+            "title": f"Global Leaders Fellowship {i}",
+            "provider": "Example Foundation",
+            "description": "Supports outstanding international students pursuing graduate study in Europe. "
+                           "Covers tuition, travel and a monthly stipend for the full programme.",
+            "amount": 25000 + i * 500,
+            "currency": "EUR",
+            "deadline": "2027-03-01",
+            "country": "Germany",
+            "educationLevel": "Master's",
+            "fieldOfStudy": "Any",
+            "eligibilityCriteria": ["Bachelor's degree", "IELTS 6.5 or equivalent", "Two years of work experience"],
+            "applicationUrl": f"https://example.org/scholarships/{i}",
+            "isActive": True,
+        }
+        for i in range(count)
+    ]}
+
+
+def _matches(count: int) -> List[Dict[str, Any]]:
+    return [
+        {
+            "scholarship_id": f"sch-{i:04d}",
+            "match_score": 95 - i,
+            "match_category": "Excellent",
+            "rationale": "The student's research record and leadership roles align with the programme's focus. " * 2,
+            "strengths": ["GPA above requirement", "Published research"],
+            "weaknesses": ["No language certificate yet"],
+            "recommendations": ["Book an IELTS date", "Ask the supervisor for a reference"],
+            "estimated_competition": "High",
+            "application_priority": "High",
+        }
+        for i in range(count)
+    ]
+
+
+def _shapes() -> List[Tuple[str, Any]]:
+    return [
+        ("cv", _cv()),
+        ("chat", {
+            "message": "## Next steps\n\n" + PARAGRAPH,
+            "suggestions": ["Draft your SOP", "Shortlist three programmes"],
+            "resources": ["DAAD scholarship database"],
+            "follow_up_questions": ["How do I contact a supervisor?"],
+            "action": None,
+        }),
+        ("interview_turn", {
+            "speaker_id": "sarah",
+            "speaker_name": "Dr. Sarah Mitchell",
+            "speech": "Thank you. Tell us about a project where you had to learn something quickly.",
+            "transcription": "Thank you. Tell us about a project where you had to learn something quickly.",
+            "feedback": "Good structure; quantify the outcome next time.",
+            "is_final": False,
+        }),
+        ("matches_x20", _matches(20)),
+        ("discovery_x30", _scholarships(30)),
+        ("discovery_x60", _scholarships(60)),
+        ("document_4k_tokens", _document(4000)),
+        ("document_8k_tokens", _document(8000)),
+    ]
+
+
+def _variants(name: str, value: Any) -> List[Tuple[str, str, Any]]:
+    """(case name, response text, expected value or None if it is lossy)"""
+    text = json.dumps(value, indent=2, ensure_ascii=False)
+    closing = text.rstrip()[-1]
+    return [
+        (f"{name}/plain", text, value),
+        (f"{name}/fenced", f"Here is the requested JSON:\n\n```json\n{text}\n```\n", value),
+        (f"{name}/trailing_comma", text.rstrip()[:-1].rstrip() + ",\n" + closing, value),
+        (f"{name}/truncated", text[:int(len(text) * 0.97)], None),
+    ]
+
+
+def _cassette_cases(path: str) -> List[Tuple[str, str, Any]]:
+    cases = []
+    with open(path, encoding="utf-8") as f:
+        for i, line in enumerate(f):
+            entry = json.loads(line)
+            if entry.get("error"):
+                continue
+            text = entry.get("text") if not entry.get("stream") else "".join(c["text"] for c in entry.get("chunks", []))
+            if text:
+                cases.append((f"cassette:{entry.get('model')}#{i}", text, None))
+    return cases
+
+
+def _per_call_us(func) -> float:
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=5, number=number)) / number * 1e6
+
+
+def _repair_only(text: str) -> Any:
+    # The previous _parse_json_response
+    return json_repair.loads(text.strip())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cassette", action="append", default=[], help="Add the responses recorded in a cassette")
+    parser.add_argument("--only", default="", help="Comma-separated variants to run (plain, fenced, ...)")
+    args = parser.parse_args()
+
+    cases = [case for name, value in _shapes() for case in _variants(name, value)]
+    for path in args.cassette:
+        cases.extend(_cassette_cases(path))
+    if args.only:
+        wanted = set(args.only.split(","))
+        cases = [case for case in cases if case[0].split("/")[-1] in wanted]
+
+    print(f"{'case':<36}{'chars':>8}{'tier':>10}{'tiered us':>12}{'repair us':>12}{'speedup':>9}{'exact':>7}")
+    for name, text, expected in cases:
+        value, tier = decode_with_tier(text)
+        exact = "-" if expected is None else ("yes" if value == expected else "NO")
+        tiered = _per_call_us(lambda: decode_with_tier(text))
+        repair = _per_call_us(lambda: _repair_only(text))
+        print(f"{name:<36}{len(text):>8}{tier:>10}{tiered:>12.1f}{repair:>12.1f}{repair / tiered:>8.1f}x{exact:>7}")
+
+
+if __name__ == "__main__":
+    main()
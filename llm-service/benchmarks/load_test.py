@@ -0,0 +1,442 @@
+"""
+Load test
+Drives every route against a simulated or replayed Gemini backend and reports latency, throughput and loop lag
+
+The service runs in a child process under uvicorn (one worker, as in each
+gunicorn worker) with the per-client rate limits disabled and GeminiService
+on either the simulated backend (benchmarks/fake_gemini.py) or, with
+--backend replay, a cassette recorded with LLM_BACKEND=record. The
+parent sends real HTTP requests at the configured concurrency and reports,
+per route:
+
+- p50/p95/p99 request latency and requests per second
+- time to first SSE frame for streaming routes
+- error count (HTTP errors, "success": false bodies, SSE error frames)
+- event-loop lag measured inside the server while the route was under load
+
+Results can be saved with --json and compared against a saved baseline with
+--compare; the run exits non-zero when p95 latency or throughput of any route
+regresses by more than --tolerance.
+
+--profile-out writes a cProfile of the server's event-loop thread and logs
+its peak traced memory; combined with --backend replay --replay-speed 0 it
+isolates the service's own costs (prompt building, JSON repair, SSE encoding).
+
+Usage (from llm-service/):
+    python benchmarks/load_test.py [--routes chat,chat_stream] [--requests 50] [--concurrency 10]
+        [--latency-median-ms 800] [--first-chunk-ms 400] [--chunk-interval-ms 40]
+        [--rate-limit-rate 0.05] [--timeout-rate 0.02] [--json out.json] [--compare baseline.json]
+    python benchmarks/load_test.py --backend replay --cassette prod.jsonl --replay-speed 0 --profile-out server.prof
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import socket
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+API_SECRET = "benchmark-placeholder"
+
+STUDENT_PROFILE = {
+    "name": "Ada Example",
+    "degree": "BSc Computer Science",
+    "gpa": 3.8,
+    "interests": ["machine learning", "public health"],
+    "experience": ["Research assistant, 2 years", "Teaching assistant"],
+}
+SCHOLARSHIP = {
+    "title": "International Excellence Scholarship",
+    "provider": "Example University",
+    "country": "Germany",
+    "requirements": ["Bachelor's degree", "IELTS 6.5", "Research proposal"],
+}
+
+# name -> (path, payload, streaming)
+SCENARIOS: Dict[str, tuple] = {
+    "parse_cv": ("/api/llm/parse-cv", {"cv_text": "Ada Example\nBSc Computer Science, GPA 3.8\n" * 40}, False),
+    "match_scholarships": (
+        "/api/llm/match-scholarships",
+        {"student_profile": STUDENT_PROFILE, "scholarships": [dict(SCHOLARSHIP, id=i) for i in range(20)]},
+        False,
+    ),
+    "discover_scholarships": ("/api/llm/scholarships/discover", {"count": 10}, False),
+    "generate_document": (
+        "/api/llm/generate-document",
+        {"document_type": "statement_of_purpose", "student_profile": STUDENT_PROFILE, "scholarship_info": SCHOLARSHIP},
+        False,
+    ),
+    "generate_document_stream": (
+        "/api/llm/generate-document/stream",
+        {"document_type": "statement_of_purpose", "student_profile": STUDENT_PROFILE, "scholarship_info": SCHOLARSHIP},
+        True,
+    ),
+    "chat": ("/api/llm/chat", {"message": "Which scholarships fit a CS graduate interested in public health?"}, False),
+    "chat_stream": (
+        "/api/llm/chat/stream",
+        {"message": "Which scholarships fit a CS graduate interested in public health?"},
+        True,
+    ),
+    "interview_practice": (
+        "/api/llm/interview/practice",
+        {"mode": "generate_question", "scholarship_info": SCHOLARSHIP},
+        False,
+    ),
+    "interview_evaluate": (
+        "/api/llm/interview/evaluate",
+        {
+            "scholarship_info": SCHOLARSHIP,
+            "answers": [
+                {"question": f"Question {i}: why this programme?", "student_answer": "Because it fits my research. " * 20}
+                for i in range(2)
+            ],
+        },
+        False,
+    ),
+    "interview_interactive": (
+        "/api/llm/interview/interactive",
+        {"mode": "START", "persona": "Friendly Mentor", "interview_type": "Grad School"},
+        False,
+    ),
+    "interview_interactive_stream": (
+        "/api/llm/interview/interactive/stream",
+        {"mode": "START", "persona": "Friendly Mentor", "interview_type": "Grad School"},
+        True,
+    ),
+    "faculty_discover": ("/api/llm/faculty/discover", {"mode": "LIST_UNIVERSITIES", "continent": "Europe"}, False),
+    "batch": (
+        "/api/llm/batch",
+        {
+            "operations": [
+                {"id": "cv", "type": "parse_cv", "params": {"cv_text": "Ada Example\nBSc Computer Science, GPA 3.8\n" * 40}},
+                {
+                    "id": "match",
+                    "type": "match_scholarships",
+                    "params": {"student_profile": {"$ref": "cv"}, "scholarships": [dict(SCHOLARSHIP, id=i) for i in range(5)]},
+                },
+                {"id": "faculty", "type": "discover_faculty", "params": {"mode": "LIST_UNIVERSITIES", "continent": "Asia"}},
+            ],
+        },
+        True,
+    ),
+}
+
+
+def _percentile(values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+# Server process
+
+class LoopLagMonitor:
+    """Measures how late the event loop wakes a task that sleeps for a fixed interval"""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples: List[float] = []
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - started - self.interval))
+
+    def collect(self) -> Dict[str, Any]:
+        """Lag statistics (ms) since the last collect"""
+        samples, self.samples = self.samples, []
+        return {
+            "samples": len(samples),
+            "p50_ms": (_percentile(samples, 50) or 0) * 1000,
+            "p99_ms": (_percentile(samples, 99) or 0) * 1000,
+            "max_ms": max(samples, default=0) * 1000,
+        }
+
+
+def _serve(port: int, profile_settings: Dict[str, Any], log_level: str, backend: Dict[str, Any],
+           profile_out: Optional[str]):
+    """Child process: run the app with the fake or replay backend"""
+    os.environ.update({
+        "GEMINI_API_KEY": API_SECRET,
+        "CORE_API_SECRET": API_SECRET,
+        "RATE_LIMIT_STORAGE_URI": "memory://",
+        "LOG_LEVEL": log_level,
+    })
+    os.environ.pop("PROMETHEUS_MULTIPROC_DIR", None)
+    os.environ.pop("TRACE_EXPORT_PATH", None)
+
+    from contextlib import asynccontextmanager
+
+    import uvicorn
+
+    if backend["name"] == "replay":
+        os.environ.update({
+            "LLM_BACKEND": "replay",
+            "LLM_CASSETTE_PATH": backend["cassette"],
+            "LLM_REPLAY_SPEED": str(backend["speed"]),
+        })
+    else:
+        import fake_gemini
+
+        os.environ["LLM_BACKEND"] = "live"
+        fake_gemini.install(fake_gemini.FakeProfile(**profile_settings))
+
+    import main
+    from app.core.rate_limit import limiter
+
+    # Measure the service, not the per-client limits
+    limiter.enabled = False
+
+    monitor = LoopLagMonitor()
+    app_lifespan = main.app.router.lifespan_context
+
+    @asynccontextmanager
+    async def lifespan(app):
+        async with app_lifespan(app) as state:
+            task = asyncio.create_task(monitor.run())
+            if profile_out:
+                import cProfile
+                import tracemalloc
+
+                tracemalloc.start()
+                profiler = cProfile.Profile()
+                profiler.enable()
+            yield state
+            task.cancel()
+            if profile_out:
+                profiler.disable()
+                profiler.dump_stats(profile_out)
+                _, peak = tracemalloc.get_traced_memory()
+                print(f"Server profile written to {profile_out}; peak traced memory {peak / 1e6:.1f} MB",
+                      file=sys.stderr)
+
+    main.app.router.lifespan_context = lifespan
+    main.app.add_api_route("/__bench/lag", monitor.collect, methods=["GET"], include_in_schema=False)
+
+    uvicorn.run(main.app, host="127.0.0.1", port=port, log_level=log_level.lower(), access_log=False)
+
+
+# Client
+
+async def _request(client, path: str, payload: Dict[str, Any], streaming: bool) -> Dict[str, Any]:
+    started = time.perf_counter()
+    first_chunk = None
+    ok = True
+    try:
+        if streaming:
+            async with client.stream("POST", path, json=payload) as response:
+                ok = response.status_code < 400
+                async for line in response.aiter_lines():
+                    if not line.startswith("data: "):
+                        continue
+                    if first_chunk is None:
+                        first_chunk = time.perf_counter() - started
+                    if '"error"' in line:
+                        ok = False
+        else:
+            response = await client.post(path, json=payload)
+            ok = response.status_code < 400 and response.json().get("success", True) is not False
+    except Exception:
+        ok = False
+    return {"latency": time.perf_counter() - started, "first_chunk": first_chunk, "ok": ok}
+
+
+async def _run_scenario(client, name: str, requests: int, concurrency: int) -> Dict[str, Any]:
+    path, payload, streaming = SCENARIOS[name]
+    results: List[Dict[str, Any]] = []
+    pending = iter(range(requests))
+
+    async def worker():
+        for _ in pending:
+            results.append(await _request(client, path, payload, streaming))
+
+    await client.get("/__bench/lag")  # reset
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    lag = (await client.get("/__bench/lag")).json()
+
+    latencies = [r["latency"] for r in results]
+    first_chunks = [r["first_chunk"] for r in results if r["first_chunk"] is not None]
+    ms = lambda value: round(value * 1000, 1) if value is not None else None  # noqa: E731
+    return {
+        "route": name,
+        "requests": requests,
+        "errors": sum(not r["ok"] for r in results),
+        "rps": round(requests / elapsed, 2),
+        "p50_ms": ms(_percentile(latencies, 50)),
+        "p95_ms": ms(_percentile(latencies, 95)),
+        "p99_ms": ms(_percentile(latencies, 99)),
+        "ttfc_p50_ms": ms(_percentile(first_chunks, 50)) if streaming else None,
+        "ttfc_p95_ms": ms(_percentile(first_chunks, 95)) if streaming else None,
+        "loop_lag_p99_ms": round(lag["p99_ms"], 1),
+        "loop_lag_max_ms": round(lag["max_ms"], 1),
+    }
+
+
+async def _wait_ready(client, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/ready")).status_code == 200:
+                return
+        except Exception:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("Service did not become ready")
+
+
+def _print_report(results: List[Dict[str, Any]]):
+    columns = [
+        ("route", 30), ("requests", 9), ("errors", 7), ("rps", 8), ("p50_ms", 9), ("p95_ms", 9),
+        ("p99_ms", 9), ("ttfc_p50_ms", 12), ("ttfc_p95_ms", 12), ("loop_lag_p99_ms", 16), ("loop_lag_max_ms", 16),
+    ]
+    print("".join(f"{name:<{width}}" if name == "route" else f"{name:>{width}}" for name, width in columns))
+    for result in results:
+        row = []
+        for name, width in columns:
+            value = result[name]
+            value = "-" if value is None else value
+            row.append(f"{value:<{width}}" if name == "route" else f"{value:>{width}}")
+        print("".join(row))
+
+
+def _compare(results: List[Dict[str, Any]], baseline_path: str, tolerance: float) -> List[str]:
+    """Routes whose p95 latency or throughput regressed beyond the tolerance"""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {r["route"]: r for r in json.load(f)["results"]}
+    regressions = []
+    for result in results:
+        base = baseline.get(result["route"])
+        if not base:
+            continue
+        if base["p95_ms"] and result["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{result['route']}: p95 {base['p95_ms']}ms -> {result['p95_ms']}ms")
+        if base["rps"] and result["rps"] < base["rps"] * (1 - tolerance):
+            regressions.append(f"{result['route']}: rps {base['rps']} -> {result['rps']}")
+    return regressions
+
+
+async def _drive(port: int, routes: List[str], requests: int, concurrency: int) -> List[Dict[str, Any]]:
+    import httpx
+
+    async with httpx.AsyncClient(
+        base_url=f"http://127.0.0.1:{port}",
+        headers={"Authorization": f"Bearer {API_SECRET}"},
+        timeout=300.0,
+        limits=httpx.Limits(max_connections=concurrency + 1, max_keepalive_connections=concurrency + 1),
+    ) as client:
+        await _wait_ready(client)
+        results = []
+        for name in routes:
+            results.append(await _run_scenario(client, name, requests, concurrency))
+            print(f"  finished {name}", file=sys.stderr)
+        return results
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--routes", default=",".join(SCENARIOS), help=f"Comma-separated subset of: {', '.join(SCENARIOS)}")
+    parser.add_argument("--requests", type=int, default=50, help="Requests per route")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--latency-distribution", default="lognormal", choices=["lognormal", "uniform", "fixed"])
+    parser.add_argument("--latency-median-ms", type=float, default=800)
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="Lognormal sigma, or relative spread for uniform")
+    parser.add_argument("--first-chunk-ms", type=float, default=400)
+    parser.add_argument("--chunk-interval-ms", type=float, default=40)
+    parser.add_argument("--chunk-chars", type=int, default=60)
+    parser.add_argument("--output-chars", type=int, default=3000)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of calls failing with 429")
+    parser.add_argument("--timeout-rate", type=float, default=0.0, help="Fraction of calls failing with a deadline error")
+    parser.add_argument("--timeout-ms", type=float, default=2000, help="Time before an injected deadline error")
+    parser.add_argument("--truncate-rate", type=float, default=0.0, help="Fraction of unary calls stopping at max_tokens")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--backend", default="fake", choices=["fake", "replay"])
+    parser.add_argument("--cassette", help="Cassette for --backend replay (recorded with LLM_BACKEND=record)")
+    parser.add_argument("--replay-speed", type=float, default=1.0, help="1 = recorded timing, 0 = no delays")
+    parser.add_argument("--profile-out", help="Write a cProfile of the server to this file")
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--json", help="Write results to this file")
+    parser.add_argument("--compare", help="Baseline results file to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    routes = [name.strip() for name in args.routes.split(",") if name.strip()]
+    unknown = set(routes) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"Unknown routes: {sorted(unknown)}")
+    if args.backend == "replay" and not args.cassette:
+        parser.error("--cassette is required with --backend replay")
+    backend = {
+        "name": args.backend,
+        "cassette": os.path.abspath(args.cassette) if args.cassette else None,
+        "speed": args.replay_speed,
+    }
+
+    profile = {
+        "latency_median": args.latency_median_ms / 1000,
+        "latency_sigma": args.latency_sigma,
+        "latency_distribution": args.latency_distribution,
+        "first_chunk": args.first_chunk_ms / 1000,
+        "chunk_interval": args.chunk_interval_ms / 1000,
+        "chunk_chars": args.chunk_chars,
+        "output_chars": args.output_chars,
+        "rate_limit_rate": args.rate_limit_rate,
+        "timeout_rate": args.timeout_rate,
+        "timeout": args.timeout_ms / 1000,
+        "truncate_rate": args.truncate_rate,
+        "seed": args.seed,
+    }
+
+    port = _free_port()
+    server = multiprocessing.get_context("spawn").Process(
+        target=_serve,
+        args=(port, profile, args.log_level.upper(), backend,
+              os.path.abspath(args.profile_out) if args.profile_out else None),
+        daemon=True,
+    )
+    server.start()
+    try:
+        results = asyncio.run(_drive(port, routes, args.requests, args.concurrency))
+    finally:
+        server.terminate()
+        server.join(10)
+
+    backend_info = backend if args.backend == "replay" else profile
+    print(f"\n{args.requests} requests per route at concurrency {args.concurrency}; "
+          f"{args.backend} backend: {backend_info}\n")
+    _print_report(results)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(
+                {"backend": backend_info, "concurrency": args.concurrency, "results": results}, f, indent=2
+            )
+
+    if args.compare:
+        regressions = _compare(results, args.compare, args.tolerance)
+        if regressions:
+            print("\nRegressions:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+        print(f"\nNo regressions beyond {args.tolerance:.0%} against {args.compare}")
+
+
+if __name__ == "__main__":
+    main()
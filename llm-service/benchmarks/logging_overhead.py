@@ -0,0 +1,130 @@
+"""
+Logging overhead benchmark
+Measures the time a request spends in its access-log calls for each handler setup
+
+The request middleware logs two lines per request (request and response, with
+``extra`` fields). This times those two calls on the caller's thread, which is
+the cost the event loop pays, for:
+
+- sync: StreamHandler + JSONFormatter writing directly (the previous setup)
+- queue: QueueLogHandler, formatting and writing on the listener thread
+- queue+sampling: as above with LOG_SAMPLING keeping 10% of INFO lines
+
+Use --slow-write-ms to simulate a log consumer that applies backpressure
+(a full stdout pipe, a slow container log driver).
+
+Usage (from llm-service/):
+    python benchmarks/logging_overhead.py [--requests 20000] [--output /dev/null] [--slow-write-ms 0]
+"""
+
+import argparse
+import logging
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Settings are loaded on import; the benchmark never calls Gemini or the core-api
+os.environ.setdefault("GEMINI_API_KEY", "benchmark-placeholder")
+os.environ.setdefault("CORE_API_SECRET", "benchmark-placeholder")
+
+from app.core.logging_config import JSONFormatter, QueueLogHandler, SamplingFilter  # noqa: E402
+
+
+class SlowStream:
+    """File wrapper that blocks on every write, like a full pipe"""
+
+    def __init__(self, stream, delay: float):
+        self.stream = stream
+        self.delay = delay
+
+    def write(self, data: str) -> int:
+        time.sleep(self.delay)
+        return self.stream.write(data)
+
+    def flush(self):
+        self.stream.flush()
+
+
+def _log_request(logger: logging.Logger, i: int):
+    """The two log calls made by the request middleware"""
+    logger.info(
+        "Request: POST /api/llm/chat",
+        extra={"method": "POST", "path": "/api/llm/chat", "client_ip": "10.0.0.1"},
+    )
+    logger.info(
+        "Response: 200",
+        extra={"status_code": 200, "path": "/api/llm/chat", "duration_ms": 12.5 + i % 7},
+    )
+
+
+def _run(name: str, handler: logging.Handler, requests: int) -> dict:
+    logger = logging.getLogger(f"benchmark.{name}")
+    logger.handlers = [handler]
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+    # Warm up caches (sampling resolution, formatter, listener start)
+    for i in range(100):
+        _log_request(logger, i)
+
+    timings = []
+    for i in range(requests):
+        started = time.perf_counter_ns()
+        _log_request(logger, i)
+        timings.append((time.perf_counter_ns() - started) / 1000)
+
+    drain_started = time.perf_counter()
+    if isinstance(handler, QueueLogHandler):
+        handler.stop()
+    handler.flush()
+    drain_ms = (time.perf_counter() - drain_started) * 1000
+
+    timings.sort()
+    return {
+        "setup": name,
+        "mean_us": statistics.fmean(timings),
+        "p50_us": timings[len(timings) // 2],
+        "p99_us": timings[int(len(timings) * 0.99)],
+        "max_us": timings[-1],
+        "drain_ms": drain_ms,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--output", default=os.devnull, help="File the handlers write to")
+    parser.add_argument("--slow-write-ms", type=float, default=0.0, help="Delay added to every write")
+    args = parser.parse_args()
+
+    output = open(args.output, "a", encoding="utf-8")
+    stream = SlowStream(output, args.slow_write_ms / 1000) if args.slow_write_ms else output
+
+    def console() -> logging.Handler:
+        handler = logging.StreamHandler(stream)
+        handler.setFormatter(JSONFormatter())
+        return handler
+
+    sampled = QueueLogHandler([console()], max_queue=100000)
+    sampled.addFilter(SamplingFilter({"benchmark": 0.1}))
+
+    results = [
+        _run("sync", console(), args.requests),
+        _run("queue", QueueLogHandler([console()], max_queue=100000), args.requests),
+        _run("queue+sampling", sampled, args.requests),
+    ]
+    output.close()
+
+    print(f"{args.requests} requests, 2 log lines each, output={args.output}, slow_write_ms={args.slow_write_ms}")
+    print(f"{'setup':<16}{'mean us':>10}{'p50 us':>10}{'p99 us':>10}{'max us':>10}{'drain ms':>10}")
+    for r in results:
+        print(
+            f"{r['setup']:<16}{r['mean_us']:>10.1f}{r['p50_us']:>10.1f}"
+            f"{r['p99_us']:>10.1f}{r['max_us']:>10.1f}{r['drain_ms']:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
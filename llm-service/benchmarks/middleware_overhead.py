@@ -0,0 +1,217 @@
+"""
+Middleware overhead benchmark
+Compares request throughput and streaming latency across middleware stacks
+
+Stacks:
+- none: the routes alone
+- http: the previous two ``@app.middleware("http")`` functions (security
+  headers + access log/metrics/tracing), reproduced here
+- asgi: RequestContextMiddleware
+
+The apps are driven directly through the ASGI interface, without a server or
+sockets, so the numbers isolate the middleware cost:
+- throughput: small JSON responses at a fixed concurrency (requests/sec)
+- streaming: an SSE route yielding chunks at a fixed interval; reports the
+  time to the first chunk and how far chunk delivery lags behind the route
+
+Usage (from llm-service/):
+    python benchmarks/middleware_overhead.py [--requests 5000] [--concurrency 50] [--chunks 50]
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Settings are loaded on import; the benchmark never calls Gemini or the core-api
+os.environ.setdefault("GEMINI_API_KEY", "benchmark-placeholder")
+os.environ.setdefault("CORE_API_SECRET", "benchmark-placeholder")
+
+from fastapi import FastAPI, Request  # noqa: E402
+from fastapi.responses import StreamingResponse  # noqa: E402
+
+from app.core.logging_config import JSONFormatter, QueueLogHandler  # noqa: E402
+from app.core.metrics import REQUEST_LATENCY, REQUESTS_IN_PROGRESS  # noqa: E402
+from app.core.middleware import SECURITY_HEADERS, RequestContextMiddleware  # noqa: E402
+from app.core.tracing import tracer  # noqa: E402
+
+logger = logging.getLogger("benchmark")
+
+CHUNK_INTERVAL = 0.005
+
+
+def _add_routes(app: FastAPI, chunks: int):
+    @app.get("/ping")
+    async def ping():
+        return {"status": "ok"}
+
+    @app.get("/stream")
+    async def stream():
+        async def events():
+            for i in range(chunks):
+                yield f"data: {{\"chunk\": {i}, \"sent\": {time.perf_counter()}}}\n\n"
+                await asyncio.sleep(CHUNK_INTERVAL)
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+
+def _build_http_middleware_app(chunks: int) -> FastAPI:
+    """The middleware stack before the pure ASGI rewrite"""
+    app = FastAPI()
+    _add_routes(app, chunks)
+
+    @app.middleware("http")
+    async def add_security_headers(request: Request, call_next):
+        response = await call_next(request)
+        for name, value in SECURITY_HEADERS:
+            response.headers[name] = value
+        return response
+
+    @app.middleware("http")
+    async def log_requests(request: Request, call_next):
+        started = time.perf_counter()
+        in_progress = REQUESTS_IN_PROGRESS.labels(request.url.path)
+        in_progress.inc()
+        logger.info(
+            f"Request: {request.method} {request.url.path}",
+            extra={"method": request.method, "path": request.url.path, "client_ip": "unknown"},
+        )
+        with tracer.start_trace(f"{request.method} {request.url.path}", request.headers) as span:
+            try:
+                response = await call_next(request)
+            finally:
+                in_progress.dec()
+            span.set_attribute("status_code", response.status_code)
+        REQUEST_LATENCY.labels(request.method, request.url.path, str(response.status_code)).observe(
+            time.perf_counter() - started
+        )
+        logger.info(f"Response: {response.status_code}", extra={"status_code": response.status_code})
+        return response
+
+    return app
+
+
+def _build_apps(chunks: int) -> dict:
+    bare = FastAPI()
+    _add_routes(bare, chunks)
+
+    asgi = FastAPI()
+    _add_routes(asgi, chunks)
+    asgi.add_middleware(RequestContextMiddleware)
+
+    return {"none": bare, "http": _build_http_middleware_app(chunks), "asgi": asgi}
+
+
+async def _call(app, path: str, on_body=None):
+    """Send one GET request through the ASGI app"""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"host", b"benchmark")],
+        "client": ("127.0.0.1", 50000),
+        "server": ("benchmark", 80),
+    }
+    request_sent = False
+    disconnect = asyncio.Event()
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await disconnect.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.body":
+            if on_body is not None and message.get("body"):
+                on_body(message["body"])
+            if not message.get("more_body", False):
+                disconnect.set()
+
+    await app(scope, receive, send)
+
+
+async def _throughput(app, requests: int, concurrency: int) -> float:
+    remaining = iter(range(requests))
+
+    async def worker():
+        for _ in remaining:
+            await _call(app, "/ping")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return requests / (time.perf_counter() - started)
+
+
+async def _streaming(app, streams: int) -> dict:
+    first_chunk_ms = []
+    lag_ms = []
+
+    async def one():
+        started = time.perf_counter()
+        first = True
+
+        def on_body(body: bytes):
+            nonlocal first
+            received = time.perf_counter()
+            if first:
+                first_chunk_ms.append((received - started) * 1000)
+                first = False
+            sent = float(body.decode().rsplit('"sent": ', 1)[1].split("}")[0])
+            lag_ms.append((received - sent) * 1000)
+
+        await _call(app, "/stream", on_body)
+
+    await asyncio.gather(*(one() for _ in range(streams)))
+    lag_ms.sort()
+    return {
+        "ttfc_ms": statistics.median(first_chunk_ms),
+        "lag_p50_ms": lag_ms[len(lag_ms) // 2],
+        "lag_p99_ms": lag_ms[int(len(lag_ms) * 0.99)],
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--streams", type=int, default=20)
+    parser.add_argument("--chunks", type=int, default=50)
+    args = parser.parse_args()
+
+    # Production-style logging: queued JSON lines, discarded
+    console = logging.StreamHandler(open(os.devnull, "w"))
+    console.setFormatter(JSONFormatter())
+    root = logging.getLogger()
+    root.handlers = [QueueLogHandler([console])]
+    root.setLevel(logging.INFO)
+
+    apps = _build_apps(args.chunks)
+    print(
+        f"throughput: {args.requests} requests at concurrency {args.concurrency}; "
+        f"streaming: {args.streams} streams x {args.chunks} chunks every {CHUNK_INTERVAL * 1000:.0f}ms"
+    )
+    print(f"{'stack':<8}{'req/s':>10}{'ttfc ms':>10}{'lag p50 ms':>12}{'lag p99 ms':>12}")
+    for name, app in apps.items():
+        await _throughput(app, 200, args.concurrency)
+        rps = await _throughput(app, args.requests, args.concurrency)
+        stream = await _streaming(app, args.streams)
+        print(
+            f"{name:<8}{rps:>10.0f}{stream['ttfc_ms']:>10.2f}"
+            f"{stream['lag_p50_ms']:>12.3f}{stream['lag_p99_ms']:>12.3f}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,151 @@
+"""
+Overload benchmark
+Measures goodput when requests arrive faster than Gemini can serve them, with and without load shedding
+
+The service runs as in benchmarks/load_test.py, on the simulated backend
+with a saturating upstream (``capacity`` concurrent calls; beyond that every
+call slows down proportionally). Requests arrive open loop at a fixed rate,
+a mix of an interactive route (chat) and a bulk one (scholarship discovery),
+and each client gives up after --client-timeout seconds, passing that budget
+in X-Request-Timeout-Ms as the core-api does.
+
+The run is repeated with LOAD_SHEDDING_ENABLED off and on and reports, per
+route class:
+
+- goodput: successful responses per second within the client timeout
+- shed (503), timed out and failed requests
+- p50/p95 latency of the successful responses
+
+Usage (from llm-service/):
+    python benchmarks/overload.py [--rate 40] [--duration 20] [--capacity 20]
+        [--latency-median-ms 1000] [--client-timeout 10] [--bulk-fraction 0.5]
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import sys
+import time
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from load_test import API_SECRET, SCENARIOS, _free_port, _percentile, _serve, _wait_ready  # noqa: E402
+
+ROUTES = {"interactive": "chat", "bulk": "discover_scholarships"}
+
+
+async def _request(client, route_class: str, timeout: float) -> Dict[str, Any]:
+    import httpx
+
+    path, payload, _ = SCENARIOS[ROUTES[route_class]]
+    started = time.perf_counter()
+    outcome = "ok"
+    try:
+        response = await client.post(
+            path,
+            json=payload,
+            headers={"X-Request-Timeout-Ms": str(int(timeout * 1000))},
+            timeout=timeout,
+        )
+        if response.status_code == 503:
+            outcome = "shed"
+        elif response.status_code >= 400 or response.json().get("success", True) is False:
+            outcome = "failed"
+    except httpx.TimeoutException:
+        outcome = "timeout"
+    except Exception:
+        outcome = "failed"
+    return {"class": route_class, "outcome": outcome, "latency": time.perf_counter() - started}
+
+
+async def _drive(port: int, rate: float, duration: float, timeout: float, bulk_fraction: float) -> List[Dict[str, Any]]:
+    import httpx
+
+    rng = random.Random(0)
+    async with httpx.AsyncClient(
+        base_url=f"http://127.0.0.1:{port}",
+        headers={"Authorization": f"Bearer {API_SECRET}"},
+        limits=httpx.Limits(max_connections=None, max_keepalive_connections=200),
+    ) as client:
+        await _wait_ready(client)
+        tasks = []
+        started = time.perf_counter()
+        next_at = started
+        while next_at - started < duration:
+            route_class = "bulk" if rng.random() < bulk_fraction else "interactive"
+            tasks.append(asyncio.create_task(_request(client, route_class, timeout)))
+            # Poisson arrivals
+            next_at += rng.expovariate(rate)
+            await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+        return await asyncio.gather(*tasks)
+
+
+def _summarize(results: List[Dict[str, Any]], duration: float) -> List[Dict[str, Any]]:
+    rows = []
+    for route_class in ROUTES:
+        subset = [r for r in results if r["class"] == route_class]
+        ok = [r["latency"] for r in subset if r["outcome"] == "ok"]
+        rows.append({
+            "class": route_class,
+            "sent": len(subset),
+            "goodput": round(len(ok) / duration, 2),
+            "shed": sum(r["outcome"] == "shed" for r in subset),
+            "timeout": sum(r["outcome"] == "timeout" for r in subset),
+            "failed": sum(r["outcome"] == "failed" for r in subset),
+            "p50_ms": round((_percentile(ok, 50) or 0) * 1000),
+            "p95_ms": round((_percentile(ok, 95) or 0) * 1000),
+        })
+    return rows
+
+
+def _run(shedding: bool, args, profile: Dict[str, Any]) -> List[Dict[str, Any]]:
+    # The spawned server inherits the environment
+    os.environ["LOAD_SHEDDING_ENABLED"] = "true" if shedding else "false"
+    port = _free_port()
+    server = multiprocessing.get_context("spawn").Process(
+        target=_serve,
+        args=(port, profile, "WARNING", {"name": "fake"}, None),
+        daemon=True,
+    )
+    server.start()
+    try:
+        results = asyncio.run(_drive(port, args.rate, args.duration, args.client_timeout, args.bulk_fraction))
+    finally:
+        server.terminate()
+        server.join(10)
+    return _summarize(results, args.duration)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rate", type=float, default=40, help="Requests per second")
+    parser.add_argument("--duration", type=float, default=20, help="Seconds of arrivals")
+    parser.add_argument("--capacity", type=int, default=20, help="Concurrent upstream calls before slowdown")
+    parser.add_argument("--latency-median-ms", type=float, default=1000)
+    parser.add_argument("--latency-sigma", type=float, default=0.3)
+    parser.add_argument("--client-timeout", type=float, default=10)
+    parser.add_argument("--bulk-fraction", type=float, default=0.5)
+    args = parser.parse_args()
+
+    profile = {
+        "latency_median": args.latency_median_ms / 1000,
+        "latency_sigma": args.latency_sigma,
+        "output_chars": 2000,
+        "capacity": args.capacity,
+    }
+
+    columns = ["class", "sent", "goodput", "shed", "timeout", "failed", "p50_ms", "p95_ms"]
+    print(f"{args.rate} req/s for {args.duration}s; upstream capacity {args.capacity} x "
+          f"{args.latency_median_ms:.0f}ms (~{args.capacity / (args.latency_median_ms / 1000):.0f} req/s); "
+          f"client timeout {args.client_timeout}s\n")
+    print(f"{'shedding':<10}" + "".join(f"{c:>12}" for c in columns))
+    for shedding in (False, True):
+        for row in _run(shedding, args, profile):
+            print(f"{'on' if shedding else 'off':<10}" + "".join(f"{row[c]:>12}" for c in columns))
+
+
+if __name__ == "__main__":
+    main()
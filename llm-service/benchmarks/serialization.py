@@ -0,0 +1,103 @@
+"""
+Serialization benchmark
+Measures the CPU spent encoding response bodies and SSE frames
+
+- responses: a 100-match ScholarshipMatchResponse and a 50-item scholarship
+  discovery list, rendered the way FastAPI does (jsonable_encoder, then the
+  response class) with JSONResponse vs ORJSONResponse
+- sse: one streamed chunk encoded as the routes used to
+  (f"data: {json.dumps(...)}\\n\\n", then encoded to bytes by Starlette)
+  vs app.core.sse.sse_event
+
+Usage (from llm-service/):
+    python benchmarks/serialization.py [--iterations 2000]
+"""
+
+import argparse
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Settings are loaded on import; the benchmark never calls Gemini or the core-api
+os.environ.setdefault("GEMINI_API_KEY", "benchmark-placeholder")
+os.environ.setdefault("CORE_API_SECRET", "benchmark-placeholder")
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse, ORJSONResponse  # noqa: E402
+
+from app.core.sse import sse_event  # noqa: E402
+from app.models.responses import ScholarshipMatchResponse  # noqa: E402
+
+
+def _match(i: int) -> dict:
+    return {
+        "scholarship_id": f"sch-{i:04d}",
+        "title": f"International Excellence Scholarship {i}",
+        "provider": "University of Example",
+        "match_score": 0.5 + (i % 50) / 100,
+        "matching_criteria": ["GPA above 3.5", "STEM field", "Leadership experience"],
+        "missing_criteria": ["Language certificate"],
+        "recommendation": "Strong candidate; highlight research experience and community work. " * 3,
+        "amount": {"value": 25000 + i, "currency": "USD"},
+        "deadline": "2027-01-15",
+    }
+
+
+def _discovered(i: int) -> dict:
+    return {
+        "name": f"Global Leaders Fellowship {i}",
+        "provider": "Example Foundation",
+        "country": "Germany",
+        "degree_levels": ["Masters", "PhD"],
+        "fields": ["Engineering", "Computer Science"],
+        "amount": "Full tuition + €1,200/month stipend",
+        "deadline": "2027-03-01",
+        "description": "Supports outstanding international students pursuing graduate study. " * 4,
+        "url": f"https://example.org/scholarships/{i}",
+        "eligibility": ["Bachelor's degree", "IELTS 6.5", "Under 35"],
+    }
+
+
+def _per_call_us(func, iterations: int) -> float:
+    return min(timeit.repeat(func, number=iterations, repeat=5)) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+    n = args.iterations
+
+    match_response = ScholarshipMatchResponse(
+        success=True, matches=[_match(i) for i in range(100)], total_matches=100
+    )
+    discovery = {"scholarships": [_discovered(i) for i in range(50)], "count": 50}
+
+    print(f"{'payload':<34}{'json us':>10}{'orjson us':>11}{'saved us':>10}{'bytes':>9}")
+    for name, content in (
+        ("ScholarshipMatchResponse x100", match_response),
+        ("discovery list x50", discovery),
+    ):
+        encoded = jsonable_encoder(content)
+        std = _per_call_us(lambda: JSONResponse(encoded), n // 10)
+        fast = _per_call_us(lambda: ORJSONResponse(encoded), n // 10)
+        size = len(ORJSONResponse(encoded).body)
+        print(f"{name:<34}{std:>10.1f}{fast:>11.1f}{std - fast:>10.1f}{size:>9}")
+
+    chunk = "Based on your profile, the DAAD scholarship is a strong fit because "
+    interview_chunk = '{"speech": "Tell me about a time you led a team", "transcription": '
+    print()
+    print(f"{'sse frame':<34}{'json us':>10}{'orjson us':>11}{'saved us':>10}")
+    for name, payload in (
+        ("chat/document {'content'}", {"content": chunk}),
+        ("interview {'chunk', 'done'}", {"chunk": interview_chunk, "done": False}),
+    ):
+        std = _per_call_us(lambda: f"data: {json.dumps(payload)}\n\n".encode("utf-8"), n * 10)
+        fast = _per_call_us(lambda: sse_event(payload), n * 10)
+        print(f"{name:<34}{std:>10.2f}{fast:>11.2f}{std - fast:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Gunicorn configuration for production serving
+Runs the FastAPI app under several uvicorn worker processes so throughput scales with CPU cores
+
+Usage:
+    gunicorn -c gunicorn.conf.py main:app
+
+Sizing guidance:
+- Each uvicorn worker is an asyncio event loop; most request time is spent
+  awaiting Gemini, so one worker per core is usually enough. Raise
+  WEB_CONCURRENCY above the core count only if CPU stays low while latency
+  grows (e.g. CPU-heavy parsing holding the loop).
+- Memory is roughly base RSS (~150 MB) per worker; preloading shares the
+  parsed instruction YAMLs and imported modules between workers copy-on-write.
+- Rate limits and the Gemini quota are shared through RATE_LIMIT_STORAGE_URI,
+  so adding workers does not multiply the limits.
+- GUNICORN_TIMEOUT must stay above REQUEST_TIMEOUT (and the budgets callers
+  send in X-Request-Timeout-Ms), otherwise the arbiter can kill workers in
+  the middle of a long generation.
+"""
+
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+
+def _env_int(name: str, default: int) -> int:
+    """Read an integer setting from the environment"""
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+
+# Workers write Prometheus samples here so /metrics can aggregate them.
+# It must exist, empty, before the app (and prometheus_client) is preloaded.
+metrics_dir = os.environ.setdefault(
+    "PROMETHEUS_MULTIPROC_DIR",
+    os.path.join(tempfile.gettempdir(), "scholarhunter-prometheus"),
+)
+shutil.rmtree(metrics_dir, ignore_errors=True)
+os.makedirs(metrics_dir, exist_ok=True)
+
+# Server socket
+bind = f"0.0.0.0:{os.environ.get('SERVICE_PORT', '8000')}"
+backlog = _env_int("GUNICORN_BACKLOG", 2048)
+
+# Worker processes
+workers = _env_int("WEB_CONCURRENCY", multiprocessing.cpu_count())
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "uvicorn.workers.UvicornWorker")
+keepalive = _env_int("GUNICORN_KEEPALIVE", 5)
+
+# Load the app (settings, routes, instruction YAMLs) once in the master before forking.
+# Per-worker state such as the Gemini client is still created in the app lifespan,
+# after fork, because gRPC channels must not be shared across processes.
+preload_app = True
+
+# Graceful worker recycling bounds memory growth from long-lived workers;
+# jitter keeps all workers from restarting at the same moment
+max_requests = _env_int("GUNICORN_MAX_REQUESTS", 1000)
+max_requests_jitter = _env_int("GUNICORN_MAX_REQUESTS_JITTER", 100)
+timeout = _env_int("GUNICORN_TIMEOUT", 180)
+graceful_timeout = _env_int("GUNICORN_GRACEFUL_TIMEOUT", 30)
+
+# Logging (application logs are configured by app.core.logging_config)
+accesslog = None
+errorlog = "-"
+loglevel = os.environ.get("LOG_LEVEL", "info").lower()
+
+
+def child_exit(server, worker):
+    """Drop the live gauges of a worker that exited or was recycled"""
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
+
+
+def when_ready(server):
+    """Parse every instruction file in the master so workers inherit the cache"""
+    from app.services.yaml_loader import instruction_loader
+
+    names = instruction_loader.preload()
+    server.log.info(f"Preloaded {len(names)} instruction files before forking {workers} workers")
@@ -5,33 +5,36 @@ Following OWASP security best practices
 """
 
 import os
+import time
 import logging
 from contextlib import asynccontextmanager
 from typing import AsyncGenerator
 
+# Measure boot time from before the heavy framework imports
+BOOT_STARTED = time.perf_counter()
+
 from fastapi import FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse, Response
 from fastapi.exceptions import RequestValidationError
-from slowapi import Limiter, _rate_limit_exceeded_handler
-from slowapi.util import get_remote_address
+from slowapi import _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
 
 from app.core.config import settings
+from app.core.deadline import DeadlineExceededError
 from app.core.security import verify_api_key
-from app.api.routes import cv_parser, scholarship_matcher, document_generator, chat, interview, scholarship_discovery, faculty
+from app.core.rate_limit import limiter
+from app.api.routes import cv_parser, scholarship_matcher, document_generator, chat, interview, scholarship_discovery, faculty, jobs, attachments, batch, profiles
 from app.core.logging_config import setup_logging
+from app.core.metrics import render_metrics
+from app.core.middleware import RequestContextMiddleware
 
 # Setup logging
 setup_logging()
 logger = logging.getLogger(__name__)
 
 
-# Rate limiter
-limiter = Limiter(key_func=get_remote_address)
-
-
 @asynccontextmanager
 async def lifespan(app: FastAPI) -> AsyncGenerator:
     """Application lifespan manager"""
@@ -39,17 +42,80 @@ async def lifespan(app: FastAPI) -> AsyncGenerator:
     logger.info(f"Environment: {settings.ENVIRONMENT}")
     logger.info(f"Service Port: {settings.SERVICE_PORT}")
     
-    # Initialize Gemini AI
     from app.services.gemini_service import GeminiService
+    from app.services.chat_cache import ChatCache
+    from app.services.faculty_directory import FacultyCache, FacultyDirectory
+    from app.services.jobs import JobRunner, JobStore
+    from app.services.question_pool import QuestionPool, QuestionPoolStore
+    from app.services.warmup import StartupReport, run_warmup
+    
+    report = StartupReport(boot_started=BOOT_STARTED)
+    app.state.startup_report = report
+    
+    # Initialize Gemini AI
+    started = time.perf_counter()
     gemini_service = GeminiService()
     await gemini_service.initialize()
     app.state.gemini_service = gemini_service
+    report.record("initialize_gemini", started)
+    
+    # Warm up instructions, modules and connections before reporting ready
+    await run_warmup(gemini_service, report)
+    
+    # Pick up edited instruction files without a restart
+    gemini_service.yaml_loader.start_watching(settings.INSTRUCTION_RELOAD_INTERVAL)
+    
+    # Background jobs for long generations
+    app.state.job_runner = JobRunner(
+        JobStore(settings.JOB_STORE_PATH, lease_seconds=settings.JOB_LEASE_SECONDS),
+        max_concurrency=settings.JOB_MAX_CONCURRENCY,
+        max_pending=settings.JOB_MAX_PENDING,
+        timeout=settings.JOB_TIMEOUT,
+        result_ttl=settings.JOB_RESULT_TTL,
+    )
+    
+    # Faculty discovery lists, with the next level prefetched
+    app.state.faculty_directory = FacultyDirectory(
+        gemini_service,
+        FacultyCache(settings.FACULTY_CACHE_PATH, ttl=settings.FACULTY_CACHE_TTL) if settings.ENABLE_CACHE else None,
+        prefetch_count=settings.FACULTY_PREFETCH_COUNT,
+        prefetch_concurrency=settings.FACULTY_PREFETCH_CONCURRENCY,
+        prefetch_timeout=settings.REQUEST_TIMEOUT,
+    )
+    
+    # Interview practice questions, generated ahead of need
+    app.state.question_pool = QuestionPool(
+        gemini_service,
+        QuestionPoolStore(settings.QUESTION_POOL_PATH, ttl=settings.QUESTION_POOL_TTL) if settings.ENABLE_CACHE else None,
+        size=settings.QUESTION_POOL_SIZE,
+        min_available=settings.QUESTION_POOL_MIN_AVAILABLE,
+        refill_concurrency=settings.QUESTION_POOL_REFILL_CONCURRENCY,
+        refill_timeout=settings.REQUEST_TIMEOUT,
+    )
+    
+    # Answers to repeated first chat messages, dropped when the chat prompt changes
+    chat_cache = None
+    if settings.ENABLE_CACHE and settings.CHAT_CACHE_MAX_ENTRIES > 0:
+        chat_cache = ChatCache(
+            max_entries=settings.CHAT_CACHE_MAX_ENTRIES,
+            ttl=settings.CACHE_TTL_SECONDS,
+            threshold=settings.CHAT_CACHE_SIMILARITY,
+            max_message_chars=settings.CHAT_CACHE_MAX_MESSAGE_CHARS,
+        )
+        gemini_service.yaml_loader.add_reload_listener(chat_cache.on_instruction_reload)
+    app.state.chat_cache = chat_cache
     
     logger.info("LLM Service started successfully")
     
     yield
     
     logger.info("Shutting down LLM Service...")
+    await app.state.job_runner.shutdown()
+    await app.state.faculty_directory.shutdown()
+    await app.state.question_pool.shutdown()
+    if chat_cache is not None:
+        gemini_service.yaml_loader.remove_reload_listener(chat_cache.on_instruction_reload)
+    await gemini_service.yaml_loader.stop_watching()
     await gemini_service.cleanup()
     logger.info("LLM Service shut down successfully")
 
@@ -62,9 +128,11 @@ app = FastAPI(
     docs_url="/docs" if settings.ENVIRONMENT == "development" else None,
     redoc_url="/redoc" if settings.ENVIRONMENT == "development" else None,
     lifespan=lifespan,
+    # Serialize route responses with orjson instead of json.dumps
+    default_response_class=ORJSONResponse,
 )
 
-# Add rate limiter to app state
+# Add the shared rate limiter to app state
 app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 
@@ -89,59 +157,10 @@ app.add_middleware(
 )
 
 
-# Security Headers Middleware
-# OWASP: Security Misconfiguration
-@app.middleware("http")
-async def add_security_headers(request: Request, call_next):
-    """Add security headers to all responses"""
-    response = await call_next(request)
-    
-    # Prevent clickjacking
-    response.headers["X-Frame-Options"] = "DENY"
-    
-    # Prevent MIME type sniffing
-    response.headers["X-Content-Type-Options"] = "nosniff"
-    
-    # Enable XSS protection
-    response.headers["X-XSS-Protection"] = "1; mode=block"
-    
-    # Content Security Policy
-    response.headers["Content-Security-Policy"] = "default-src 'self'"
-    
-    # Referrer Policy
-    response.headers["Referrer-Policy"] = "strict-origin-when-cross-origin"
-    
-    # Permissions Policy
-    response.headers["Permissions-Policy"] = "geolocation=(), microphone=(), camera=()"
-    
-    return response
-
-
-# Request Logging Middleware
-# OWASP: Insufficient Logging & Monitoring
-@app.middleware("http")
-async def log_requests(request: Request, call_next):
-    """Log all incoming requests"""
-    logger.info(
-        f"Request: {request.method} {request.url.path}",
-        extra={
-            "method": request.method,
-            "path": request.url.path,
-            "client_ip": request.client.host if request.client else "unknown",
-        }
-    )
-    
-    response = await call_next(request)
-    
-    logger.info(
-        f"Response: {response.status_code}",
-        extra={
-            "status_code": response.status_code,
-            "path": request.url.path,
-        }
-    )
-    
-    return response
+# Security headers, access log, request metrics and tracing
+# OWASP: Security Misconfiguration & Insufficient Logging & Monitoring
+# Added last so it is the outermost middleware and sees every response
+app.add_middleware(RequestContextMiddleware)
 
 
 # Exception Handlers
@@ -164,6 +183,23 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
     )
 
 
+@app.exception_handler(DeadlineExceededError)
+async def deadline_exceeded_handler(request: Request, exc: DeadlineExceededError):
+    """Answer requests whose time budget ran out before Gemini responded"""
+    logger.warning(
+        f"Request deadline exceeded: {exc}",
+        extra={"path": request.url.path}
+    )
+    
+    return JSONResponse(
+        status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+        content={
+            "error": "Gateway Timeout",
+            "message": "The AI service did not respond in time",
+        },
+    )
+
+
 @app.exception_handler(Exception)
 async def general_exception_handler(request: Request, exc: Exception):
     """Handle general exceptions without exposing sensitive data"""
@@ -194,6 +230,40 @@ async def health_check():
     }
 
 
+# Readiness Endpoint
+@app.get("/ready", tags=["Health"])
+async def readiness_check(request: Request):
+    """
+    Readiness check - fails while the Gemini client is not usable
+
+    The lifespan finishes warmup before the server accepts connections, so
+    this reports on the Gemini client, which is torn down on shutdown.
+    """
+    gemini_service = getattr(request.app.state, "gemini_service", None)
+    if gemini_service is None or not gemini_service.initialized:
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={"status": "gemini_unavailable"},
+        )
+    
+    return {
+        "status": "ready",
+        "startup": request.app.state.startup_report.to_dict(),
+    }
+
+
+# Metrics Endpoint
+# OWASP: Insufficient Logging & Monitoring
+@app.get("/metrics", tags=["Health"], include_in_schema=False)
+async def metrics():
+    """Prometheus metrics"""
+    if not settings.METRICS_ENABLED:
+        return JSONResponse(status_code=status.HTTP_404_NOT_FOUND, content={"error": "Not Found"})
+    
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+
 # API Routes
 app.include_router(cv_parser.router, prefix="/api/llm", tags=["CV Parser"])
 app.include_router(scholarship_matcher.router, prefix="/api/llm", tags=["Scholarship Matcher"])
@@ -202,6 +272,10 @@ app.include_router(document_generator.router, prefix="/api/llm", tags=["Document
 app.include_router(chat.router, prefix="/api/llm", tags=["Chat"])
 app.include_router(interview.router, prefix="/api/llm/interview", tags=["Interview Prep"])
 app.include_router(faculty.router, prefix="/api/llm/faculty", tags=["Faculty Discovery"])
+app.include_router(jobs.router, prefix="/api/llm/jobs", tags=["Background Jobs"])
+app.include_router(attachments.router, prefix="/api/llm/attachments", tags=["Chat Attachments"])
+app.include_router(batch.router, prefix="/api/llm", tags=["Batch"])
+app.include_router(profiles.router, prefix="/api/llm/profiles", tags=["Student Profiles"])
 
 
 # Root endpoint
@@ -0,0 +1,26 @@
+"""
+Test configuration
+
+Settings are read from the environment when app.core.config is first
+imported, so the required secrets and throwaway store paths are set here,
+before any test module imports the app.
+"""
+
+import os
+import tempfile
+
+_STATE_DIR = tempfile.mkdtemp(prefix="llm-service-tests-")
+
+os.environ.setdefault("GEMINI_API_KEY", "test-gemini-api-key")
+os.environ.setdefault("CORE_API_SECRET", "test-core-api-secret")
+os.environ["ENVIRONMENT"] = "development"
+os.environ["RATE_LIMIT_STORAGE_URI"] = "memory://"
+os.environ["GEMINI_REQUESTS_PER_MINUTE"] = "0"
+for name, file_name in [
+    ("JOB_STORE_PATH", "jobs.db"),
+    ("ATTACHMENT_STORE_PATH", "attachments"),
+    ("PROFILE_STORE_PATH", "profiles.db"),
+    ("FACULTY_CACHE_PATH", "faculty.db"),
+    ("QUESTION_POOL_PATH", "questions.db"),
+]:
+    os.environ[name] = os.path.join(_STATE_DIR, file_name)
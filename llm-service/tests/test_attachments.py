@@ -0,0 +1,87 @@
+"""Tests for the chat attachment store"""
+
+import hashlib
+import os
+import threading
+import time
+
+import pytest
+
+from app.services.attachments import AttachmentStore, AttachmentTooLargeError
+
+PDF = b"%PDF-1.4 " + b"x" * 3000
+
+
+async def _chunks(data: bytes, size: int = 1000):
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+
+@pytest.fixture
+def store(tmp_path):
+    return AttachmentStore(str(tmp_path / "attachments"), ttl=60, max_bytes=10_000)
+
+
+def _expire(store, attachment_id):
+    store._connection().execute("UPDATE attachments SET expires_at = 0 WHERE id = ?", (attachment_id,))
+
+
+def _files(store):
+    return sorted(name for name in os.listdir(store.directory) if not name.startswith("index.db"))
+
+
+async def test_save_streams_to_a_content_addressed_file(store):
+    attachment = await store.save(_chunks(PDF), "application/pdf")
+    assert attachment["id"] == hashlib.sha256(PDF).hexdigest()
+    assert attachment["size"] == len(PDF)
+    assert store._read(attachment["id"]) == PDF
+    assert _files(store) == [attachment["id"]]
+
+
+async def test_same_content_is_stored_once(store):
+    first = await store.save(_chunks(PDF), "application/pdf")
+    second = await store.save(_chunks(PDF, 7), "application/pdf")
+    assert first["id"] == second["id"]
+    assert _files(store) == [first["id"]]
+
+
+async def test_too_large_upload_leaves_no_file(store):
+    with pytest.raises(AttachmentTooLargeError):
+        await store.save(_chunks(b"x" * 20_000), "application/pdf")
+    assert _files(store) == []
+
+
+async def test_purge_removes_expired_rows_and_files(store):
+    attachment = await store.save(_chunks(PDF), "application/pdf")
+    _expire(store, attachment["id"])
+    store.purge()
+    assert store.get(attachment["id"]) is None
+    assert _files(store) == []
+
+
+async def test_upload_after_purge_stores_the_file_again(store):
+    attachment = await store.save(_chunks(PDF), "application/pdf")
+    _expire(store, attachment["id"])
+    # The next upload purges the expired copy, then stores the content again
+    again = await store.save(_chunks(PDF), "application/pdf")
+    assert again["id"] == attachment["id"]
+    assert store._read(again["id"]) == PDF
+
+
+async def test_purge_waits_for_a_concurrent_store(store):
+    attachment = await store.save(_chunks(PDF), "application/pdf")
+    _expire(store, attachment["id"])
+
+    # Another worker holds the index's write lock while it stores the same content again
+    other = AttachmentStore(store.directory, ttl=60, max_bytes=10_000, timeout=5.0)
+    conn = other._connection()
+    conn.execute("BEGIN IMMEDIATE")
+    purge = threading.Thread(target=store.purge)
+    purge.start()
+    time.sleep(0.2)
+    conn.execute("UPDATE attachments SET expires_at = 1e12 WHERE id = ?", (attachment["id"],))
+    conn.execute("COMMIT")
+    purge.join()
+
+    assert store.get(attachment["id"]) is not None
+    assert store._read(attachment["id"]) == PDF
@@ -0,0 +1,155 @@
+"""Tests for batch planning, execution and rate limiting"""
+
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from app.core.config import settings
+from app.core.rate_limit import limiter
+from app.services.batch import (
+    FAILED,
+    SKIPPED,
+    SUCCEEDED,
+    BatchReferenceError,
+    BatchValidationError,
+    plan,
+    resolve,
+    run_batch,
+)
+from main import app
+
+
+async def _echo(params):
+    return params
+
+
+RUNNERS = {"echo": _echo}
+
+
+def _op(op_id, params=None, depends_on=None, op_type="echo"):
+    return {"id": op_id, "type": op_type, "params": params or {}, "depends_on": depends_on}
+
+
+def test_plan_collects_references_and_depends_on():
+    operations = [
+        _op("cv"),
+        _op("match", {"profile": {"$ref": "cv/profile"}}),
+        _op("faculty", {"items": [{"$ref": "match/0"}]}, depends_on=["cv"]),
+    ]
+    assert plan(operations, RUNNERS) == {"cv": [], "match": ["cv"], "faculty": ["cv", "match"]}
+
+
+@pytest.mark.parametrize("operations, message", [
+    ([_op("a"), _op("a")], "used twice"),
+    ([_op("a", op_type="nope")], "unknown type"),
+    ([_op("a", {"x": {"$ref": "b"}}), _op("b")], "must be listed before it"),
+    ([_op("a", depends_on=["a"])], "must be listed before it"),
+])
+def test_plan_rejects_invalid_batches(operations, message):
+    with pytest.raises(BatchValidationError, match=message):
+        plan(operations, RUNNERS)
+
+
+def test_resolve_follows_reference_paths():
+    results = {"cv": {"profile": {"skills": ["python", "sql"]}}}
+    assert resolve({"skill": {"$ref": "cv/profile/skills/1"}, "n": 1}, results) == {"skill": "sql", "n": 1}
+    assert resolve([{"$ref": "cv"}], results) == [results["cv"]]
+    with pytest.raises(BatchReferenceError):
+        resolve({"$ref": "cv/profile/skills/5"}, results)
+
+
+async def _collect(operations, runners, max_concurrency=4):
+    return [o async for o in run_batch(operations, runners, plan(operations, runners), max_concurrency)]
+
+
+async def test_dependents_get_results_and_failures_skip_them():
+    async def fail(params):
+        raise ValueError("bad input")
+
+    operations = [
+        _op("a", {"v": 1}),
+        _op("b", {"from_a": {"$ref": "a/v"}}),
+        _op("c", op_type="fail"),
+        _op("d", depends_on=["c"]),
+    ]
+    outcomes = {o["id"]: o for o in await _collect(operations, {"echo": _echo, "fail": fail})}
+    assert outcomes["b"] == {"id": "b", "type": "echo", "status": SUCCEEDED, "result": {"from_a": 1}}
+    assert outcomes["c"]["status"] == FAILED and outcomes["c"]["error"] == "bad input"
+    assert outcomes["d"]["status"] == SKIPPED
+
+
+async def test_outcomes_are_yielded_as_operations_finish():
+    async def sleep(params):
+        await asyncio.sleep(params["s"])
+        return params["s"]
+
+    operations = [_op("slow", {"s": 0.2}, op_type="sleep"), _op("fast", {"s": 0.01}, op_type="sleep")]
+    assert [o["id"] for o in await _collect(operations, {"sleep": sleep})] == ["fast", "slow"]
+
+
+async def test_concurrency_is_bounded():
+    running, peak = 0, 0
+
+    async def track(params):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+
+    await _collect([_op(str(i), op_type="track") for i in range(6)], {"track": track}, max_concurrency=2)
+    assert peak == 2
+
+
+async def test_pending_operations_are_cancelled_when_the_consumer_stops():
+    cancelled = []
+
+    async def hang(params):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(params["n"])
+            raise
+
+    runners = {"echo": _echo, "hang": hang}
+    operations = [_op("quick"), _op("h1", {"n": 1}, op_type="hang"), _op("h2", {"n": 2}, op_type="hang")]
+    outcomes = run_batch(operations, runners, plan(operations, runners), 4)
+    assert (await outcomes.__anext__())["id"] == "quick"
+    await outcomes.aclose()
+    assert sorted(cancelled) == [1, 2]
+
+
+class StubGemini:
+    async def discover_scholarships(self, count):
+        return []
+
+
+async def test_operations_share_their_route_rate_limit():
+    """Batch operations and direct requests count under the same limiter keys"""
+    limiter.reset()
+    app.state.gemini_service = StubGemini()
+    try:
+        transport = httpx.ASGITransport(app=app)
+        headers = {"Authorization": f"Bearer {settings.CORE_API_SECRET}"}
+        async with httpx.AsyncClient(transport=transport, base_url="http://test", headers=headers) as client:
+            # The discovery route allows 5 requests a minute
+            for _ in range(4):
+                assert (await client.post("/api/llm/scholarships/discover", json={"count": 1})).status_code == 200
+
+            ops = [{"id": f"d{i}", "type": "discover_scholarships", "params": {"count": 1}} for i in range(2)]
+            response = await client.post("/api/llm/batch", json={"operations": ops})
+            outcomes = [
+                json.loads(line[len("data: "):])
+                for line in response.text.splitlines()
+                if line.startswith("data: ") and "[DONE]" not in line
+            ]
+            direct = await client.post("/api/llm/scholarships/discover", json={"count": 1})
+    finally:
+        del app.state.gemini_service
+        limiter.reset()
+
+    assert sorted(o["status"] for o in outcomes) == [FAILED, SUCCEEDED]
+    assert any("Rate limit exceeded" in o.get("error", "") for o in outcomes)
+    assert direct.status_code == 429
@@ -0,0 +1,97 @@
+"""Tests for the chat response cache and the routes that answer from it"""
+
+from types import SimpleNamespace
+
+import pytest
+
+from app.api.routes import batch as batch_routes
+from app.api.routes import chat as chat_routes
+from app.models.requests import ChatRequest
+from app.services.chat_cache import ChatCache, is_typo, normalize
+
+ANSWER = {"message": "A statement of purpose explains your goals."}
+
+
+@pytest.fixture
+def cache():
+    return ChatCache(max_entries=100, ttl=60, threshold=0.9, max_message_chars=300)
+
+
+def _hit(cache, cached: str, asked: str) -> bool:
+    cache.put(cached, ANSWER, cache.generation)
+    return cache.get(asked) is not None
+
+
+@pytest.mark.parametrize("cached, asked", [
+    ("What is an SOP?", "what's an SOP"),
+    ("How long should my statement of purpose be?", "How long should my statement of purpose be"),
+    ("Hi, what documents are required for the Chevening scholarship?",
+     "what documents are required for the Chevening scholarship please"),
+    ("Which documents do I need to submit with my Chevening scholarship application form",
+     "Which documents do I need to submit with my Chevening scholarship aplication form"),
+])
+def test_rewordings_hit(cache, cached, asked):
+    assert _hit(cache, cached, asked)
+
+
+@pytest.mark.parametrize("cached, asked", [
+    # Pronouns
+    ("Can I apply for the Chevening scholarship?", "Can you apply for the Chevening scholarship?"),
+    ("Should I mention my GPA?", "Should I mention your GPA?"),
+    ("Is it worth applying?", "Is applying worth it?"),
+    # Auxiliaries carrying tense, and negation
+    ("Does the scholarship cover tuition?", "Did the scholarship cover tuition?"),
+    ("Do I need IELTS for Germany?", "Don't I need IELTS for Germany?"),
+    ("Is a visa required?", "Is no visa required?"),
+    ("Should I include references?", "Should I not include references?"),
+    # Different subjects
+    ("What scholarships are there in Nigeria?", "What scholarships are there in Ghana?"),
+    ("Scholarships for 2025", "Scholarships for 2026"),
+])
+def test_near_misses_with_different_meanings_do_not_hit(cache, cached, asked):
+    assert not _hit(cache, cached, asked)
+
+
+def test_pronouns_and_negation_are_kept():
+    assert normalize("Can I apply to my university?") == ["can", "i", "apply", "my", "university"]
+    assert "not" in normalize("Is it not required?")
+
+
+def test_typos_need_long_words():
+    assert is_typo("scholarship", "scholarhsip")
+    assert not is_typo("mit", "mt")
+    assert not is_typo("2025", "2026")
+
+
+def test_answers_from_before_an_invalidation_are_dropped(cache):
+    generation = cache.generation
+    cache.invalidate()
+    cache.put("What is an SOP?", ANSWER, generation)
+    assert cache.get("What is an SOP?") is None
+
+
+def test_only_first_short_messages_are_cacheable(cache):
+    assert cache.cacheable("What is an SOP?")
+    assert not cache.cacheable("What is an SOP?", conversation_history=[{"role": "user", "content": "hi"}])
+    assert not cache.cacheable("What is an SOP?", attachments=[{"id": "0" * 64}])
+    assert not cache.cacheable("x" * 301)
+
+
+class StubGemini:
+    def __init__(self):
+        self.calls = 0
+
+    async def chat(self, message, conversation_history=None, attachments=None):
+        self.calls += 1
+        return dict(ANSWER)
+
+
+async def test_batch_chat_operations_share_the_cache(cache):
+    gemini = StubGemini()
+    state = SimpleNamespace(gemini_service=gemini, chat_cache=cache, question_pool=None, faculty_directory=None)
+    chat_op = batch_routes._runners(state)["chat"]
+
+    assert await chat_op({"message": "What is an SOP?"}) == ANSWER
+    assert await chat_op({"message": "what's an SOP"}) == ANSWER
+    assert await chat_routes.answer(state, ChatRequest(message="What is an SOP")) == ANSWER
+    assert gemini.calls == 1
@@ -0,0 +1,99 @@
+"""Tests for the faculty directory cache and its shared Gemini calls"""
+
+import asyncio
+
+import pytest
+
+from app.services.faculty_directory import LIST_UNIVERSITIES, FacultyCache, FacultyDirectory, cache_key
+from app.services.yaml_loader import instruction_loader
+
+VALID = {"results": [{"id": "1", "name": "Example University", "details": "Public research university"}], "advice": "Apply early"}
+INVALID = {"results": [{"name": "Example University"}]}
+KEY = cache_key(LIST_UNIVERSITIES, "Europe", None, None)
+
+
+class StubGemini:
+    yaml_loader = instruction_loader
+
+    def __init__(self, result=VALID):
+        self.result = result
+        self.calls = 0
+        self.release = asyncio.Event()
+        self.release.set()
+
+    async def discover_faculty(self, **kwargs):
+        self.calls += 1
+        await self.release.wait()
+        return self.result
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return FacultyCache(str(tmp_path / "faculty.db"), ttl=60)
+
+
+def _directory(gemini, cache):
+    return FacultyDirectory(gemini, cache, prefetch_count=0)
+
+
+async def test_valid_result_is_cached(cache):
+    gemini = StubGemini()
+    directory = _directory(gemini, cache)
+    assert await directory.discover(LIST_UNIVERSITIES, continent="Europe") == VALID
+    assert await directory.discover(LIST_UNIVERSITIES, continent=" europe ") == VALID
+    assert gemini.calls == 1
+
+
+async def test_result_failing_its_schema_is_served_but_not_cached(cache):
+    gemini = StubGemini(INVALID)
+    directory = _directory(gemini, cache)
+    assert await directory.discover(LIST_UNIVERSITIES, continent="Europe") == INVALID
+    assert cache.get(KEY) is None
+    await directory.discover(LIST_UNIVERSITIES, continent="Europe")
+    assert gemini.calls == 2
+
+
+async def test_concurrent_requests_share_one_call(cache):
+    gemini = StubGemini()
+    gemini.release.clear()
+    directory = _directory(gemini, cache)
+    tasks = [asyncio.create_task(directory.discover(LIST_UNIVERSITIES, continent="Europe")) for _ in range(3)]
+    await asyncio.sleep(0.01)
+    gemini.release.set()
+    assert await asyncio.gather(*tasks) == [VALID] * 3
+    assert gemini.calls == 1
+
+
+async def test_waiter_makes_its_own_call_when_the_first_request_goes_away(cache):
+    gemini = StubGemini()
+    gemini.release.clear()
+    directory = _directory(gemini, cache)
+    first = asyncio.create_task(directory.discover(LIST_UNIVERSITIES, continent="Europe"))
+    await asyncio.sleep(0.01)
+    second = asyncio.create_task(directory.discover(LIST_UNIVERSITIES, continent="Europe"))
+    await asyncio.sleep(0.01)
+
+    first.cancel()
+    await asyncio.sleep(0.01)
+    gemini.release.set()
+    assert await second == VALID
+    assert first.cancelled()
+    assert gemini.calls == 2
+
+
+async def test_cancelled_waiter_does_not_start_its_own_call(cache):
+    gemini = StubGemini()
+    gemini.release.clear()
+    directory = _directory(gemini, cache)
+    first = asyncio.create_task(directory.discover(LIST_UNIVERSITIES, continent="Europe"))
+    await asyncio.sleep(0.01)
+    second = asyncio.create_task(directory.discover(LIST_UNIVERSITIES, continent="Europe"))
+    await asyncio.sleep(0.01)
+
+    # Both requests go away together, e.g. at shutdown
+    first.cancel()
+    second.cancel()
+    await asyncio.wait([first, second], timeout=1.0)
+    assert first.cancelled() and second.cancelled()
+    assert gemini.calls == 1
+    assert not directory._loading
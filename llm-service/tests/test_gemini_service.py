@@ -0,0 +1,58 @@
+"""Tests for GeminiService helpers"""
+
+import logging
+
+from app.services import gemini_service
+from app.services.gemini_service import _cancel_stream
+
+
+class _Call:
+    def __init__(self):
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class _SDKResponse:
+    """Stands in for the SDK's AsyncGenerateContentResponse"""
+
+    def __init__(self, call):
+        self._iterator = call
+
+
+async def _chunks(closed):
+    try:
+        yield "a"
+        yield "b"
+    finally:
+        closed.append(True)
+
+
+async def test_cancel_stream_closes_the_chunks_and_cancels_the_call():
+    closed, call = [], _Call()
+    chunks = _chunks(closed)
+    await chunks.__anext__()
+
+    await _cancel_stream(_SDKResponse(call), chunks)
+
+    assert closed == [True]
+    assert call.cancelled
+
+
+async def test_cancel_stream_warns_once_when_the_sdk_hides_the_call(monkeypatch, caplog):
+    monkeypatch.setattr(gemini_service, "_warned_uncancellable", False)
+    response_class = type("AsyncGenerateContentResponse", (), {"__module__": "google.generativeai.types"})
+
+    with caplog.at_level(logging.WARNING, logger=gemini_service.__name__):
+        await _cancel_stream(response_class(), None)
+        await _cancel_stream(response_class(), None)
+
+    assert len([r for r in caplog.records if "will not be cancelled" in r.getMessage()]) == 1
+
+
+async def test_cancel_stream_is_quiet_for_test_backends(monkeypatch, caplog):
+    monkeypatch.setattr(gemini_service, "_warned_uncancellable", False)
+    with caplog.at_level(logging.WARNING, logger=gemini_service.__name__):
+        await _cancel_stream(object(), None)
+    assert not caplog.records
@@ -0,0 +1,163 @@
+"""
+Tests for the job store and runner: idempotency, leases and heartbeats
+"""
+
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from app.core.config import settings
+from app.core.rate_limit import limiter
+from app.services.jobs import (
+    FAILED,
+    QUEUED,
+    RUNNING,
+    SUCCEEDED,
+    JobConflictError,
+    JobRunner,
+    JobStore,
+    request_hash,
+)
+from main import app
+
+TTL = 60.0
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(str(tmp_path / "jobs.db"), lease_seconds=0.3)
+
+
+def _create(store, key="generate-document:k1", payload=None):
+    return store.create("generate-document", key, request_hash("generate-document", payload or {"a": 1}), TTL)
+
+
+def test_same_key_and_request_reuses_the_job(store):
+    job, created = _create(store)
+    again, created_again = _create(store)
+    assert created and not created_again
+    assert again["id"] == job["id"]
+    assert again["status"] == QUEUED
+
+
+def test_same_key_for_a_different_request_conflicts(store):
+    _create(store)
+    with pytest.raises(JobConflictError):
+        _create(store, payload={"a": 2})
+
+
+def test_finished_job_is_reused_with_its_result(store):
+    job, _ = _create(store)
+    store.finish(job["id"], SUCCEEDED, TTL, result={"document": "text"})
+    again, created = _create(store)
+    assert not created
+    assert again["id"] == job["id"]
+    assert again["result"] == {"document": "text"}
+
+
+def test_failed_job_is_replaced_under_the_same_key(store):
+    job, _ = _create(store)
+    store.finish(job["id"], FAILED, TTL, error="boom")
+    again, created = _create(store)
+    assert created
+    assert again["id"] != job["id"]
+    assert store.get(job["id"], TTL) is None
+
+
+def test_job_with_an_expired_lease_is_reported_lost(store):
+    job, _ = _create(store)
+    store.mark_running(job["id"])
+    time.sleep(0.4)
+    lost = store.get(job["id"], TTL)
+    assert lost["status"] == FAILED
+    assert "interrupted" in lost["error"]
+    # Resubmitting a lost job starts it again
+    again, created = _create(store)
+    assert created and again["id"] != job["id"]
+
+
+def test_touch_keeps_the_lease(store):
+    job, _ = _create(store)
+    store.mark_running(job["id"])
+    for _ in range(4):
+        time.sleep(0.1)
+        store.touch([job["id"]])
+    assert store.get(job["id"], TTL)["status"] == RUNNING
+
+
+def test_touch_does_not_revive_finished_jobs(store):
+    job, _ = _create(store)
+    store.finish(job["id"], SUCCEEDED, TTL, result=1)
+    updated_at = store.get(job["id"], TTL)["updated_at"]
+    store.touch([job["id"]])
+    assert store.get(job["id"], TTL)["updated_at"] == updated_at
+
+
+def test_finished_job_expires_after_its_ttl(store):
+    job, _ = _create(store)
+    store.finish(job["id"], SUCCEEDED, 0.1, result=1)
+    time.sleep(0.2)
+    assert store.get(job["id"], TTL) is None
+
+
+async def test_runner_heartbeat_keeps_long_jobs_alive(store):
+    runner = JobRunner(store, result_ttl=TTL)
+    release = asyncio.Event()
+
+    async def handler():
+        await release.wait()
+        return {"ok": True}
+
+    job, created = await runner.submit("generate-document", {"a": 1}, handler)
+    assert created
+    # Well past the lease; the heartbeat refreshes it every lease / 3
+    await asyncio.sleep(0.7)
+    assert runner.get(job["id"])["status"] == RUNNING
+
+    release.set()
+    await runner.wait(job["id"], 1.0)
+    finished = runner.get(job["id"])
+    assert finished["status"] == SUCCEEDED
+    assert finished["result"] == {"ok": True}
+    await runner.shutdown()
+
+
+async def test_runner_resubmission_does_not_run_again(store):
+    runner = JobRunner(store, result_ttl=TTL)
+    calls = []
+
+    async def handler():
+        calls.append(1)
+        return 1
+
+    job, _ = await runner.submit("generate-document", {"a": 1}, handler, idempotency_key="key")
+    await runner.wait(job["id"], 1.0)
+    again, created = await runner.submit("generate-document", {"a": 1}, handler, idempotency_key="key")
+    assert not created and again["id"] == job["id"]
+    assert calls == [1]
+    await runner.shutdown()
+
+
+async def test_discovery_job_submissions_are_rate_limited(store):
+    class StubGemini:
+        async def discover_scholarships(self, count):
+            return []
+
+    limiter.reset()
+    runner = JobRunner(store, result_ttl=TTL)
+    app.state.job_runner, app.state.gemini_service = runner, StubGemini()
+    try:
+        transport = httpx.ASGITransport(app=app)
+        headers = {"Authorization": f"Bearer {settings.CORE_API_SECRET}"}
+        async with httpx.AsyncClient(transport=transport, base_url="http://test", headers=headers) as client:
+            codes = [
+                (await client.post("/api/llm/jobs/scholarships/discover", json={"count": count})).status_code
+                for count in range(1, 7)
+            ]
+    finally:
+        del app.state.job_runner, app.state.gemini_service
+        await runner.shutdown()
+        limiter.reset()
+    assert codes == [202] * 5 + [429]
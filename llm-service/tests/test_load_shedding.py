@@ -0,0 +1,72 @@
+"""
+Tests for which requests are load shed, and the route labels that decide it
+"""
+
+import pytest
+
+from app.core.load_shedding import BULK_ROUTES, INTERACTIVE_ROUTES, LoadShedder
+from app.core.middleware import RequestContextMiddleware
+from main import app
+
+
+def _scope(path: str, method: str = "GET") -> dict:
+    return {"type": "http", "path": path, "method": method, "root_path": "", "app": app}
+
+
+def _label(path: str, method: str = "GET") -> str:
+    return RequestContextMiddleware(app)._route_label(_scope(path, method))
+
+
+def test_shed_routes_are_registered():
+    paths = {getattr(route, "path", None) for route in app.routes}
+    assert INTERACTIVE_ROUTES <= paths
+    assert BULK_ROUTES <= paths
+
+
+@pytest.mark.parametrize("route", [
+    "/api/llm/chat",
+    "/api/llm/interview/interactive/stream",
+    "/api/llm/generate-document",
+    "/api/llm/faculty/discover",
+    "/api/llm/batch",
+])
+def test_gemini_routes_are_shed(route):
+    assert LoadShedder().applies(route)
+
+
+@pytest.mark.parametrize("route", [
+    "/api/llm/profiles",
+    "/api/llm/profiles/{profile_digest}",
+    "/api/llm/attachments",
+    "/api/llm/attachments/{attachment_id}",
+    "/api/llm/jobs/generate-document",
+    "/api/llm/jobs/{job_id}",
+    "/api/llm/jobs/{job_id}/events",
+    "/health",
+    "unmatched",
+])
+def test_routes_without_gemini_calls_are_not_shed(route):
+    assert not LoadShedder().applies(route)
+
+
+def test_disabled_shedder_sheds_nothing():
+    assert not LoadShedder(enabled=False).applies("/api/llm/chat")
+
+
+def test_label_of_static_path():
+    assert _label("/api/llm/chat", "POST") == "/api/llm/chat"
+
+
+def test_label_of_parameterized_path_is_its_template():
+    assert _label("/api/llm/jobs/3f2a9c") == "/api/llm/jobs/{job_id}"
+    assert _label("/api/llm/jobs/3f2a9c/events") == "/api/llm/jobs/{job_id}/events"
+    assert _label("/api/llm/profiles/abc123") == "/api/llm/profiles/{profile_digest}"
+
+
+def test_label_of_parameterized_path_with_wrong_method():
+    assert _label("/api/llm/jobs/3f2a9c", "DELETE") == "/api/llm/jobs/{job_id}"
+
+
+def test_label_of_unknown_path():
+    assert _label("/api/llm/nope/deeper") == "unmatched"
+    assert _label("/wp-admin") == "unmatched"
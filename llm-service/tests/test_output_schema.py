@@ -0,0 +1,132 @@
+"""Tests for structured output validation and field re-asks"""
+
+import json
+
+from app.services.gemini_service import GeminiService
+from app.services.output_schema import find_problems, format_path, merge_patch, patch_schema
+
+SCHOLARSHIP = {
+    "type": "object",
+    "properties": {
+        "title": {"type": "string"},
+        "match_score": {"type": "integer"},
+        "amount": {"type": "number", "nullable": True},
+        "level": {"type": "string", "enum": ["undergraduate", "graduate"]},
+        "tags": {"type": "array", "items": {"type": "string"}},
+    },
+    "required": ["title", "match_score"],
+}
+SCHEMA = {"type": "array", "items": SCHOLARSHIP}
+
+
+def _valid(i: int) -> dict:
+    return {"title": f"S{i}", "match_score": 80, "amount": None, "level": "graduate", "tags": ["a"]}
+
+
+def test_valid_value_has_no_problems():
+    assert find_problems([_valid(0), _valid(1)], SCHEMA) == []
+
+
+def test_problems_are_reported_by_path():
+    value = [_valid(0), {"title": "S1", "match_score": "high", "level": "phd", "tags": ["a", 3]}, {"title": "S2"}]
+    assert find_problems(value, SCHEMA) == [
+        ((1, "match_score"), "is not of type integer"),
+        ((1, "level"), "is not one of ['undergraduate', 'graduate']"),
+        ((1, "tags", 1), "is not of type string"),
+        ((2, "match_score"), "is missing"),
+    ]
+
+
+def test_booleans_are_not_numbers():
+    assert find_problems({"title": "S", "match_score": True}, SCHOLARSHIP) == [
+        (("match_score",), "is not of type integer")
+    ]
+
+
+def test_faulty_value_is_reported_once():
+    # A string where an object belongs: its missing fields are not listed too
+    assert find_problems(["oops"], SCHEMA) == [((0,), "is not of type object")]
+    assert find_problems({"items": []}, SCHEMA) == [((), "is not of type array")]
+
+
+def test_format_path():
+    assert format_path(("scholarships", 3, "amount")) == "scholarships[3].amount"
+    assert format_path((3, "amount")) == "[3].amount"
+    assert format_path(()) == "(root)"
+
+
+def test_patch_schema_holds_only_the_faulty_paths():
+    patch = patch_schema(SCHEMA, [(1, "match_score"), (2, "match_score"), (2, "level")])
+    assert patch == {
+        "type": "object",
+        "properties": {
+            "1": {"type": "object", "properties": {"match_score": {"type": "integer"}}, "required": ["match_score"]},
+            "2": {
+                "type": "object",
+                "properties": {
+                    "match_score": {"type": "integer"},
+                    "level": SCHOLARSHIP["properties"]["level"],
+                },
+                "required": ["match_score", "level"],
+            },
+        },
+        "required": ["1", "2"],
+    }
+
+
+def test_merge_patch_writes_fields_in_place():
+    value = [_valid(0), {"title": "S1", "match_score": "high", "tags": ["a", 3]}]
+    merge_patch(value, {"1": {"match_score": 75, "tags": {"1": "b"}}})
+    assert value[1] == {"title": "S1", "match_score": 75, "tags": ["a", "b"]}
+    assert value[0] == _valid(0)
+
+
+def test_merge_patch_ignores_positions_that_do_not_exist():
+    value = [_valid(0)]
+    merge_patch(value, {"5": {"match_score": 1}, "x": {"match_score": 1}})
+    assert value == [_valid(0)]
+
+
+class _ReaskService(GeminiService):
+    """GeminiService whose model calls return canned responses"""
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.calls = []
+
+    async def _generate_content(self, prompt, **kwargs):
+        self.calls.append((prompt, kwargs))
+        return self.responses.pop(0)
+
+
+async def test_reask_merges_the_corrected_fields():
+    service = _ReaskService([json.dumps({"1": {"match_score": 75}})])
+    response = json.dumps([_valid(0), {"title": "S1", "match_score": "high"}])
+    result = await service._parse_structured("match", {"response_schema": SCHEMA}, "PROMPT", response)
+
+    assert result == [_valid(0), {"title": "S1", "match_score": 75}]
+    prompt, kwargs = service.calls[0]
+    assert prompt.startswith("PROMPT") and "[1].match_score is not of type integer" in prompt
+    assert kwargs["output_config"]["response_schema"] == patch_schema(SCHEMA, [(1, "match_score")])
+
+
+async def test_valid_response_is_not_reasked():
+    service = _ReaskService([])
+    result = await service._parse_structured("match", {"response_schema": SCHEMA}, "PROMPT", json.dumps([_valid(0)]))
+    assert result == [_valid(0)]
+    assert service.calls == []
+
+
+async def test_response_wrong_as_a_whole_is_not_reasked():
+    service = _ReaskService([])
+    result = await service._parse_structured("match", {"response_schema": SCHEMA}, "PROMPT", '{"title": "S"}')
+    assert result == {"title": "S"}
+    assert service.calls == []
+
+
+async def test_failed_reask_returns_the_unpatched_response():
+    service = _ReaskService(["not json at all"])
+    response = json.dumps([{"title": "S1"}])
+    result = await service._parse_structured("match", {"response_schema": SCHEMA}, "PROMPT", response)
+    assert result == [{"title": "S1"}]
+    assert len(service.calls) == 1
@@ -0,0 +1,99 @@
+"""Tests for the student profile registry"""
+
+import time
+
+import pytest
+from fastapi import HTTPException
+
+from app.api.routes import profiles as profile_routes
+from app.services.profiles import ProfileNotFoundError, ProfileRegistry, canonical_profile, profile_json
+
+PROFILE = {
+    "name": " Ada Lovelace ",
+    "gpa": 3.9,
+    "skills": ["python", "", "analysis"],
+    "nationality": None,
+    "education": {"degree": "BSc Mathematics", "honors": []},
+}
+
+
+@pytest.fixture
+def registry(tmp_path):
+    return ProfileRegistry(str(tmp_path / "profiles.db"), ttl=60)
+
+
+def test_canonical_profile_trims_and_drops_empty_values():
+    assert canonical_profile(PROFILE) == {
+        "name": "Ada Lovelace",
+        "gpa": 3.9,
+        "skills": ["python", "analysis"],
+        "education": {"degree": "BSc Mathematics"},
+    }
+
+
+def test_inline_and_registered_profiles_give_the_same_prompt_text(registry):
+    registered, _ = registry.register(PROFILE)
+    reordered = dict(reversed(list(PROFILE.items())))
+    assert profile_json(PROFILE) == profile_json(reordered) == profile_json(registered)
+    assert "nationality" not in profile_json(PROFILE)
+
+
+def test_same_content_gets_the_same_digest(registry):
+    first, created = registry.register(PROFILE)
+    again, created_again = registry.register({**PROFILE, "name": "Ada Lovelace", "nationality": ""})
+    assert created and not created_again
+    assert again.digest == first.digest
+
+
+def test_new_content_under_a_name_gets_the_next_version(registry):
+    v1, _ = registry.register(PROFILE, profile_id="user-1")
+    v2, _ = registry.register({**PROFILE, "gpa": 4.0}, profile_id="user-1")
+    other, _ = registry.register({**PROFILE, "gpa": 3.0}, profile_id="user-2")
+    assert (v1.version, v2.version, other.version) == (1, 2, 1)
+    # Registering a known revision again keeps its version
+    again, created = registry.register(PROFILE, profile_id="user-1")
+    assert not created and again.version == 1 and again.digest == v1.digest
+
+
+def test_resolve_prefers_the_digest(registry):
+    registered, _ = registry.register(PROFILE)
+    assert registry.resolve({"name": "inline"}, registered.digest).digest == registered.digest
+    assert registry.resolve({"name": "inline"}, None) == {"name": "inline"}
+
+
+def test_resolve_unknown_digest_raises(registry):
+    with pytest.raises(ProfileNotFoundError):
+        registry.resolve(None, "0" * 64)
+    with pytest.raises(ProfileNotFoundError):
+        registry.resolve(None, "not-a-digest")
+
+
+def test_route_answers_422_for_an_unknown_digest(monkeypatch, registry):
+    monkeypatch.setattr(profile_routes, "profile_registry", registry)
+    with pytest.raises(HTTPException) as raised:
+        profile_routes.request_profile(None, "0" * 64)
+    assert raised.value.status_code == 422
+
+
+def test_profile_is_registered_again_after_a_miss(tmp_path):
+    registry = ProfileRegistry(str(tmp_path / "profiles.db"), ttl=0.1)
+    registered, _ = registry.register(PROFILE, profile_id="user-1")
+    time.sleep(0.2)
+
+    # Expired on the shared store: the in-memory copy is not served either
+    with pytest.raises(ProfileNotFoundError):
+        registry.resolve(None, registered.digest)
+
+    again, created = registry.register(PROFILE, profile_id="user-1")
+    assert created
+    assert again.digest == registered.digest
+    assert again.version == 1
+    assert registry.resolve(None, again.digest).digest == registered.digest
+
+
+def test_other_workers_read_the_shared_store(tmp_path):
+    path = str(tmp_path / "profiles.db")
+    registered, _ = ProfileRegistry(path, ttl=60).register(PROFILE)
+    other = ProfileRegistry(path, ttl=60).get(registered.digest)
+    assert other.profile == canonical_profile(PROFILE)
+    assert other.prompt_fragment == registered.prompt_fragment
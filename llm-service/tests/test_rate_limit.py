@@ -0,0 +1,129 @@
+"""Tests for the shared rate limit storage and the Gemini quota guard"""
+
+import asyncio
+import time
+
+import pytest
+from limits import parse
+from limits.storage import MemoryStorage
+from limits.strategies import FixedWindowRateLimiter
+
+from app.core.rate_limit import GeminiQuotaGuard, SQLiteStorage
+
+
+@pytest.fixture
+def storage(tmp_path):
+    return SQLiteStorage(f"sqlite:///{tmp_path / 'limits.db'}")
+
+
+def test_sqlite_storage_counts_hits_until_the_limit(storage):
+    limiter = FixedWindowRateLimiter(storage)
+    limit = parse("2/minute")
+
+    assert limiter.hit(limit, "client", "route")
+    assert limiter.hit(limit, "client", "route")
+    assert not limiter.hit(limit, "client", "route")
+    # Other keys have their own counters
+    assert limiter.hit(limit, "other-client", "route")
+
+
+def test_sqlite_storage_reset_and_clear(storage):
+    storage.incr("a", 60)
+    storage.incr("a", 60)
+    storage.incr("b", 60)
+    assert storage.get("a") == 2
+
+    storage.clear("a")
+    assert storage.get("a") == 0
+    assert storage.get("b") == 1
+
+    storage.reset()
+    assert storage.get("b") == 0
+
+
+def test_sqlite_storage_starts_a_new_window_after_expiry(storage):
+    storage.incr("a", 60)
+    storage._connection().execute("UPDATE counters SET expiry = ?", (time.time() - 1,))
+
+    assert storage.get("a") == 0
+    assert storage.incr("a", 60) == 1
+    assert storage.get_expiry("a") > time.time()
+
+
+def test_sqlite_storage_is_shared_between_connections(tmp_path):
+    uri = f"sqlite:///{tmp_path / 'limits.db'}"
+    SQLiteStorage(uri).incr("a", 60)
+    assert SQLiteStorage(uri).incr("a", 60) == 2
+
+
+def test_trip_starts_a_shared_cooldown():
+    storage = MemoryStorage()
+    guard = GeminiQuotaGuard(storage)
+    assert guard.cooldown_remaining() == 0
+
+    guard.trip(30)
+    assert 0 < guard.cooldown_remaining() <= 30
+    # Another worker's guard on the same storage sees it
+    assert GeminiQuotaGuard(storage).cooldown_remaining() > 0
+
+
+def test_trip_does_not_shorten_a_longer_cooldown():
+    guard = GeminiQuotaGuard(MemoryStorage())
+    guard.trip(30)
+    guard.trip(2)
+    assert guard.cooldown_remaining() > 2
+
+
+def test_headroom_keeps_a_reserve_of_the_budget():
+    guard = GeminiQuotaGuard(MemoryStorage(), requests_per_minute=10)
+    assert guard.has_headroom(reserve=0.5)
+
+    for _ in range(5):
+        guard._try_acquire()
+    # 5 of 10 left: not more than the reserve
+    assert not guard.has_headroom(reserve=0.5)
+    assert guard.has_headroom(reserve=0.2)
+
+
+def test_no_headroom_during_a_cooldown():
+    guard = GeminiQuotaGuard(MemoryStorage())
+    assert guard.has_headroom()
+    guard.trip(30)
+    assert not guard.has_headroom()
+
+
+def test_no_headroom_when_the_storage_fails():
+    class BrokenStorage(MemoryStorage):
+        def get(self, key):
+            raise RuntimeError("database is locked")
+
+    assert not GeminiQuotaGuard(BrokenStorage()).has_headroom()
+
+
+async def test_acquire_takes_budget_without_waiting():
+    guard = GeminiQuotaGuard(MemoryStorage(), requests_per_minute=2)
+    assert await guard.acquire() == 0
+    assert await guard.acquire() == 0
+    assert not await guard.has_headroom_async()
+
+
+async def test_acquire_waits_for_an_exhausted_budget():
+    guard = GeminiQuotaGuard(MemoryStorage(), requests_per_minute=1)
+    await guard.acquire()
+    with pytest.raises(asyncio.TimeoutError):
+        await asyncio.wait_for(guard.acquire(), timeout=0.2)
+
+
+async def test_acquire_does_not_block_the_event_loop():
+    class SlowStorage(MemoryStorage):
+        def get(self, key):
+            time.sleep(0.3)
+            return super().get(key)
+
+    guard = GeminiQuotaGuard(SlowStorage())
+    acquiring = asyncio.create_task(guard.acquire())
+    started = time.perf_counter()
+    await asyncio.sleep(0.01)
+    # A blocking storage call on the loop would have delayed this wake-up
+    assert time.perf_counter() - started < 0.2
+    await acquiring